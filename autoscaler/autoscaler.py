@@ -1,43 +1,158 @@
 import logging
-import random
-import time
 import heapq
+import time
+import zlib
 
-from .workload import schedule_goal
-from .cluster_update import gce_cluster_control
+from . import metrics
+from .workload import get_effective_utilization, get_projected_hourly_spend, schedule_goal, schedule_pool_goals
+from .drain_cost import get_drain_costs
+from .placement import place_pending_pods
+from .cluster_update import gce_cluster_control, SHUTDOWN_REQUESTED
 from .utils import user_confirm as confirm
 from .kubernetes_control import k8s_control
 from .kubernetes_control_test import k8s_control_test
 from .slack_message import slack_handler
-from .populate import populate
+from .populate import populate, populate_node
+from .readiness import readiness_tracker
+from .trace import trace_recorder
+from .forecast import demand_history, forecast_peak, load_history
+from .pools import get_node_pool, group_nodes_by_pool, parse_node_pools
+from .pricing import billing_model, get_price_table
+from .state import load_state, scaling_state
 
 
 scale_logger = logging.getLogger("scale")
 slack_logger = logging.getLogger("slack")  # used for slack message only
 
 
+def tiebreak_key(seed, node_name):
+    """Return a stable pseudo-random key ordering nodes of equal
+    priority, so that ties are spread over the nodes like a shuffle
+    but give the same answer on every pass"""
+    return zlib.crc32(("%s:%s" % (seed, node_name)).encode())
+
+
+def select_nodes_to_block(nodes, calculate_priority, number_unschedulable, seed=0):
+    """Return the nodes to block and the nodes to unblock so that
+    the number_unschedulable nodes with the smallest priority, and
+    only those, end up unschedulable
+
+    Nodes to block come in priority order, nodes to unblock in
+    the order of the input list"""
+    priority = [(calculate_priority(node), tiebreak_key(seed, node.name), index)
+                for index, node in enumerate(nodes)]
+    selected = heapq.nsmallest(number_unschedulable, priority)
+    selected_names = {nodes[index].name for _, _, index in selected}
+
+    toBlock = [nodes[index] for _, _, index in selected
+               if not nodes[index].unschedulable]
+    toUnBlock = [node for node in nodes
+                 if node.unschedulable and node.name not in selected_names]
+    return toBlock, toUnBlock
+
+
+def get_unschedulable_target(node_count, unschedulable_count, goal, stable_goal):
+    """Return how many of node_count nodes, unschedulable_count of
+    them unschedulable now, to keep unschedulable: as many as the goal
+    leaves when that unblocks nodes, but no more than stable_goal
+    leaves when that blocks them"""
+    target = max(node_count - goal, 0)
+    if target <= unschedulable_count:
+        return target
+    return max(min(target, node_count - stable_goal), unschedulable_count)
+
+
 class Autoscaler:
-    def __init__(self, options):
+    def __init__(self, options, cluster=None, k8s=None, clock=time.time):
+        """cluster and k8s default to the Google Cloud and Kubernetes
+        controls chosen by options; clock gives the current time in
+        seconds since the epoch"""
         self._options = options
-        self._cluster = gce_cluster_control(options)
-
-        if options.test_k8s:
+        self._clock = clock
+        self._prices = get_price_table(options)
+        # goal is the total number of nodes we want in the cluster,
+        # split into the goals of the node pools when there are pools
+        self._pools = parse_node_pools(options.node_pools, self._prices)
+        self._cluster = cluster if cluster is not None else gce_cluster_control(options, pools=self._pools)
+
+        if k8s is not None:
+            self._k8s = k8s
+        elif options.test_k8s:
             self._k8s = k8s_control_test(options)
         else:
             self._k8s = k8s_control(options)
 
-        # goal is the total number of nodes we want in the cluster
+        self._billing = billing_model(options.billing_minimum, options.billing_increment)
+        self._pool_goals = {}
+        # nodes the pods the scheduler found no node for need: cordoned
+        # nodes to uncordon, and new nodes by pool name, None without
+        # pools, beyond the size the group was last resized to
+        self._pending_uncordon = set()
+        self._pending_new_nodes = {}
+        self._requested_sizes = {}
+        # cordon flags and goals of earlier passes
+        self._state = load_state(options.state_file) if options.state_file else scaling_state()
         self._non_critical_nodes = []
+        self._readiness = None
+        # what the current scaling pass did, for the trace
+        self._decision = {}
+        self._trace = trace_recorder(options.trace_file) if options.trace_file else None
+        self._history = None
+        if options.forecast_horizon > 0:
+            if options.forecast_file:
+                self._history = load_history(options.forecast_file, options.forecast_interval, options.forecast_weeks)
+            else:
+                self._history = demand_history(options.forecast_interval, options.forecast_weeks)
 
         self._add_slack_handler()
 
+    def _confirm(self, prompt):
+        return self._options.yes or confirm(prompt)
+
+    def update_state(self, pods, nodes):
+        """Replace the cluster state used by the next scale() call,
+        e.g. from a cluster_mirror in daemon mode"""
+        self._k8s.update_state(pods, nodes)
+
+    def get_k8s(self):
+        return self._k8s
+
     def scale(self):
         """Update the nodes property based on scaling policy
         and create new nodes if necessary"""
-
+        with metrics.time_phase("scale"):
+            self._scale()
+        metrics.SCALE_PASSES.inc()
+        if self._options.metrics_textfile:
+            try:
+                metrics.REGISTRY.write_textfile(self._options.metrics_textfile)
+            except OSError:
+                scale_logger.exception("Could not write the metrics")
+
+    def _scale(self):
         scale_logger.info("Scaling on cluster %s", self._k8s.get_cluster_name())
 
-        self._goal = schedule_goal(self._k8s, self._options)
+        self._cluster.reset_cache()
+        with metrics.time_phase("goal"):
+            forecast = self._forecast_demand()
+            if self._pools:
+                self._pool_goals = schedule_pool_goals(self._k8s, self._options, self._pools, forecast).counts
+                # nodes of no pool are left as they are
+                self._goal = sum(self._pool_goals.values()) + sum(
+                    1 for node in self._k8s.get_nodes() if get_node_pool(self._pools, node.name) is None)
+            else:
+                self._goal = schedule_goal(self._k8s, self._options, forecast)
+            pending_count = self._plan_for_pending_pods()
+        self._decision = {"goal": self._goal, "forecast": forecast}
+        if self._pools:
+            self._decision["pool_goals"] = dict(self._pool_goals)
+        if pending_count:
+            self._decision["pending_pods"] = pending_count
+            self._decision["pending_uncordon"] = sorted(self._pending_uncordon)
+            self._decision["pending_new_nodes"] = dict(self._pending_new_nodes)
+        self._decision["hourly_spend"] = get_projected_hourly_spend(
+            self._k8s, self._prices, self._goal, self._pools, self._pool_goals)
+        self._state.record_goal(self._clock(), self._goal, self._pool_goals, self._options.scale_down_window)
         self._update_non_critical_node_list()
 
         scale_logger.info("Total nodes in the cluster: %i", len(self._k8s.get_nodes()))
@@ -46,40 +161,195 @@ class Autoscaler:
         scale_logger.info("Found %i critical nodes",
                           len(self._k8s.get_nodes()) - len(self._non_critical_nodes))
         scale_logger.info("Recommending total %i nodes for service", self._goal)
+        if self._decision["hourly_spend"] is not None:
+            scale_logger.info("Projected spend at the goal: $%.2f per hour", self._decision["hourly_spend"])
 
-        if confirm(("Updating unschedulable flags to ensure %i nodes are unschedulable" % max(len(self._k8s.get_nodes()) - self._goal, 0))):
+        if self._confirm(("Updating unschedulable flags to ensure %i nodes are unschedulable" % max(len(self._k8s.get_nodes()) - self._goal, 0))):
             self._update_unschedulable()
 
-        if self._goal > len(self._k8s.get_nodes()):
+        if self._get_missing_node_count() > 0:
+            size = len(self._k8s.get_nodes()) + self._get_missing_node_count()
             scale_logger.info(
-                "Resize the cluster to %i nodes to satisfy the demand", self._goal)
+                "Resize the cluster to %i nodes to satisfy the demand", size)
+            with metrics.time_phase("resize"):
+                if self._options.test_cloud:
+                    self._resize_for_new_nodes_test()
+                else:
+                    slack_logger.info(
+                        "Cluster resized to %i nodes to satisfy the demand", size)
+                    self._resize_for_new_nodes()
+        with metrics.time_phase("shutdown"):
             if self._options.test_cloud:
-                self._resize_for_new_nodes_test()
+                self._shutdown_empty_nodes_test()
             else:
-                slack_logger.info(
-                    "Cluster resized to %i nodes to satisfy the demand", self._goal)
-                self._resize_for_new_nodes()
-        if self._options.test_cloud:
-            self._shutdown_empty_nodes_test()
+                # CRITICAL NODES SHOULD NOT BE SHUTDOWN
+                self._shutdown_empty_nodes()
+        self._save_state()
+
+        if self._trace is not None:
+            try:
+                with metrics.time_phase("trace"):
+                    self._trace.record(self._k8s, self._options, self._decision)
+            except (OSError, TypeError, ValueError):
+                scale_logger.exception("Could not record the scaling pass")
+
+        self._record_metrics()
+
+    def _record_metrics(self):
+        """Set the gauges describing the cluster after this pass"""
+        if not metrics.is_enabled():
+            return
+        metrics.NODES.set(len(self._k8s.get_nodes()))
+        metrics.GOAL_NODES.set(self._goal)
+        if self._decision.get("hourly_spend") is not None:
+            metrics.HOURLY_SPEND.set(self._decision["hourly_spend"])
+        metrics.UTILIZATION.set(get_effective_utilization(self._k8s))
+        metrics.CORDONED_NODES.set(
+            self._k8s.get_num_unschedulable() + len(self._decision.get("blocked", ())) -
+            len(self._decision.get("unblocked", ())))
+
+    def _save_state(self):
+        """Forget the nodes gone from the cluster and write the state
+        to STATE_FILE if set"""
+        self._state.forget_nodes(node.name for node in self._k8s.get_nodes())
+        if self._options.state_file:
+            try:
+                self._state.save(self._options.state_file)
+            except OSError:
+                scale_logger.exception("Could not save the scaling state")
+
+    def _get_stable_goals(self, now):
+        """Return the goal and the pool goals blocking nodes aims for:
+        the highest of the passes of the last SCALE_DOWN_WINDOW
+        seconds, including this one"""
+        goal, pool_goals = self._state.get_stable_goal(now, self._options.scale_down_window)
+        if goal is None:
+            return self._goal, self._pool_goals
+        if goal > self._goal:
+            scale_logger.info("Holding the goal at %i nodes, the highest of the last %i seconds",
+                              goal, self._options.scale_down_window)
+        return max(goal, self._goal), {name: max(pool_goals.get(name, pool_goal), pool_goal)
+                                       for name, pool_goal in self._pool_goals.items()}
+
+    def _forecast_demand(self):
+        """Record the current memory demand in the history and return
+        the peak demand expected over the forecast horizon, None when
+        forecasting is off"""
+        if self._history is None:
+            return None
+        now = self._clock()
+        self._history.record(now, self._k8s.get_total_cluster_memory_usage())
+        if self._options.forecast_file:
+            try:
+                self._history.save(self._options.forecast_file)
+            except OSError:
+                scale_logger.exception("Could not save the demand history")
+        return forecast_peak(self._history, now, self._options.forecast_horizon,
+                             self._options.forecast_weeks, self._options.forecast_trend_window)
+
+    def _plan_for_pending_pods(self):
+        """Find the cordoned nodes to uncordon and the new nodes to add
+        for the pods the scheduler found no node for, raising the goal
+        to keep those nodes schedulable; return the number of such pods
+
+        Uncordoning is free and instant, so new nodes only take the
+        pods no cordoned node has room for"""
+        self._pending_uncordon = set()
+        self._pending_new_nodes = {}
+        self._requested_sizes = {}
+        pods = [pod for pod in self._k8s.get_pods() if pod.phase == "Pending" and pod.unschedulable]
+        if not pods:
+            return 0
+        nodes = self._k8s.get_nodes()
+        snapshot = self._k8s.get_snapshot()
+        # nodes asked for but not ready yet take pending pods first,
+        # so passes made before they are ready ask for no more
+        if not self._pools:
+            pool = None
+            requested, booting = self._get_requested_nodes(None, nodes)
+            plan = place_pending_pods(snapshot, pods, max(self._options.max_nodes - requested + booting, 0))
         else:
-            # CRITICAL NODES SHOULD NOT BE SHUTDOWN
-            self._shutdown_empty_nodes()
+            # new nodes come from the pool with the cheapest memory
+            # among those with room for another node of every pod
+            nodes_by_pool = group_nodes_by_pool(self._pools, nodes)
+            requested_nodes = {candidate.name: self._get_requested_nodes(candidate.name, nodes_by_pool[candidate.name])
+                               for candidate in self._pools}
+            rooms = {}
+            for candidate in self._pools:
+                requested, booting = requested_nodes[candidate.name]
+                rooms[candidate.name] = candidate.max_nodes - requested + booting
+            largest = (max(pod.memory_request for pod in pods), max(pod.cpu_request for pod in pods))
+            candidates = [candidate for candidate in self._pools
+                          if rooms[candidate.name] > 0 and
+                          candidate.memory >= largest[0] and candidate.cpu >= largest[1]]
+            pool = min(candidates, key=lambda candidate: candidate.price / candidate.memory, default=None)
+            requested, booting = (0, 0) if pool is None else requested_nodes[pool.name]
+            room = 0 if pool is None else rooms[pool.name]
+            plan = place_pending_pods(snapshot, pods, room, None if pool is None else (pool.memory, pool.cpu))
+        new_node_count = max(plan.new_node_count - booting, 0)
+        scale_logger.info("%i pods could not be scheduled: uncordoning %i nodes and adding %i, %i more not ready yet",
+                          len(pods), len(plan.uncordon_names), new_node_count, booting)
+        if plan.unplaced_count:
+            scale_logger.warning("%i unschedulable pods fit on no node", plan.unplaced_count)
+
+        self._pending_uncordon = set(plan.uncordon_names)
+        if new_node_count:
+            self._pending_new_nodes[None if pool is None else pool.name] = new_node_count
+            self._requested_sizes[None if pool is None else pool.name] = requested
+        # the nodes schedulable now, and the ones to uncordon, stay so
+        if not self._pools:
+            self._goal = max(self._goal, sum(1 for node in nodes if not node.unschedulable) + len(plan.uncordon_names))
+            return len(pods)
+        for name, pool_nodes in group_nodes_by_pool(self._pools, nodes).items():
+            self._pool_goals[name] = max(self._pool_goals[name], sum(
+                1 for node in pool_nodes if not node.unschedulable or node.name in self._pending_uncordon))
+        self._goal = max(self._goal, sum(self._pool_goals.values()) + sum(
+            1 for node in nodes if get_node_pool(self._pools, node.name) is None))
+        return len(pods)
+
+    def _get_requested_nodes(self, pool_name, pool_nodes):
+        """Return the number of nodes the group of the pool, None for
+        the single group, was last resized to, and how many of them
+        are not ready yet, whether they registered or not"""
+        size = self._cluster.get_target_size(pool_name)
+        size = len(pool_nodes) if size is None else max(size, len(pool_nodes))
+        return size, size - sum(1 for node in pool_nodes if node.ready)
+
+    def _get_resize_targets(self):
+        """Return the size to grow each pool to, by pool name, or the
+        single group, by None: enough nodes for the goal and, beyond
+        the size last asked for, for the new nodes pending pods need;
+        pools that need not grow are left out"""
+        nodes = self._k8s.get_nodes()
+        if not self._pools:
+            if None not in self._pending_new_nodes:
+                return {None: self._goal}
+            return {None: max(self._goal, self._requested_sizes[None] + self._pending_new_nodes[None])}
+        targets = {}
+        for name, pool_nodes in group_nodes_by_pool(self._pools, nodes).items():
+            target = max(self._pool_goals[name], self._requested_sizes.get(name, len(pool_nodes)) +
+                         self._pending_new_nodes.get(name, 0))
+            if target > len(pool_nodes):
+                targets[name] = target
+        return targets
+
+    def _get_missing_node_count(self):
+        """Return the number of nodes to add to reach the goal, of
+        every pool when there are pools, and to run pending pods"""
+        targets = self._get_resize_targets()
+        if not self._pools:
+            return targets[None] - len(self._k8s.get_nodes())
+        nodes_by_pool = group_nodes_by_pool(self._pools, self._k8s.get_nodes())
+        return sum(target - len(nodes_by_pool[name]) for name, target in targets.items())
 
     def _update_non_critical_node_list(self):
         # a list of nodes that are NOT critical
         self._non_critical_nodes = self._get_non_critical_nodes()
 
-        # Shuffle the node list so that when there are multiple nodes
-        # with same number of pods, they will be randomly picked to
-        # be made unschedulable
-        random.shuffle(self._non_critical_nodes)
-
     def _get_non_critical_nodes(self):
-        nodes = []
-        for node in self._k8s.get_nodes():
-            if node.metadata.name not in self._k8s.get_critical_node_names():
-                nodes.append(node)
-        return nodes
+        snapshot = self._k8s.get_snapshot()
+        return [node for node in self._k8s.get_nodes()
+                if not snapshot.is_critical(node.name)]
 
     def _shutdown_empty_nodes(self, test=False):
         """
@@ -88,15 +358,35 @@ class Autoscaler:
 
         CRITICAL NODES SHOULD NEVER BE INCLUDED IN THE INPUT LIST
         """
-        count = 0
+        to_shutdown = []
+        within_minimum = []
+        now = self._clock()
+        # the records still show the nodes unblocked in this pass
+        unblocked = set(self._decision.get("unblocked", ()))
         for node in self._non_critical_nodes:
-            if self._k8s.get_pods_number_on_node(node) == 0 and node.spec.unschedulable:
-                if confirm(("Shutting down empty node: %s" % node.metadata.name)):
+            if node.name in unblocked or (self._pools and get_node_pool(self._pools, node.name) is None):
+                continue
+            if self._k8s.get_pods_number_on_node(node) == 0 and node.unschedulable:
+                if self._billing.is_within_minimum(node, now):
+                    # already paid for, it may yet be unblocked
+                    scale_logger.info("Keeping empty node %s, billed for %i more seconds",
+                                      node.name, self._billing.get_prepaid_seconds(node, now))
+                    within_minimum.append(node.name)
+                elif self._confirm(("Shutting down empty node: %s" % node.name)):
                     scale_logger.info(
-                        "Shutting down empty node: %s", node.metadata.name)
-                    if not test:
-                        count += 1
-                        self._cluster.shutdown_specified_node(node.metadata.name)
+                        "Shutting down empty node: %s", node.name)
+                    to_shutdown.append(node.name)
+        self._decision["shutdown"] = to_shutdown
+        self._decision["within_billing_minimum"] = within_minimum
+        if test or not to_shutdown:
+            return
+
+        count = 0
+        for name, status in self._cluster.shutdown_nodes(to_shutdown).items():
+            if status == SHUTDOWN_REQUESTED:
+                count += 1
+            else:
+                scale_logger.warning("Could not shut down node %s: %s", name, status)
         if count > 0:
             scale_logger.info("Shut down %d empty nodes", count)
             slack_logger.info("Shut down %d empty nodes", count)
@@ -104,38 +394,86 @@ class Autoscaler:
     def _shutdown_empty_nodes_test(self):
         self._shutdown_empty_nodes(True)
 
-    def _resize_for_new_nodes(self, test=False, wait_time=None):
-        """create new nodes to match self._goal required
-        only for scaling up"""
-        if confirm(("Resizing up to: %d nodes" % self._goal)):
-            scale_logger.info("Resizing up to: %d nodes", self._goal)
-            if not test:
-                self._cluster.add_new_node(self._goal)
-                if not wait_time and wait_time != 0:
-                    wait_time = 130
-                scale_logger.debug(
-                    "Sleeping for %i seconds for the node to be ready for populating", wait_time)
-                time.sleep(wait_time)
-                populate(self._k8s)
+    def _resize_for_new_nodes(self, test=False):
+        """create new nodes to match self._goal required, and
+        the nodes pending pods need, only for scaling up; images
+        are pulled onto each new node once it is ready, in the
+        background"""
+        size = len(self._k8s.get_nodes()) + self._get_missing_node_count()
+        if self._confirm(("Resizing up to: %d nodes" % size)):
+            scale_logger.info("Resizing up to: %d nodes", size)
+            self._decision["resized_to"] = size
+            if test:
+                return
+            targets = self._get_resize_targets()
+            if not self._pools:
+                operation = self._cluster.add_new_node(targets[None])
+                self._track_new_nodes(operation)
+                return
+            operations = []
+            for pool in self._pools:
+                if pool.name in targets:
+                    scale_logger.info("Resizing pool %s up to: %d nodes", pool.name, targets[pool.name])
+                    operations.append(self._cluster.add_new_node(targets[pool.name], pool.name))
+            self._track_new_nodes(operations)
+
+    def _track_new_nodes(self, operation):
+        """Start pulling images onto the nodes added by the resize
+        operation, or list of operations, as they become ready, in
+        the background"""
+        expected_new = self._get_missing_node_count()
+        if self._readiness is not None and not self._readiness.is_done():
+            # the new tracker follows the earlier new nodes too
+            self._readiness.stop()
+            known_node_names = self._readiness.get_known_node_names()
+            expected_new += self._readiness.get_outstanding_count()
+        else:
+            # nodes registered but not ready yet are new nodes too
+            known_node_names = [node.name for node in self._k8s.get_nodes() if node.ready]
+            expected_new += sum(1 for node in self._k8s.get_nodes() if not node.ready)
+        self._readiness = readiness_tracker(
+            self._cluster, self._k8s.get_core_api(), operation,
+            known_node_names, expected_new,
+            lambda node_name: populate_node(self._k8s, node_name, self._options),
+            initial_delay=self._options.readiness_initial_delay,
+            max_delay=self._options.readiness_max_delay,
+            timeout=self._options.readiness_timeout,
+            workers=self._options.prepull_workers,
+            page_size=self._options.list_page_size).start()
+
+    def wait_for_new_nodes(self):
+        """Block until the nodes of the last resize are ready and
+        populated, or given up on"""
+        if self._readiness is not None:
+            self._readiness.wait()
 
     def _resize_for_new_nodes_test(self):
         self._resize_for_new_nodes(True)
 
     def _add_slack_handler(self):
-        slack_logger.addHandler(slack_handler(self._options.slack_token))
+        # every Autoscaler of the process posts through the same handler,
+        # so that a message is sent once however many clusters it scales
+        if any(isinstance(handler, slack_handler) for handler in slack_logger.handlers):
+            return
+        slack_logger.addHandler(slack_handler(
+            self._options.slack_token,
+            window=self._options.slack_window,
+            capacity=self._options.slack_queue_size))
         if not self._options.slack_token:
             scale_logger.info(
                 "No message will be sent to slack, since there is no token provided")
 
     def _update_nodes(self, nodes, is_unschedulable):
         """Update given list of nodes with given
-        unschedulable property"""
+        unschedulable property; return the names of
+        the nodes actually updated"""
 
-        updated = []
-        for node in nodes:
-            self._k8s.set_unschedulable(node.metadata.name, is_unschedulable)
-            updated.append(node.metadata.name)
-        return updated
+        result = self._k8s.set_unschedulable_bulk(
+            [node.name for node in nodes], is_unschedulable)
+        if result.failed:
+            scale_logger.warning(
+                "Could not update %i nodes: %s", len(result.failed), ", ".join(result.failed))
+        return result.succeeded
 
     def _update_unschedulable(self, calculate_priority=None):
         """Attempt to make sure given number of
@@ -146,11 +484,25 @@ class Autoscaler:
         calculate_priority should be a function
         that takes a node and return its priority value
         for being blocked; smallest == highest
-        priority; default implementation uses get_pods_number_on_node
+        priority; default implementation depends on
+        options.cordon_priority: "drain_cost" ranks nodes
+        by how soon they are expected to empty, "pods"
+        uses get_pods_number_on_node
+
+        Nodes are unblocked for the goal right away, but only blocked
+        down to the highest goal of the last SCALE_DOWN_WINDOW seconds.
+        Within CORDON_DWELL seconds of the autoscaler setting their
+        flag, blocked nodes are the last unblocked and unblocked nodes
+        are not blocked again, so that a demand swinging around a bound
+        does not flip the same nodes on every pass
 
         CRITICAL NODES SHOULD NOT BE INCLUDED IN THE INPUT LIST"""
 
-        number_unschedulable = max(len(self._k8s.get_nodes()) - self._goal, 0)
+        now = self._clock()
+        stable_goal, stable_pool_goals = self._get_stable_goals(now)
+        number_unschedulable = get_unschedulable_target(
+            len(self._k8s.get_nodes()), sum(1 for node in self._non_critical_nodes if node.unschedulable),
+            self._goal, stable_goal)
         assert number_unschedulable >= 0
         number_unschedulable = int(number_unschedulable)
 
@@ -158,47 +510,64 @@ class Autoscaler:
             "Updating unschedulable flags to ensure %i nodes are unschedulable", number_unschedulable)
 
         if calculate_priority is None:
-            # Default implementation based on get_pods_number_on_node
-            def calculate_priority(node): return self._k8s.get_pods_number_on_node(node)
-
-        schedulable_nodes = []
-        unschedulable_nodes = []
-
-        priority = []
-
-        # Analyze nodes status and establish blocking priority
-        for count in range(len(self._non_critical_nodes)):
-            if self._non_critical_nodes[count].spec.unschedulable:
-                unschedulable_nodes.append(self._non_critical_nodes[count])
-            else:
-                schedulable_nodes.append(self._non_critical_nodes[count])
-            priority.append(
-                (calculate_priority(self._non_critical_nodes[count]), count))
-
-        # Attempt to modify property based on priority
-        toBlock = []
-        toUnBlock = []
-
-        heapq.heapify(priority)
-        for _ in range(number_unschedulable):
-            if len(priority) > 0:
-                _, index = heapq.heappop(priority)
-                if self._non_critical_nodes[index] in schedulable_nodes:
-                    toBlock.append(self._non_critical_nodes[index])
+            if self._options.cordon_priority == "pods":
+                def calculate_priority(node): return self._k8s.get_pods_number_on_node(node)
             else:
-                break
-        for _, index in priority:
-            if self._non_critical_nodes[index] in unschedulable_nodes:
-                toUnBlock.append(self._non_critical_nodes[index])
-
-        self._update_nodes(toBlock, True)
-        scale_logger.debug("%i nodes newly blocked", len(toBlock))
-        self._update_nodes(toUnBlock, False)
-        scale_logger.debug("%i nodes newly unblocked", len(toUnBlock))
-        if (len(toBlock) != 0 or len(toUnBlock) != 0) and (len(toBlock) != len(toUnBlock)) and not self._k8s.is_test():
+                drain_costs = get_drain_costs(self._k8s.get_snapshot(), self._options, self._clock())
+
+                def calculate_priority(node): return drain_costs[node.name]
+
+        def is_dwelling(node, unschedulable=False):
+            age = self._state.get_flag_age(node.name, unschedulable, now)
+            return age is not None and age < self._options.cordon_dwell
+
+        # nodes cordoned within CORDON_DWELL seconds stay blocked first,
+        # and nodes uncordoned within it are blocked last, and then left
+        # schedulable
+        # and the nodes pending pods need are the last of all
+        def ranked_priority(node):
+            if node.name in self._pending_uncordon:
+                return (3, 0)
+            return (1 - is_dwelling(node, True) + is_dwelling(node), calculate_priority(node))
+
+        if not self._pools:
+            toBlock, toUnBlock = select_nodes_to_block(
+                self._non_critical_nodes, ranked_priority,
+                number_unschedulable, self._options.tiebreak_seed)
+        else:
+            # each pool keeps its own goal of schedulable nodes
+            toBlock, toUnBlock = [], []
+            nodes_by_pool = group_nodes_by_pool(self._pools, self._k8s.get_nodes())
+            non_critical_by_pool = group_nodes_by_pool(self._pools, self._non_critical_nodes)
+            for pool in self._pools:
+                candidates = non_critical_by_pool[pool.name]
+                block, unblock = select_nodes_to_block(
+                    candidates, ranked_priority,
+                    get_unschedulable_target(
+                        len(nodes_by_pool[pool.name]), sum(1 for node in candidates if node.unschedulable),
+                        self._pool_goals[pool.name], stable_pool_goals[pool.name]),
+                    self._options.tiebreak_seed)
+                toBlock.extend(block)
+                toUnBlock.extend(unblock)
+        held = [node.name for node in toBlock if is_dwelling(node)]
+        if held:
+            scale_logger.info("Keeping %i recently uncordoned nodes schedulable", len(held))
+            toBlock = [node for node in toBlock if node.name not in held]
+
+        with metrics.time_phase("cordon"):
+            blocked = self._update_nodes(toBlock, True)
+            unblocked = self._update_nodes(toUnBlock, False)
+        scale_logger.debug("%i nodes newly blocked", len(blocked))
+        scale_logger.debug("%i nodes newly unblocked", len(unblocked))
+        self._state.record_flags(blocked, True, now)
+        self._state.record_flags(unblocked, False, now)
+        self._decision["blocked"] = blocked
+        self._decision["unblocked"] = unblocked
+        self._decision["held_schedulable"] = held
+        if (len(blocked) != 0 or len(unblocked) != 0) and (len(blocked) != len(unblocked)) and not self._k8s.is_test():
             slack_logger.info(
-                "%i nodes newly blocked, %i nodes newly unblocked", len(toBlock), len(toUnBlock))
-        if len(toUnBlock) != 0:
-            populate(self._k8s)
+                "%i nodes newly blocked, %i nodes newly unblocked", len(blocked), len(unblocked))
+        if len(unblocked) != 0:
+            populate(self._k8s, self._options)
 
-        return len(toBlock) - len(toUnBlock)
+        return len(blocked) - len(unblocked)
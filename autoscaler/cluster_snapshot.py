@@ -0,0 +1,204 @@
+#!/usr/bin/python3
+
+"""Immutable, indexed view of the pods and nodes of a cluster.
+
+Built once from the PodRecord and NodeRecord lists, so that per-node
+queries do not need to walk every pod again. Resource quantities are
+kept in columns (one entry per pod or per node) that the workload
+policies sum and group over. The columns are handed out as memoryviews
+over bytes, so callers cannot change them, without copying them on
+every call."""
+
+from array import array
+from types import MappingProxyType
+
+from .utils import check_list_intersection
+
+
+def _freeze_column(values):
+    """Return a read-only memoryview over a copy of an array;
+    memoryview.toreadonly needs Python 3.8"""
+    return memoryview(values.tobytes()).cast(values.typecode)
+
+
+class ClusterSnapshot:
+
+    """Per-node pod counts, per-node memory requests, critical
+    nodes and the schedulable/unschedulable split, all computed
+    in a single pass over the pods and the nodes"""
+
+    __slots__ = ('_pod_counts', '_memory_requests', '_critical_node_names',
+                 '_critical_node_set', '_schedulable_node_names',
+                 '_unschedulable_node_names', '_num_schedulable',
+                 '_pod_node_names', '_pod_labels', '_pod_memory_requests',
+                 '_pod_cpu_requests', '_pod_start_times', '_node_names', '_node_memory_capacities',
+                 '_node_cpu_capacities', '_node_unschedulable', '_node_capacity_index',
+                 '_total_memory_request', '_schedulable_memory_capacity')
+
+    def __init__(self, pods, nodes, preemptible_labels):
+        pod_counts = {}
+        memory_requests = {}
+        critical_node_names = []
+        critical_node_set = set()
+        pod_node_names = []
+        pod_labels = []
+        pod_memory_requests = array('q')
+        pod_cpu_requests = array('q')
+        pod_start_times = []
+        for pod in pods:
+            host_name = pod.node_name
+            memory_request = pod.memory_request
+            pod_node_names.append(host_name)
+            pod_labels.append(pod.labels)
+            pod_memory_requests.append(memory_request)
+            pod_cpu_requests.append(pod.cpu_request)
+            pod_start_times.append(pod.start_time)
+            pod_counts[host_name] = pod_counts.get(host_name, 0) + 1
+            memory_requests[host_name] = memory_requests.get(host_name, 0) + memory_request
+            if host_name not in critical_node_set and \
+                    not check_list_intersection(pod.labels, preemptible_labels):
+                critical_node_set.add(host_name)
+                critical_node_names.append(host_name)
+
+        schedulable_node_names = []
+        unschedulable_node_names = []
+        num_schedulable = 0
+        node_names = []
+        node_memory_capacities = array('q')
+        node_cpu_capacities = array('q')
+        node_unschedulable = []
+        schedulable_memory_capacity = 0
+        for node in nodes:
+            capacity = node.memory_capacity
+            node_names.append(node.name)
+            node_memory_capacities.append(capacity)
+            node_cpu_capacities.append(node.cpu_capacity)
+            node_unschedulable.append(bool(node.unschedulable))
+            if node.unschedulable:
+                unschedulable_node_names.append(node.name)
+            else:
+                schedulable_node_names.append(node.name)
+                schedulable_memory_capacity += capacity
+                if node.name not in critical_node_set:
+                    num_schedulable += 1
+
+        set_attribute = object.__setattr__
+        set_attribute(self, '_pod_counts', MappingProxyType(pod_counts))
+        set_attribute(self, '_memory_requests', MappingProxyType(memory_requests))
+        set_attribute(self, '_critical_node_names', tuple(critical_node_names))
+        set_attribute(self, '_critical_node_set', frozenset(critical_node_set))
+        set_attribute(self, '_schedulable_node_names', tuple(schedulable_node_names))
+        set_attribute(self, '_unschedulable_node_names', tuple(unschedulable_node_names))
+        set_attribute(self, '_num_schedulable', num_schedulable)
+        set_attribute(self, '_pod_node_names', tuple(pod_node_names))
+        set_attribute(self, '_pod_labels', tuple(pod_labels))
+        set_attribute(self, '_pod_memory_requests', _freeze_column(pod_memory_requests))
+        set_attribute(self, '_pod_cpu_requests', _freeze_column(pod_cpu_requests))
+        set_attribute(self, '_pod_start_times', tuple(pod_start_times))
+        set_attribute(self, '_node_names', tuple(node_names))
+        set_attribute(self, '_node_memory_capacities', _freeze_column(node_memory_capacities))
+        set_attribute(self, '_node_cpu_capacities', _freeze_column(node_cpu_capacities))
+        set_attribute(self, '_node_unschedulable', tuple(node_unschedulable))
+        set_attribute(self, '_node_capacity_index', MappingProxyType(
+            dict(zip(node_names, node_memory_capacities))))
+        set_attribute(self, '_total_memory_request', sum(pod_memory_requests))
+        set_attribute(self, '_schedulable_memory_capacity', schedulable_memory_capacity)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ClusterSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("ClusterSnapshot is immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def get_pods_number_on_node(self, node_name):
+        """Return the number of pods on the named node"""
+        return self._pod_counts.get(node_name, 0)
+
+    def get_memory_request_on_node(self, node_name):
+        """Return the sum of memory requests of pods on the named node"""
+        return self._memory_requests.get(node_name, 0)
+
+    def get_critical_node_names(self):
+        """Return the names of nodes running critical pods,
+        in the order they were first seen"""
+        return self._critical_node_names
+
+    def is_critical(self, node_name):
+        return node_name in self._critical_node_set
+
+    def get_schedulable_node_names(self):
+        return self._schedulable_node_names
+
+    def get_unschedulable_node_names(self):
+        return self._unschedulable_node_names
+
+    def get_num_schedulable(self):
+        """Return number of non-critical nodes schedulable"""
+        return self._num_schedulable
+
+    def get_num_unschedulable(self):
+        """Return number of nodes unschedulable"""
+        return len(self._unschedulable_node_names)
+
+    def get_total_memory_request(self):
+        """Return the sum of memory requests of all pods"""
+        return self._total_memory_request
+
+    def get_schedulable_memory_capacity(self):
+        """Return the total memory capacity of schedulable nodes"""
+        return self._schedulable_memory_capacity
+
+    def get_node_memory_capacity(self, node_name):
+        return self._node_capacity_index[node_name]
+
+    def get_pod_memory_requests(self):
+        """Return the memory request of every pod, in pod order;
+        get_pod_node_names gives the node of each entry"""
+        return self._pod_memory_requests
+
+    def get_pod_cpu_requests(self):
+        """Return the CPU request of every pod in millicores,
+        in pod order"""
+        return self._pod_cpu_requests
+
+    def get_pod_start_times(self):
+        """Return when every pod started, in seconds since the epoch,
+        in pod order; None for pods not started yet"""
+        return self._pod_start_times
+
+    def get_pod_node_names(self):
+        """Return the node of every pod in pod order, None for
+        pods not scheduled yet"""
+        return self._pod_node_names
+
+    def get_node_names(self):
+        return self._node_names
+
+    def get_node_memory_capacities(self):
+        """Return the memory capacity of every node, in node order"""
+        return self._node_memory_capacities
+
+    def get_node_cpu_capacities(self):
+        """Return the CPU capacity of every node in millicores,
+        in node order"""
+        return self._node_cpu_capacities
+
+    def get_node_unschedulable(self):
+        """Return whether every node is unschedulable, in node order"""
+        return self._node_unschedulable
+
+    def get_memory_request_by_label(self, label):
+        """Return a dict from each value of the given label key to
+        the sum of memory requests of pods carrying it"""
+        result = {}
+        for labels, memory_request in zip(self._pod_labels, self._pod_memory_requests):
+            if labels and label in labels:
+                value = labels[label]
+                result[value] = result.get(value, 0) + memory_request
+        return result
@@ -2,6 +2,11 @@
 
 import logging
 import sys
+import time
+
+from . import metrics
+from .pools import get_node_pool, parse_node_pools
+from .pricing import get_price_table
 
 supported_platform = []
 
@@ -23,6 +28,14 @@ scale_logger = logging.getLogger("scale")
 scale_logger.info(
     "Can support cluster scaling on providers: %s", supported_platform)
 
+# per-node outcome of shutdown_nodes
+SHUTDOWN_REQUESTED = "requested"
+SHUTDOWN_NOT_FOUND = "not found"
+SHUTDOWN_FAILED = "failed"
+
+# status of a finished cloud operation, as get_operation_status reports it
+OPERATION_DONE = "DONE"
+
 
 class abstract_cluster_control:
 
@@ -34,15 +47,48 @@ class abstract_cluster_control:
     def shutdown_specified_node(self, name):
         pass
 
-    def add_new_node(self, cluster_size):
+    def shutdown_nodes(self, names):
+        """Shut down all named nodes, with as few requests as the
+        provider allows; return a dict from each name to
+        SHUTDOWN_REQUESTED, SHUTDOWN_NOT_FOUND or SHUTDOWN_FAILED
+
+        The default implementation shuts nodes down one by one"""
+        result = {}
+        for name in names:
+            try:
+                self.shutdown_specified_node(name)
+                result[name] = SHUTDOWN_REQUESTED
+            except Exception:
+                scale_logger.exception("Failed to shut down node %s", name)
+                result[name] = SHUTDOWN_FAILED
+        return result
+
+    def reset_cache(self):
+        """Called at the start of every scaling pass to drop
+        cloud state cached during the previous one"""
+        pass
+
+    def add_new_node(self, cluster_size, pool=None):
         """ONLY FOR CREATING NEW NODES to ensure
-        new _node_number is running
+        new _node_number is running; pool names the node
+        pool to grow when options.node_pools lists several
 
         NOT FOR SCALING DOWN: random behavior expected
         TODO: Assert check that new_node_number is larger
         than current cluster size"""
         pass
 
+    def get_operation_status(self, operation):
+        """Return the status of an operation returned by
+        add_new_node, OPERATION_DONE once it has finished"""
+        return OPERATION_DONE
+
+    def get_target_size(self, pool=None):
+        """Return the number of nodes the group, or the group of the
+        pool, was last resized to, booting ones included; None if
+        the provider does not tell"""
+        return None
+
 
 class azure_cluster_control(abstract_cluster_control):
 
@@ -77,10 +123,11 @@ class azure_cluster_control(abstract_cluster_control):
             ).name
 
     def __get_container_service(self, resource_group_name, container_service_name):
-        return self.compute.container_service.get(
-            self.resource_group_name,
-            self.container_service_name
-        )
+        with metrics.api_call("azure", "container_service.get"):
+            return self.compute.container_service.get(
+                self.resource_group_name,
+                self.container_service_name
+            )
 
     def __get_container_service_pool(self, container_service, segment):
         pools = self.container_service.agent_pool_profiles
@@ -102,27 +149,59 @@ class azure_cluster_control(abstract_cluster_control):
             return matches[0]
 
     def shutdown_specified_node(self, name):
-        return self.compute.virtual_machine_scale_set_vms.deallocate(
-            self.resource_group_name,
-            self.agent_pool_name,
-            self.__get_instance_id_from_name(name)
-        )
+        instance_id = self.__get_instance_id_from_name(name)
+        with metrics.api_call("azure", "virtual_machine_scale_set_vms.deallocate"):
+            return self.compute.virtual_machine_scale_set_vms.deallocate(
+                self.resource_group_name,
+                self.agent_pool_name,
+                instance_id
+            )
+
+    def shutdown_nodes(self, names):
+        """Deallocate all named nodes with a single scale set request"""
+        instance_ids = self.__get_instance_ids_from_names(names)
+        result = {name: SHUTDOWN_NOT_FOUND for name in names if name not in instance_ids}
+        if not instance_ids:
+            return result
+        scale_logger.debug("Shutting down nodes: %s", ", ".join(instance_ids))
+        try:
+            with metrics.api_call("azure", "virtual_machine_scale_sets.deallocate"):
+                self.compute.virtual_machine_scale_sets.deallocate(
+                    self.resource_group_name,
+                    self.agent_pool_name,
+                    instance_ids=list(instance_ids.values()))
+            status = SHUTDOWN_REQUESTED
+        except Exception:
+            scale_logger.exception("Failed to shut down %i nodes", len(instance_ids))
+            status = SHUTDOWN_FAILED
+        for name in instance_ids:
+            result[name] = status
+        return result
 
     def __get_instance_id_from_name(self, name):
-        # Azure python client is vague about it
-        # Possible native RESTful solution
-        # iterate through all vms
-        # See
-        # https://docs.microsoft.com/en-us/rest/api/virtualmachinescalesets/get-the-model-view-of-a-vm
-        pass
-
-    def add_new_node(self, cluster_size):
+        return self.__get_instance_ids_from_names([name]).get(name)
+
+    def __get_instance_ids_from_names(self, names):
+        """Return a dict from each given node name to the instance id
+        of its scale set VM; node names are the VM computer names"""
+        wanted = set(names)
+        result = {}
+        with metrics.api_call("azure", "virtual_machine_scale_set_vms.list"):
+            for vm in self.compute.virtual_machine_scale_set_vms.list(
+                    self.resource_group_name, self.agent_pool_name):
+                if vm.os_profile and vm.os_profile.computer_name in wanted:
+                    result[vm.os_profile.computer_name] = vm.instance_id
+        return result
+
+    def add_new_node(self, cluster_size, pool=None):
         """ONLY FOR CREATING NEW NODES to ensure
         new _node_number is running
 
         NOT FOR SCALING DOWN: random behavior expected
         TODO: Assert check that new_node_number is larger
         than current cluster size"""
+        if pool is not None:
+            raise NotImplementedError("Node pools are only supported on Google Cloud")
         scale_logger.debug("Resizing cluster to: %d", cluster_size)
         container_service = self.__get_container_service(
             self.resource_group_name, self.container_service_name)
@@ -130,37 +209,121 @@ class azure_cluster_control(abstract_cluster_control):
             container_service, self.agent_pool_name)
         assert cluster_size >= agent_pool.count
         agent_pool.count = cluster_size
-        return self.compute.container_services.create_or_update(
-            self.resource_group_name,
-            self.container_service_name,
-            container_service)
+        with metrics.api_call("azure", "container_services.create_or_update"):
+            return self.compute.container_services.create_or_update(
+                self.resource_group_name,
+                self.container_service_name,
+                container_service)
+
+    def get_operation_status(self, operation):
+        if operation is None or operation.done():
+            return OPERATION_DONE
+        return operation.status()
+
+
+def get_instance_name(instance_url):
+    """Return the instance name at the end of a Compute Engine
+    instance URL"""
+    return instance_url.rsplit('/', 1)[-1]
+
+
+class managed_instance_index:
+
+    """Maps the names of the instances of a managed instance group
+    to their URLs; the group is listed again only once the index is
+    older than ttl seconds, invalidated or asked for an unknown name"""
+
+    def __init__(self, list_instances, ttl, clock=time.monotonic):
+        self._list_instances = list_instances
+        self._ttl = ttl
+        self._clock = clock
+        self._urls = None
+        self._built_at = None
+
+    def invalidate(self):
+        self._urls = None
+
+    def _is_stale(self):
+        return self._urls is None or self._clock() - self._built_at >= self._ttl
+
+    def _build(self):
+        self._urls = {}
+        for instance in self._list_instances():
+            instance_url = instance['instance']
+            self._urls[get_instance_name(instance_url)] = instance_url
+        self._built_at = self._clock()
+
+    def get_url(self, name):
+        """Return the URL of the named instance, or None
+        if it is not part of the group"""
+        fresh = self._is_stale()
+        if fresh:
+            self._build()
+        url = self._urls.get(name)
+        if url is None and not fresh:
+            # the group may have changed since the last listing
+            self._build()
+            url = self._urls.get(name)
+        return url
+
+    def get_urls(self, names):
+        """Return a dict from each given name that is part of the
+        group to its URL, listing the group at most once"""
+        fresh = self._is_stale()
+        if fresh:
+            self._build()
+        if not fresh and any(name not in self._urls for name in names):
+            # the group may have changed since the last listing
+            self._build()
+        return {name: self._urls[name] for name in names if name in self._urls}
 
 
 class gce_cluster_control(abstract_cluster_control):
 
-    """Abstracts cluster scaling logic for Google Cloud"""
+    """Abstracts cluster scaling logic for Google Cloud, over the
+    managed instance group matching --context-for-cloud, or the group
+    of every node pool in options.node_pools"""
 
-    def __init__(self, options):
+    def __init__(self, options, compute=None, pools=None):
         """Needs to be initialized with options as an
-        instance of settings"""
+        instance of settings; compute defaults to the Compute
+        Engine API client, pools to the node pools of options
+        priced with its price table"""
 
         # Suppress weird warning during authentication
         logging.getLogger(
             'googleapiclient.discovery_cache').setLevel(logging.ERROR)
 
         self.options = options
-        self.credentials = GoogleCredentials.get_application_default()
-        self.compute = discovery.build(
-            'compute', 'v1', credentials=self.credentials)
+        if compute is None:
+            self.credentials = GoogleCredentials.get_application_default()
+            compute = discovery.build(
+                'compute', 'v1', credentials=self.credentials)
+        self.compute = compute
         self.zone = options.zone
         self.project = options.project
-        self.group = self.__configure__managed_group_name(
-            options.context_cloud)
+        if pools is None:
+            pools = parse_node_pools(options.node_pools, get_price_table(options))
+        self.pools = pools
+        # pool name, None without pools -> managed instance group name
+        if self.pools:
+            self.groups = {pool.name: self.__configure__managed_group_name(pool.segment)
+                           for pool in self.pools}
+            self.group = None
+        else:
+            self.group = self.__configure__managed_group_name(
+                options.context_cloud)
+            self.groups = {None: self.group}
+        self._instance_indexes = {
+            group: managed_instance_index(
+                lambda group=group: self.list_managed_instances(group), options.instance_index_ttl)
+            for group in self.groups.values()}
 
     def __configure__managed_group_name(self, segment):
         "Use self.compute to find a managed group that matches the segment"
-        managers = self.compute.instanceGroupManagers().list(
-            zone=self.zone, project=self.project).execute()['items']
+        with metrics.api_call("gce", "instanceGroupManagers.list"):
+            managers = self.compute.instanceGroupManagers().list(
+                zone=self.zone, project=self.project).execute()['items']
         matches = []
         for manager in managers:
             if segment in manager['name']:
@@ -178,55 +341,126 @@ class gce_cluster_control(abstract_cluster_control):
                 "Found managed pool %s for resizing", matches[0]['name'])
             return matches[0]["name"]
 
+    def get_group(self, node_name):
+        """Return the name of the managed instance group the named
+        node would belong to, None if it is in no node pool"""
+        if not self.pools:
+            return self.group
+        pool = get_node_pool(self.pools, node_name)
+        return None if pool is None else self.groups[pool.name]
+
     def shutdown_specified_node(self, name):
+        group = self.get_group(name)
+        node_url = None if group is None else self.__get_node_url_from_name(name, group)
+        if node_url is None:
+            scale_logger.error(
+                "Node %s is not part of managed group %s, not shutting it down", name, group)
+            return None
+
+        scale_logger.debug("Shutting down node: %s", name)
+        return self.__delete_instances([node_url], group)
+
+    def shutdown_nodes(self, names):
+        """Delete all named nodes with as few deleteInstances
+        requests as possible, one group at a time"""
+        names_by_group = {}
+        for name in names:
+            names_by_group.setdefault(self.get_group(name), []).append(name)
+        result = {}
+        for group, group_names in names_by_group.items():
+            instance_urls = {} if group is None else self._instance_indexes[group].get_urls(group_names)
+            for name in group_names:
+                if name not in instance_urls:
+                    scale_logger.error(
+                        "Node %s is not part of managed group %s, not shutting it down", name, group)
+                    result[name] = SHUTDOWN_NOT_FOUND
+
+            batch_names = list(instance_urls)
+            batch_size = self.options.delete_batch_size
+            for start in range(0, len(batch_names), batch_size):
+                batch = batch_names[start:start + batch_size]
+                scale_logger.debug("Shutting down nodes: %s", ", ".join(batch))
+                try:
+                    self.__delete_instances([instance_urls[name] for name in batch], group)
+                    status = SHUTDOWN_REQUESTED
+                except Exception:
+                    scale_logger.exception("Failed to shut down %i nodes", len(batch))
+                    status = SHUTDOWN_FAILED
+                for name in batch:
+                    result[name] = status
+        return result
+
+    def __delete_instances(self, instance_urls, group):
+        """Delete all given instances of the group with a single request"""
         request_body = {
-            "instances": [
-                self.__get_node_url_from_name(name)
-            ]
+            "instances": list(instance_urls)
         }
 
-        scale_logger.debug("Shutting down node: %s", name)
+        with metrics.api_call("gce", "instanceGroupManagers.deleteInstances"):
+            return self.compute.instanceGroupManagers().deleteInstances(
+                instanceGroupManager=group,
+                project=self.project,
+                zone=self.zone,
+                body=request_body).execute()
 
-        return self.compute.instanceGroupManagers().deleteInstances(
-            instanceGroupManager=self.group,
-            project=self.project,
-            zone=self.zone,
-            body=request_body).execute()
+    def reset_cache(self):
+        for index in self._instance_indexes.values():
+            index.invalidate()
 
-    def add_new_node(self, cluster_size):
+    def add_new_node(self, cluster_size, pool=None):
         """ONLY FOR CREATING NEW NODES to ensure
-        new _node_number is running
+        new _node_number is running; pool names the
+        node pool to grow when there are several
 
         NOT FOR SCALING DOWN: random behavior expected
         TODO: Assert check that new_node_number is larger
         than current cluster size"""
-        scale_logger.debug("Resizing cluster to: %d", cluster_size)
-
-        return self.compute.instanceGroupManagers().resize(
-            instanceGroupManager=self.group,
-            project=self.project,
-            zone=self.zone,
-            size=cluster_size).execute()
-
-    def list_managed_instances(self):
+        group = self.groups[pool]
+        scale_logger.debug("Resizing group %s to: %d", group, cluster_size)
+
+        with metrics.api_call("gce", "instanceGroupManagers.resize"):
+            return self.compute.instanceGroupManagers().resize(
+                instanceGroupManager=group,
+                project=self.project,
+                zone=self.zone,
+                size=cluster_size).execute()
+
+    def get_operation_status(self, operation):
+        """Return the status of the zone operation, logging
+        its errors once it is done"""
+        with metrics.api_call("gce", "zoneOperations.get"):
+            result = self.compute.zoneOperations().get(
+                project=self.project,
+                zone=self.zone,
+                operation=operation['name']).execute()
+        if result['status'] == OPERATION_DONE and 'error' in result:
+            scale_logger.error("Operation %s failed: %s", operation['name'], result['error'])
+        return result['status']
+
+    def get_target_size(self, pool=None):
+        """Return the target size of the managed instance group"""
+        group = self.groups[pool]
+        with metrics.api_call("gce", "instanceGroupManagers.get"):
+            return self.compute.instanceGroupManagers().get(
+                instanceGroupManager=group,
+                project=self.project,
+                zone=self.zone).execute()['targetSize']
+
+    def list_managed_instances(self, group=None):
         """Lists the instances a part of the
-        specified cluster group"""
-        scale_logger.debug("Gathering group: %s managed instances", self.group)
-        result = self.compute.instanceGroupManagers().listManagedInstances(
-            instanceGroupManager=self.group,
-            project=self.project,
-            zone=self.zone).execute()
+        specified cluster group, by default the only one"""
+        group = self.group if group is None else group
+        scale_logger.debug("Gathering group: %s managed instances", group)
+        with metrics.api_call("gce", "instanceGroupManagers.listManagedInstances"):
+            result = self.compute.instanceGroupManagers().listManagedInstances(
+                instanceGroupManager=group,
+                project=self.project,
+                zone=self.zone).execute()
         return result['managedInstances']
 
-    def __get_node_url_from_name(self, name):
-        """Gets the URL associated with the node name
-        TODO: Error handling for invalid names"""
-        node_url = ''
-        instances = self.list_managed_instances()
-        for instance in instances:
-            instance_url = instance['instance']
-            if name in instance_url:
-                node_url = instance_url
-                break
+    def __get_node_url_from_name(self, name, group):
+        """Gets the URL associated with the node name,
+        None if the group has no such instance"""
+        node_url = self._instance_indexes[group].get_url(name)
         scale_logger.debug("Node: %s has URL of: %s", name, node_url)
         return node_url
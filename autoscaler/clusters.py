@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+
+"""Scale several clusters from a single process: every cluster has its
+own settings and Autoscaler, and so its own Kubernetes API client, and
+the clusters are scaled concurrently by a shared pool of threads.
+
+A cluster failing, even to start, is logged and leaves the others
+scaling. The threads working on a cluster are named after its context,
+so that log lines tell the clusters apart."""
+
+import copy
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .autoscaler import Autoscaler
+from .daemon import cluster_mirror, scale_daemon
+
+scale_logger = logging.getLogger("scale")
+
+# settings naming files that every cluster keeps a copy of its own
+CLUSTER_FILES = ("state_file", "forecast_file", "trace_file")
+
+
+def get_cluster_file(path, context):
+    """Return path with the context inserted before the extensions of
+    the file name; an empty path stays empty"""
+    if not path:
+        return path
+    directory, name = os.path.split(path)
+    stem, dot, extensions = name.partition(".")
+    return os.path.join(directory, "%s-%s%s%s" % (stem, context.replace(os.sep, "_"), dot, extensions))
+
+
+def get_cluster_options(options, context, context_cloud=""):
+    """Return a copy of options for the cluster of context, whose
+    managed pool matches context_cloud, or context if empty"""
+    cluster_options = copy.copy(options)
+    cluster_options.context = context
+    cluster_options.context_cloud = context_cloud or context
+    for name in CLUSTER_FILES:
+        setattr(cluster_options, name, get_cluster_file(getattr(options, name), context))
+    return cluster_options
+
+
+class cluster_scheduler:
+
+    """Scales the clusters of cluster_options, a settings each, at most
+    `workers` of them at the same time
+
+    The Autoscaler of a cluster is made by autoscaler_factory from its
+    settings on first use, in the thread scaling it, and kept for the
+    passes to come"""
+
+    def __init__(self, cluster_options, workers=4, autoscaler_factory=Autoscaler, mirror_factory=cluster_mirror):
+        self._cluster_options = cluster_options
+        self._workers = workers
+        self._autoscaler_factory = autoscaler_factory
+        self._mirror_factory = mirror_factory
+        self._autoscalers = {}
+        self._daemons = {}
+        # held during every scaling pass of the daemons
+        self._pass_slots = threading.BoundedSemaphore(workers)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _run(self, options, action):
+        """Call action with the Autoscaler of the cluster, in a thread
+        named after its context; return True if it succeeded"""
+        thread = threading.current_thread()
+        thread_name = thread.name
+        thread.name = options.context
+        try:
+            autoscaler = self._autoscalers.get(options.context)
+            if autoscaler is None:
+                autoscaler = self._autoscalers[options.context] = self._autoscaler_factory(options)
+            action(autoscaler)
+            return True
+        except (Exception, SystemExit):
+            # a missing context or managed pool exits a single-cluster run
+            scale_logger.exception("Scaling cluster %s failed", options.context)
+            return False
+        finally:
+            thread.name = thread_name
+
+    def scale_once(self):
+        """Scale every cluster once and wait for its new nodes; return
+        the contexts of the clusters that failed"""
+
+        def scale(autoscaler):
+            autoscaler.scale()
+            autoscaler.wait_for_new_nodes()
+
+        with ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="cluster") as executor:
+            succeeded = list(executor.map(lambda options: self._run(options, scale), self._cluster_options))
+        return [options.context for options, ok in zip(self._cluster_options, succeeded) if not ok]
+
+    def _run_daemon(self, autoscaler, options):
+        daemon = scale_daemon(
+            autoscaler, self._mirror_factory(autoscaler.get_k8s().get_core_api()),
+            debounce=options.daemon_debounce,
+            resync_interval=options.daemon_resync_interval,
+            pass_lock=self._pass_slots,
+            max_wait=options.daemon_max_wait)
+        with self._lock:
+            if self._stopped.is_set():
+                return
+            self._daemons[options.context] = daemon
+        daemon.run()
+
+    def _keep_daemon_running(self, options, retry_interval):
+        """Run the daemon of the cluster until stopped, starting it
+        again retry_interval seconds after every failure"""
+        while not self._stopped.is_set():
+            if self._run(options, lambda autoscaler: self._run_daemon(autoscaler, options)):
+                return
+            scale_logger.info("Starting cluster %s again in %.0fs", options.context, retry_interval)
+            self._stopped.wait(retry_interval)
+
+    def start_daemons(self, retry_interval=60):
+        """Start a scale_daemon for every cluster in a thread of its
+        own, at most `workers` of them scaling at the same time; return
+        the threads"""
+        threads = []
+        for options in self._cluster_options:
+            thread = threading.Thread(
+                target=self._keep_daemon_running, args=(options, retry_interval),
+                name=options.context, daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def stop(self):
+        with self._lock:
+            self._stopped.set()
+            daemons = list(self._daemons.values())
+        for daemon in daemons:
+            daemon.stop()
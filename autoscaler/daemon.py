@@ -0,0 +1,284 @@
+#!/usr/bin/python3
+
+"""Long-running scaling mode: keep an in-memory mirror of the nodes
+and pods through list+watch, and scale again only when a relevant
+change arrives or the resync interval expires"""
+
+import logging
+import threading
+import time
+
+from kubernetes import watch
+
+from .utils import is_node_ready, is_pod_unschedulable
+
+scale_logger = logging.getLogger("scale")
+
+NODES = "nodes"
+PODS = "pods"
+
+
+def _resource_version(obj):
+    metadata = getattr(obj, "metadata", None)
+    return getattr(metadata, "resource_version", None)
+
+
+def _pod_key(pod):
+    return (pod.metadata.namespace, pod.metadata.name)
+
+
+def _node_key(node):
+    return node.metadata.name
+
+
+def _pod_changed(old, new):
+    """Return True if the change can affect the scaling decision"""
+    return (old.status.phase != new.status.phase or
+            old.spec.node_name != new.spec.node_name or
+            old.metadata.labels != new.metadata.labels or
+            is_pod_unschedulable(old) != is_pod_unschedulable(new))
+
+
+def _node_changed(old, new):
+    """Return True if the change can affect the scaling decision,
+    such as a booting node becoming Ready; status heartbeats are
+    ignored"""
+    return (old.spec.unschedulable != new.spec.unschedulable or
+            is_node_ready(getattr(old.status, 'conditions', None)) !=
+            is_node_ready(getattr(new.status, 'conditions', None)))
+
+
+class cluster_mirror:
+
+    """In-memory copy of all nodes and pods of a cluster, kept
+    up to date with Kubernetes list+watch and resumed from the last
+    seen resourceVersion"""
+
+    def __init__(self, v1, watcher_factory=watch.Watch, timeout_seconds=300, min_backoff=1, max_backoff=60):
+        self._v1 = v1
+        self._watcher_factory = watcher_factory
+        self._timeout_seconds = timeout_seconds
+        # seconds between two attempts to list again after a failure
+        self._min_backoff = min_backoff
+        self._max_backoff = max_backoff
+        self._on_change = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._watchers = {}
+        self._objects = {NODES: {}, PODS: {}}
+        self._resource_versions = {NODES: None, PODS: None}
+        self._list_functions = {
+            NODES: v1.list_node,
+            PODS: v1.list_pod_for_all_namespaces
+        }
+        self._keys = {NODES: _node_key, PODS: _pod_key}
+        self._changed = {NODES: _node_changed, PODS: _pod_changed}
+
+    def resync(self, kind=None):
+        """List the given kind of objects, or all of them, replacing
+        the mirrored copy"""
+        for k in ([kind] if kind else [NODES, PODS]):
+            scale_logger.debug("Listing all %s for the cluster mirror", k)
+            result = self._list_functions[k]()
+            key = self._keys[k]
+            with self._lock:
+                self._objects[k] = {key(obj): obj for obj in result.items}
+                self._resource_versions[k] = _resource_version(result)
+            self._notify()
+
+    def set_on_change(self, callback):
+        """Register a function called after every relevant change"""
+        self._on_change = callback
+
+    def get_nodes(self):
+        with self._lock:
+            return list(self._objects[NODES].values())
+
+    def get_pods(self):
+        with self._lock:
+            return list(self._objects[PODS].values())
+
+    def get_resource_version(self, kind):
+        return self._resource_versions[kind]
+
+    def apply_event(self, kind, event):
+        """Apply a single watch event to the mirror; return True
+        if it is relevant for scaling"""
+        event_type = event['type']
+        obj = event['object']
+        if event_type == 'ERROR':
+            code = getattr(obj, 'code', None)
+            if code is None and isinstance(event.get('raw_object'), dict):
+                code = event['raw_object'].get('code')
+            if code == 410:
+                # resourceVersion too old to resume from
+                scale_logger.info("Watch on %s expired, listing again", kind)
+                self.resync(kind)
+                return True
+            scale_logger.warning("Watch on %s failed: %r", kind, event.get('raw_object'))
+            return False
+
+        key = self._keys[kind](obj)
+        with self._lock:
+            objects = self._objects[kind]
+            old = objects.get(key)
+            if event_type == 'DELETED':
+                objects.pop(key, None)
+                relevant = old is not None
+            else:
+                objects[key] = obj
+                relevant = old is None or self._changed[kind](old, obj)
+            resource_version = _resource_version(obj)
+            if resource_version is not None:
+                self._resource_versions[kind] = resource_version
+
+        if relevant:
+            scale_logger.debug("Relevant %s event on %s %s", event_type, kind, key)
+            self._notify()
+        return relevant
+
+    def watch_once(self, kind):
+        """Consume one watch stream of the given kind until it ends,
+        resuming from the last seen resourceVersion"""
+        watcher = self._watcher_factory()
+        self._watchers[kind] = watcher
+        kwargs = {'timeout_seconds': self._timeout_seconds}
+        if self._resource_versions[kind]:
+            kwargs['resource_version'] = self._resource_versions[kind]
+        for event in watcher.stream(self._list_functions[kind], **kwargs):
+            self.apply_event(kind, event)
+            if self._stopped.is_set():
+                break
+
+    def _watch_forever(self, kind):
+        """Watch until stopped; after a failure, list again, waiting
+        longer after every failure in a row, then resume watching"""
+        delay = self._min_backoff
+        needs_list = False
+        while not self._stopped.is_set():
+            try:
+                if needs_list:
+                    self.resync(kind)
+                    needs_list = False
+                self.watch_once(kind)
+                delay = self._min_backoff
+            except Exception:
+                if self._stopped.is_set():
+                    break
+                scale_logger.exception("Watch on %s interrupted, listing again in %.0fs", kind, delay)
+                needs_list = True
+                self._stopped.wait(delay)
+                delay = min(delay * 2, self._max_backoff)
+
+    def start(self):
+        """List everything, then keep watching in background threads"""
+        self.resync()
+        for kind in [NODES, PODS]:
+            thread = threading.Thread(
+                target=self._watch_forever, args=(kind,), name="watch-" + kind, daemon=True)
+            thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        for watcher in self._watchers.values():
+            watcher.stop()
+
+    def _notify(self):
+        if self._on_change:
+            self._on_change()
+
+
+class scale_daemon:
+
+    """Re-evaluates the scaling goal of an Autoscaler whenever its
+    cluster mirror reports a relevant change, once no further change
+    has arrived for `debounce` seconds or at the latest `max_wait`
+    seconds after the first change, and at least every
+    `resync_interval` seconds, listing the whole cluster again first
+
+    If given, pass_lock is held during every scaling pass, e.g. a
+    semaphore shared by the daemons of several clusters to bound how
+    many scale at once"""
+
+    def __init__(self, autoscaler, mirror, debounce=10, resync_interval=300, clock=time.monotonic, pass_lock=None,
+                 max_wait=60):
+        self._autoscaler = autoscaler
+        # a lock of its own is never contended
+        self._pass_lock = pass_lock if pass_lock is not None else threading.Lock()
+        self._mirror = mirror
+        self._debounce = debounce
+        self._max_wait = max_wait
+        self._resync_interval = resync_interval
+        self._clock = clock
+        self._wakeup = threading.Event()
+        self._dirty = False
+        self._first_event = None
+        self._last_event = None
+        self._last_evaluation = None
+        self._stopped = False
+        mirror.set_on_change(self.notify)
+
+    def notify(self):
+        """Called by the mirror on every relevant change"""
+        self._last_event = self._clock()
+        if not self._dirty:
+            self._first_event = self._last_event
+        self._dirty = True
+        self._wakeup.set()
+
+    def poll(self):
+        """Scale if the debounce timer or the resync interval has
+        fired; return True if a scaling pass ran"""
+        now = self._clock()
+        due = self._last_evaluation is None or now - self._last_evaluation >= self._resync_interval
+        settled = self._dirty and (now - self._last_event >= self._debounce or
+                                   now - self._first_event >= self._max_wait)
+        if not (due or settled):
+            return False
+        if due and self._last_evaluation is not None:
+            # a watch that silently fell behind must not go on deciding
+            try:
+                self._mirror.resync()
+            except Exception:
+                scale_logger.exception("Could not list the cluster again, scaling in %.0fs", self._debounce)
+                self._last_evaluation = now - self._resync_interval + self._debounce
+                return False
+        self._dirty = False
+        self._last_evaluation = now
+        self.evaluate()
+        return True
+
+    def evaluate(self):
+        with self._pass_lock:
+            self._autoscaler.update_state(self._mirror.get_pods(), self._mirror.get_nodes())
+            try:
+                self._autoscaler.scale()
+            except Exception:
+                scale_logger.exception("Scaling pass failed, retrying on next change")
+
+    def next_timeout(self):
+        """Seconds until poll could next have something to do"""
+        if self._last_evaluation is None:
+            return 0
+        now = self._clock()
+        timeouts = [self._resync_interval - (now - self._last_evaluation)]
+        if self._dirty:
+            timeouts.append(min(self._debounce - (now - self._last_event),
+                                self._max_wait - (now - self._first_event)))
+        return max(min(timeouts), 0)
+
+    def run(self):
+        scale_logger.info("Starting scaling daemon, debounce %.1fs up to %.1fs, resync every %.1fs",
+                          self._debounce, self._max_wait, self._resync_interval)
+        self._mirror.start()
+        try:
+            while not self._stopped:
+                self._wakeup.wait(self.next_timeout())
+                self._wakeup.clear()
+                self.poll()
+        finally:
+            self._mirror.stop()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+
+"""Estimate how soon each node would empty on its own once it is
+made unschedulable, so that the nodes freeing capacity soonest can be
+blocked first.
+
+Student pods are removed by the JupyterHub idle culler `cull_timeout`
+seconds after their user goes idle; a session is expected to last
+`expected_session_seconds`. A pod older than that is assumed idle
+already, a younger one to stay active for the rest of the session.
+
+All functions in the file should be read-only and cause no side effects."""
+
+import time
+
+
+def estimate_pod_remaining_time(age, options):
+    """Return the expected number of seconds before a pod of
+    the given age, None if unknown, is gone
+
+    A pod past its expected session is taken to be idle since the
+    session ended, so it is culled within what is left of that cull
+    window; one older than the whole window is still in use, and is
+    taken to have just become idle"""
+    if age is None:
+        age = 0
+    if age <= options.expected_session_seconds:
+        return options.expected_session_seconds - age + options.cull_timeout
+    culled_at = options.expected_session_seconds + options.cull_timeout
+    if age < culled_at:
+        return culled_at - age
+    return options.cull_timeout
+
+
+def get_drain_costs(snapshot, options, now=None):
+    """Return a dict from each node name of the ClusterSnapshot to
+    its drain cost: a tuple of the expected seconds until its last pod
+    is gone and the memory its pods request, both lower for nodes that
+    are cheaper to empty
+
+    Computed in a single pass over the pods"""
+    if now is None:
+        now = time.time()
+    time_to_empty = {}
+    for node_name, start_time in zip(snapshot.get_pod_node_names(),
+                                     snapshot.get_pod_start_times()):
+        if node_name is None:
+            continue
+        age = None if start_time is None else max(now - start_time, 0)
+        remaining = estimate_pod_remaining_time(age, options)
+        if remaining > time_to_empty.get(node_name, 0):
+            time_to_empty[node_name] = remaining
+
+    return {
+        node_name: (time_to_empty.get(node_name, 0),
+                    snapshot.get_memory_request_on_node(node_name))
+        for node_name in snapshot.get_node_names()
+    }
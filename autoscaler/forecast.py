@@ -0,0 +1,270 @@
+#!/usr/bin/python3
+
+"""Forecast the memory demand of the cluster from its own history.
+
+The history is a ring buffer holding the peak demand of every interval
+of the last weeks, persisted as a small binary file. A forecast is the
+peak seen in the same window of the previous weeks, shifted by the
+recent trend of how far the demand differs from those weeks; without
+previous weeks, it is the recent trend of the demand itself."""
+
+import argparse
+import logging
+import os
+import struct
+import tempfile
+import time
+from array import array
+
+scale_logger = logging.getLogger("scale")
+
+WEEK = 7 * 24 * 3600
+
+_HEADER = struct.Struct("<4sdI")
+_MAGIC = b"ASF1"
+_EMPTY = -1
+
+
+class demand_history:
+
+    """Peak memory demand per interval of seconds, for the last
+    weeks; older intervals are overwritten in place"""
+
+    def __init__(self, interval=300, weeks=4):
+        self.interval = interval
+        self.capacity = int(weeks * WEEK // interval) + 1
+        # interval number held by every slot, _EMPTY for none
+        self._slots = array('q', [_EMPTY]) * self.capacity
+        self._values = array('d', [0.0]) * self.capacity
+
+    def _slot(self, seconds):
+        return int(seconds // self.interval)
+
+    def record(self, seconds, memory):
+        """Record the demand at the given time, keeping the peak
+        of its interval"""
+        slot = self._slot(seconds)
+        index = slot % self.capacity
+        if self._slots[index] != slot:
+            self._slots[index] = slot
+            self._values[index] = memory
+        elif memory > self._values[index]:
+            self._values[index] = memory
+
+    def get(self, slot):
+        """Return the peak demand of an interval number, None if
+        it was not recorded or has been overwritten"""
+        index = slot % self.capacity
+        if self._slots[index] == slot:
+            return self._values[index]
+        return None
+
+    def get_peak(self, start, end):
+        """Return the peak demand recorded from start to end seconds,
+        both included, None if nothing was recorded then"""
+        peak = None
+        for slot in range(self._slot(start), self._slot(end) + 1):
+            value = self.get(slot)
+            if value is not None and (peak is None or value > peak):
+                peak = value
+        return peak
+
+    def get_recorded_range(self):
+        """Return the start of the first and last intervals recorded,
+        None if the history is empty"""
+        slots = [slot for slot in self._slots if slot != _EMPTY]
+        if not slots:
+            return None
+        return min(slots) * self.interval, max(slots) * self.interval
+
+    def save(self, path):
+        """Write the history to path, replacing it atomically"""
+        directory = os.path.dirname(os.path.abspath(path))
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix=".forecast-")
+        try:
+            with os.fdopen(descriptor, "wb") as history_file:
+                history_file.write(_HEADER.pack(_MAGIC, self.interval, self.capacity))
+                self._slots.tofile(history_file)
+                self._values.tofile(history_file)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+
+def load_history(path, interval=300, weeks=4):
+    """Return the history saved at path, or an empty one if there is
+    none or it was saved with another interval or length"""
+    history = demand_history(interval, weeks)
+    capacity = history.capacity
+    try:
+        with open(path, "rb") as history_file:
+            magic, saved_interval, saved_capacity = _HEADER.unpack(history_file.read(_HEADER.size))
+            if (magic, saved_interval, saved_capacity) != (_MAGIC, interval, capacity):
+                scale_logger.warning("Ignoring the demand history in %s, saved with other settings", path)
+                return history
+            slots = array('q')
+            values = array('d')
+            slots.fromfile(history_file, capacity)
+            values.fromfile(history_file, capacity)
+    except FileNotFoundError:
+        return history
+    except (OSError, EOFError, struct.error):
+        scale_logger.warning("Could not read the demand history in %s", path, exc_info=True)
+        return history
+    history._slots = slots
+    history._values = values
+    return history
+
+
+def _get_seasonal_value(history, seconds, weeks):
+    values = [history.get(history._slot(seconds - week * WEEK)) for week in range(1, weeks + 1)]
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return sum(values) / len(values)
+
+
+def _extend_trend(points, seconds):
+    """Return the least squares line through the (time, value) points
+    at the given time"""
+    mean_time = sum(point[0] for point in points) / len(points)
+    mean_value = sum(point[1] for point in points) / len(points)
+    variance = sum((point[0] - mean_time) ** 2 for point in points)
+    if not variance:
+        return mean_value
+    slope = sum((point[0] - mean_time) * (point[1] - mean_value) for point in points) / variance
+    return mean_value + slope * (seconds - mean_time)
+
+
+def _get_recent_points(history, now, window):
+    points = []
+    for slot in range(history._slot(now - window), history._slot(now) + 1):
+        value = history.get(slot)
+        if value is not None:
+            points.append((slot * history.interval, value))
+    return points
+
+
+def get_seasonal_forecast(history, now, horizon, weeks, trend_window=1800):
+    """Return the mean over the previous weeks of the peak demand in
+    the window now to now + horizon, plus the trend of how far the
+    demand of the last trend_window seconds differs from those weeks;
+    None without such weeks"""
+    peaks = []
+    for week in range(1, weeks + 1):
+        then = now - week * WEEK
+        peak = history.get_peak(then, then + horizon)
+        if peak is not None:
+            peaks.append(peak)
+    if not peaks:
+        return None
+    differences = []
+    for seconds, value in _get_recent_points(history, now, trend_window):
+        seasonal = _get_seasonal_value(history, seconds, weeks)
+        if seasonal is not None:
+            differences.append((seconds, value - seasonal))
+    difference = _extend_trend(differences, now + horizon) if differences else 0.0
+    return max(sum(peaks) / len(peaks) + difference, 0.0)
+
+
+def get_trend_forecast(history, now, horizon, window):
+    """Return the demand of the last window seconds extended by its
+    least squares trend to now + horizon; None with fewer than two
+    intervals recorded"""
+    points = _get_recent_points(history, now, window)
+    if len(points) < 2:
+        return None
+    return max(_extend_trend(points, now + horizon), 0.0)
+
+
+def forecast_peak(history, now, horizon, weeks=4, trend_window=1800):
+    """Return the peak memory demand expected from now to now + horizon:
+    from the previous weeks if recorded, else from the recent trend;
+    None without enough history for either"""
+    estimate = get_seasonal_forecast(history, now, horizon, weeks, trend_window)
+    if estimate is None:
+        estimate = get_trend_forecast(history, now, horizon, trend_window)
+    return estimate
+
+
+class backtest_report:
+
+    """Forecasts made at every recorded interval, compared with the
+    peak demand that followed"""
+
+    def __init__(self):
+        self.forecasts = 0
+        # forecasts below the actual peak, which would have made
+        # students wait for nodes
+        self.under_forecasts = 0
+        self.absolute_error = 0.0
+        # memory forecast beyond the actual peak, summed
+        self.over_provision = 0.0
+
+    def add(self, forecast, actual):
+        self.forecasts += 1
+        if forecast < actual:
+            self.under_forecasts += 1
+        else:
+            self.over_provision += forecast - actual
+        self.absolute_error += abs(forecast - actual)
+
+    def get_mean_absolute_error(self):
+        return self.absolute_error / self.forecasts if self.forecasts else 0.0
+
+    def get_under_forecast_rate(self):
+        return self.under_forecasts / self.forecasts if self.forecasts else 0.0
+
+    def __repr__(self):
+        return "backtest_report(forecasts=%r, mean_absolute_error=%.0f, under_forecast_rate=%.3f)" % (
+            self.forecasts, self.get_mean_absolute_error(), self.get_under_forecast_rate())
+
+
+def backtest(history, start, end, horizon, weeks=4, trend_window=1800):
+    """Forecast from every recorded interval between start and end
+    seconds, using only the history up to then, and compare each
+    forecast with the peak demand recorded over the horizon after it"""
+    report = backtest_report()
+    for slot in range(history._slot(start), history._slot(end) + 1):
+        if history.get(slot) is None:
+            continue
+        now = slot * history.interval
+        actual = history.get_peak(now + history.interval, now + horizon)
+        if actual is None:
+            continue
+        # later intervals are in the history too, but a forecast
+        # reads none of them
+        forecast = forecast_peak(history, now, horizon, weeks, trend_window)
+        # the autoscaler serves the current demand when no growth is forecast
+        current = history.get(slot)
+        report.add(current if forecast is None else max(forecast, current), actual)
+    return report
+
+
+def main():
+    from .settings import settings
+    parser = argparse.ArgumentParser(
+        description="Backtest the demand forecast over a saved demand history")
+    parser.add_argument("history", help="Demand history file, see FORECAST_FILE")
+    parser.add_argument("--days", type=float, default=7, help="Backtest over the last days of the history")
+    parser.add_argument("--horizon", type=float,
+                        help="Seconds ahead to forecast, FORECAST_HORIZON by default, else 600")
+    args = parser.parse_args()
+
+    options = settings()
+    history = load_history(args.history, options.forecast_interval, options.forecast_weeks)
+    recorded = history.get_recorded_range()
+    if recorded is None:
+        print("The demand history is empty")
+        return
+    end = recorded[1]
+    start = max(recorded[0], end - args.days * 24 * 3600)
+    print("Backtesting from %s to %s" % (time.ctime(start), time.ctime(end)))
+    horizon = args.horizon or options.forecast_horizon or 600
+    print(backtest(history, start, end, horizon,
+                   options.forecast_weeks, options.forecast_trend_window))
+
+
+if __name__ == "__main__":
+    main()
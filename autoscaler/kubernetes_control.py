@@ -3,26 +3,65 @@
 """Provides read and write access to Kubernetes API"""
 import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 from kubernetes import client, config
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import HTTPError
 
-from .utils import get_pod_host_name, get_pod_memory_request, \
-    get_node_memory_capacity, check_list_intersection
+from . import metrics
+from .cluster_snapshot import ClusterSnapshot
+from .listing import get_pod_field_selector, get_pod_label_selector, list_nodes, list_pods
+from .records import node_record_from_model, pod_record_from_model
+from .utils import check_list_intersection
 
 scale_logger = logging.getLogger("scale")
 logging.getLogger("kubernetes").setLevel(logging.WARNING)
 
 
+def get_context_client(segment):
+    """Return the name of the only context of the .kube config whose
+    name contains segment, and an API client of its own for it
+
+    The global client configuration is left alone, so that a single
+    process can talk to several clusters; raises LookupError if no
+    context matches, ValueError if several do"""
+    contexts, _ = config.list_kube_config_contexts()
+    names = [context['name'] for context in contexts if segment in context['name']]
+    if not names:
+        raise LookupError("No context matches %s" % segment)
+    if len(names) > 1:
+        raise ValueError("Contexts %s all match %s" % (", ".join(names), segment))
+    return names[0], config.new_client_from_config(context=names[0])
+
+
+class bulk_patch_result:
+
+    """Outcome of patching many nodes at once: names of the nodes
+    successfully patched, in the order given, and the error raised
+    for each node that failed"""
+
+    def __init__(self, succeeded, failed):
+        self.succeeded = succeeded
+        self.failed = failed
+
+    def __repr__(self):
+        return "bulk_patch_result(succeeded=%r, failed=%r)" % (self.succeeded, self.failed)
+
+
 class k8s_control:
 
     """Provides read and write access to Kubernetes API,
     and environment settings, including goals for the
     cluster always use the node and pods status at the
-    time it was initiated
+    time it was initiated, or last updated through update_state
 
+    Pods and nodes are held as PodRecord and NodeRecord;
     self._pods omits certain pods based on settings"""
 
     _test = False
+    # API client of the context, None for the global default client
+    _api_client = None
 
     def __init__(self, options):
         """ Needs to be initialized with options as an
@@ -30,62 +69,69 @@ class k8s_control:
 
         self._context = self._configure_new_context(options.context)
         self._options = options
-        self._v1 = client.CoreV1Api()
-        self._pods = self._get_pods()
-        self._nodes = self._get_nodes()
+        self._v1 = client.CoreV1Api(self._api_client)
+        self._load(self._get_pods(), self._get_nodes())
+
+    def _load(self, pods, nodes):
+        """Derive the cluster state from already filtered pods
+        and the list of nodes"""
+        self._pods = pods
+        self._nodes = nodes
+        self._snapshot = ClusterSnapshot(
+            self._pods, self._nodes, self._options.preemptible_labels)
         self._critical_node_names = self._get_critical_node_names()
         self._critical_node_number = len(self._critical_node_names)
         self._noncritical_nodes = list(
             filter(
-                lambda node: node.metadata.name not in self._critical_node_names,
+                lambda node: not self._snapshot.is_critical(node.name),
                 self._nodes
             )
         )
         self._image_urls = self._get_image_urls()
 
+    def update_state(self, pods, nodes):
+        """Replace the cluster state with the given unfiltered
+        v1.Pod and v1.Node, without calling the API"""
+        self._load(self._filter_pods([pod_record_from_model(pod) for pod in pods]),
+                   [node_record_from_model(node) for node in nodes])
+
     def _get_image_urls(self):
-        result = set()
-        for pod in self._pods:
-            env = pod.spec.containers[0].env
-            if env:
-                for entry in env:
-                    if entry.name == 'SINGLEUSER_IMAGE':
-                        result.add(entry.value)
-        return result
+        return {pod.image_url for pod in self._pods if pod.image_url}
 
     def _configure_new_context(self, new_context):
         """ Loads .kube config to instantiate kubernetes
         with specified context"""
-        contexts, _ = config.list_kube_config_contexts()
         try:
-            contexts = [c['name'] for c in contexts]
-            context_to_activate = list(
-                filter(lambda context: new_context in context, contexts))
-            assert len(context_to_activate) == 1  # avoid undefined behavior
-            context_to_activate = context_to_activate[0]
-        except (TypeError, IndexError):
+            context_to_activate, self._api_client = get_context_client(new_context)
+        except (TypeError, LookupError):
             scale_logger.exception("Could not load context %s\n" % new_context)
             sys.exit(1)
-        except AssertionError:
+        except ValueError:
             scale_logger.fatal("Vague context specification")
             sys.exit(1)
-        config.load_kube_config(context=context_to_activate)
         return context_to_activate
 
     def _get_nodes(self):
-        """Return a list of v1.Node"""
+        """Return the records of all nodes"""
         scale_logger.debug("Getting all nodes in the cluster")
-        return self._v1.list_node().items
+        return list_nodes(self._v1, self._options.list_page_size)
 
     def _get_pods(self):
-        """Return a list of v1.Pod that needn't be omitted"""
-        result = []
+        """Return the records of the pods that needn't be omitted;
+        the API server leaves out most of the others"""
         scale_logger.debug("Getting all pods in all namespaces")
-        pods = self._v1.list_pod_for_all_namespaces().items
+        pods = list_pods(
+            self._v1, get_pod_field_selector(self._options), get_pod_label_selector(self._options),
+            self._options.list_page_size)
+        return self._filter_pods(pods)
+
+    def _filter_pods(self, pods):
+        """Return the pods that needn't be omitted"""
+        result = []
         for pod in pods:
-            if (not (check_list_intersection(self._options.omit_labels, pod.metadata.labels) or
-                     pod.metadata.namespace in self._options.omit_namespaces)) and \
-                    (pod.status.phase in ["Running", "Pending"]):
+            if (not (check_list_intersection(self._options.omit_labels, pod.labels) or
+                     pod.namespace in self._options.omit_namespaces)) and \
+                    (pod.phase in ["Running", "Pending"]):
                 result.append(pod)
         return result
 
@@ -95,17 +141,17 @@ class k8s_control:
             "Node name \t\t Num of pods on node \t Schedulable? \t Preemptible?")
         for node in self._nodes:
             print("%s\t%i\t%s\t%s" %
-                  (node.metadata.name,
+                  (node.name,
                    self.get_pods_number_on_node(node),
-                   "U" if node.spec.unschedulable else "S",
-                   "N" if node.metadata.name in self._critical_node_names else "P"
+                   "U" if node.unschedulable else "S",
+                   "N" if self._snapshot.is_critical(node.name) else "P"
                    ))
 
     def set_unschedulable(self, node_name, value=True):
         """Set the spec key 'unschedulable'"""
         scale_logger.debug(
             "Setting %s node's unschedulable property to %r", node_name, value)
-        assert node_name not in self._critical_node_names
+        assert not self._snapshot.is_critical(node_name)
 
         new_node = client.V1Node(
             api_version="v1",
@@ -113,45 +159,64 @@ class k8s_control:
             metadata=client.V1ObjectMeta(name=node_name),
             spec=client.V1NodeSpec(unschedulable=value)
         )
-        # TODO: exception handling
-        self._v1.patch_node(node_name, new_node)
+        with metrics.api_call("kubernetes", "patch_node"):
+            self._v1.patch_node(node_name, new_node)
+
+    def set_unschedulable_bulk(self, node_names, value=True):
+        """Set the spec key 'unschedulable' of all given nodes,
+        sending up to options.patch_workers patches concurrently;
+        a failure on one node does not stop the others"""
+        for node_name in node_names:
+            assert not self._snapshot.is_critical(node_name)
+
+        def patch(node_name):
+            try:
+                self.set_unschedulable(node_name, value)
+            except (ApiException, HTTPError) as e:
+                scale_logger.warning(
+                    "Failed to set %s node's unschedulable property to %r: %s", node_name, value, e)
+                return e
+            return None
+
+        if not node_names:
+            return bulk_patch_result([], {})
+        workers = max(min(self._options.patch_workers, len(node_names)), 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            errors = list(executor.map(patch, node_names))
+
+        succeeded = []
+        failed = {}
+        for node_name, error in zip(node_names, errors):
+            if error is None:
+                succeeded.append(node_name)
+            else:
+                failed[node_name] = error
+        return bulk_patch_result(succeeded, failed)
 
     def get_total_cluster_memory_usage(self):
         """Gets the total memory usage of all student pods"""
-        total_mem_usage = 0
-        for pod in self._pods:
-            total_mem_usage += get_pod_memory_request(pod)
-        return total_mem_usage
+        return self._snapshot.get_total_memory_request()
 
     def get_total_cluster_memory_capacity(self):
         """Returns the total memory capacity of all nodes, as student
         pods can be scheduled on any node that meets its Request criteria"""
-        total_mem_capacity = 0
-        for node in self._nodes:
-            if not node.spec.unschedulable:
-                total_mem_capacity += get_node_memory_capacity(node)
-        return total_mem_capacity
+        return self._snapshot.get_schedulable_memory_capacity()
+
+    def get_node_memory_capacity(self, node):
+        return self._snapshot.get_node_memory_capacity(node.name)
 
     def _get_critical_node_names(self):
         """Return a list of nodes where critical pods
         are running"""
-        result = []
-        for pod in self._pods:
-            if not check_list_intersection(pod.metadata.labels, self._options.preemptible_labels):
-                pod_hostname = get_pod_host_name(pod)
-                if pod_hostname not in result:
-                    result.append(pod_hostname)
-        return result
+        return list(self._snapshot.get_critical_node_names())
 
     def get_pods_number_on_node(self, node):
-        """Return the effective number of pods on the node
-        TODO: There must be a better way to determine number
-        of running pods on node"""
-        result = 0
-        for pod in self._pods:
-            if get_pod_host_name(pod) == node.metadata.name:
-                result += 1
-        return result
+        """Return the effective number of pods on the node"""
+        return self._snapshot.get_pods_number_on_node(node.name)
+
+    def get_memory_request_on_node(self, node):
+        """Return the sum of memory requests of pods on the node"""
+        return self._snapshot.get_memory_request_on_node(node.name)
 
     def get_cluster_name(self):
         """Return the full name of the cluster"""
@@ -159,31 +224,33 @@ class k8s_control:
 
     def get_num_schedulable(self):
         """Return number of nodes schedulable"""
-        result = 0
-        for node in self._noncritical_nodes:
-            if not node.spec.unschedulable:
-                result += 1
-        return result
+        return self._snapshot.get_num_schedulable()
 
     def get_num_unschedulable(self):
         """Return number of nodes unschedulable
 
         ASSUMING CRITICAL NODES ARE SCHEDULABLE"""
-        result = 0
-        for node in self._nodes:
-            if node.spec.unschedulable:
-                result += 1
-        return result
+        return self._snapshot.get_num_unschedulable()
 
     def get_nodes(self):
         return self._nodes
 
+    def get_pods(self):
+        """Return the pods that were not omitted"""
+        return self._pods
+
     def get_image_urls(self):
         return self._image_urls
 
     def get_critical_node_names(self):
         return self._critical_node_names
 
+    def get_snapshot(self):
+        return self._snapshot
+
+    def get_core_api(self):
+        return self._v1
+
     def is_test(self):
         return self._test
 
@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+
+"""List the pods and nodes of the cluster page by page, with the
+omitted namespaces and finished pods filtered out by the API server.
+
+Pages are read as raw JSON and every object is reduced to its record
+before the next page is requested, so at most one page of full objects
+is ever held in memory, and no Kubernetes model object is built."""
+
+import json
+import logging
+
+from kubernetes.client.rest import ApiException
+
+from . import metrics
+from .records import node_record_from_json, pod_record_from_json
+
+scale_logger = logging.getLogger("scale")
+
+# phases of the pods the autoscaler leaves out
+FINISHED_PHASES = ("Succeeded", "Failed", "Unknown")
+
+
+def get_pod_field_selector(options):
+    """Return the field selector leaving out finished pods and pods
+    in omitted namespaces"""
+    selectors = ["status.phase!=%s" % phase for phase in FINISHED_PHASES]
+    selectors.extend("metadata.namespace!=%s" % namespace
+                     for namespace in options.omit_namespaces if namespace)
+    return ",".join(selectors)
+
+
+def get_pod_label_selector(options):
+    """Return the label selector leaving out pods with omitted labels"""
+    return ",".join("!%s" % label for label in options.omit_labels if label)
+
+
+def _get_page(v1, resource_path, call, field_selector, label_selector, page_size, continue_token):
+    query_params = [("limit", page_size)]
+    if field_selector:
+        query_params.append(("fieldSelector", field_selector))
+    if label_selector:
+        query_params.append(("labelSelector", label_selector))
+    if continue_token:
+        query_params.append(("continue", continue_token))
+    with metrics.api_call("kubernetes", call):
+        response = v1.api_client.call_api(
+            resource_path, "GET",
+            query_params=query_params,
+            header_params={"Accept": "application/json"},
+            auth_settings=["BearerToken"],
+            _return_http_data_only=True,
+            _preload_content=False)
+        return json.loads(response.data)
+
+
+def _list(v1, resource_path, call, convert, field_selector, label_selector, page_size):
+    """Return every object at resource_path matching the selectors,
+    converted by convert, reading page_size objects per request; API
+    servers too old to page answer with every object at once"""
+    result = []
+    continue_token = None
+    while True:
+        try:
+            page = _get_page(v1, resource_path, call, field_selector, label_selector, page_size, continue_token)
+        except ApiException as e:
+            if e.status != 410 or continue_token is None:
+                raise
+            # the pages already read are too old to continue from
+            scale_logger.warning("Listing %s expired after %i objects, listing again", resource_path, len(result))
+            result = []
+            continue_token = None
+            continue
+        result.extend(convert(item) for item in page.get("items") or ())
+        continue_token = (page.get("metadata") or {}).get("continue")
+        if not continue_token:
+            return result
+
+
+def list_pods(v1, field_selector="", label_selector="", page_size=500, convert=pod_record_from_json):
+    """Return the records of every pod matching the selectors"""
+    return _list(v1, "/api/v1/pods", "list_pod_for_all_namespaces", convert,
+                 field_selector, label_selector, page_size)
+
+
+def list_nodes(v1, page_size=500, convert=node_record_from_json):
+    """Return the records of every node"""
+    return _list(v1, "/api/v1/nodes", "list_node", convert, "", "", page_size)
@@ -2,9 +2,15 @@
 
 import logging
 import argparse
+import sys
+import time
 
 from .autoscaler import Autoscaler
+from . import metrics
+from .clusters import cluster_scheduler, get_cluster_options
+from .daemon import cluster_mirror, scale_daemon
 from .settings import settings
+from .slack_message import slack_handler
 
 
 logging.basicConfig(
@@ -50,16 +56,42 @@ def main():
         "-c",
         "--context",
         required=True,
+        action="append",
         help="A unique segment in the context name to specify which to \
-        use to instantiate Kubernetes"
+        use to instantiate Kubernetes; repeat to scale several clusters \
+        concurrently"
     )
     parser.add_argument(
         "--context-for-cloud",
         help="An optional different unique segment in the managed pool \
-        name to specify which to use to when resizing cloud managed pools",
-        default=""
+        name to specify which to use to when resizing cloud managed pools; \
+        with several --context, given once for each, in the same order",
+        action="append"
+    )
+    parser.add_argument(
+        "--daemon",
+        help="Keep running, watch nodes and pods and scale again \
+        whenever a relevant change happens",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--debounce",
+        help="In daemon mode, seconds without further changes to wait \
+        for before scaling",
+        type=float
+    )
+    parser.add_argument(
+        "--resync-interval",
+        help="In daemon mode, maximum number of seconds between two \
+        scaling passes",
+        type=float
     )
     args = parser.parse_args()
+    contexts_cloud = args.context_for_cloud or [""] * len(args.context)
+    if len(contexts_cloud) != len(args.context):
+        parser.error("--context-for-cloud must be given once for every --context")
+    if len(args.context) > 1 and not args.y:
+        parser.error("Scaling several clusters needs -y, there is no asking for confirmation")
     if args.verbose:
         scale_logger.setLevel(logging.DEBUG)
     else:
@@ -86,21 +118,70 @@ def main():
                 "Running in test kubernetes mode, no action on node specs")
 
     if args.y:
-        def confirm(x, y=False):
-            return True
+        options.yes = True
 
-    options.context = args.context
-    if args.context_for_cloud != "":
-        options.context_cloud = args.context_for_cloud
-    else:
-        options.context_cloud = options.context
+    if args.debounce is not None:
+        options.daemon_debounce = args.debounce
+    if args.resync_interval is not None:
+        options.daemon_resync_interval = args.resync_interval
+
+    metrics.configure(options)
+
+    if len(args.context) > 1:
+        scale_clusters(options, args.context, contexts_cloud, args.daemon)
+        return
+
+    options.context = args.context[0]
+    options.context_cloud = contexts_cloud[0] or options.context
 
     try:
         autoscaler = Autoscaler(options)
-        autoscaler.scale()
+        if args.daemon:
+            mirror = cluster_mirror(autoscaler.get_k8s().get_core_api())
+            scale_daemon(
+                autoscaler, mirror,
+                debounce=options.daemon_debounce,
+                resync_interval=options.daemon_resync_interval,
+                max_wait=options.daemon_max_wait
+            ).run()
+        else:
+            autoscaler.scale()
+            autoscaler.wait_for_new_nodes()
     except KeyboardInterrupt:
         pass
 
 
+def scale_clusters(options, contexts, contexts_cloud, daemon):
+    """Scale the cluster of every context from this process, once or
+    in daemon mode; exit with status 1 if a cluster failed a one-time
+    scaling"""
+    # log lines and slack messages name the cluster, the name of the
+    # thread scaling it
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)s [%(threadName)s] %(message)s'))
+    handler = slack_handler(options.slack_token, window=options.slack_window, capacity=options.slack_queue_size)
+    handler.setFormatter(logging.Formatter('%(threadName)s: %(message)s'))
+    slack_logger.addHandler(handler)
+
+    scheduler = cluster_scheduler(
+        [get_cluster_options(options, context, context_cloud)
+         for context, context_cloud in zip(contexts, contexts_cloud)],
+        workers=options.cluster_workers)
+    try:
+        if daemon:
+            threads = scheduler.start_daemons(options.cluster_retry_interval)
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(1)
+            return
+        failed = scheduler.scale_once()
+    except KeyboardInterrupt:
+        scheduler.stop()
+        return
+    if failed:
+        scale_logger.error("Scaling failed on %s", ", ".join(failed))
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()
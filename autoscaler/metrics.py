@@ -0,0 +1,299 @@
+#!/usr/bin/python3
+
+"""Prometheus metrics of the autoscaler: how long every phase of a
+scaling pass and every call to the Kubernetes and cloud APIs takes,
+and the state of the cluster after each pass.
+
+Metrics are recorded only once the registry is enabled, by setting
+METRICS_PORT to serve them over HTTP at /metrics, or METRICS_TEXTFILE
+to write them after every pass for the node exporter textfile
+collector; otherwise every call returns right away."""
+
+import logging
+import os
+import socketserver
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+scale_logger = logging.getLogger("scale")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=""):
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+class registry:
+
+    """Metrics exposed together; recording is a no-op while the
+    registry is not enabled"""
+
+    def __init__(self):
+        self.enabled = False
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def clear(self):
+        """Drop every value recorded so far"""
+        with self._lock:
+            for metric in self._metrics:
+                metric._values.clear()
+
+    def render(self):
+        """Return all metrics in the Prometheus text format"""
+        lines = []
+        with self._lock:
+            for metric in self._metrics:
+                lines.append("# HELP %s %s" % (metric.name, metric.documentation))
+                lines.append("# TYPE %s %s" % (metric.name, metric.kind))
+                for label_values in sorted(metric._values):
+                    lines.extend(metric._render(label_values))
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Write all metrics to path, replacing it atomically so the
+        textfile collector never reads half a file"""
+        directory = os.path.dirname(os.path.abspath(path))
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+        try:
+            with os.fdopen(descriptor, "w") as metrics_file:
+                metrics_file.write(self.render())
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+
+class _metric:
+
+    kind = None
+
+    def __init__(self, owner, name, documentation, labelnames=()):
+        self._registry = owner
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # label values -> value
+        self._values = {}
+        owner.add(self)
+
+    def get(self, *label_values):
+        """Return the value recorded for the label values, None if
+        there is none"""
+        return self._values.get(label_values)
+
+
+class counter(_metric):
+
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        if not self._registry.enabled:
+            return
+        with self._registry._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def _render(self, label_values):
+        return ["%s%s %s" % (self.name, _format_labels(self.labelnames, label_values),
+                             _format_value(self._values[label_values]))]
+
+
+class gauge(_metric):
+
+    kind = "gauge"
+
+    def set(self, value, *label_values):
+        if not self._registry.enabled:
+            return
+        with self._registry._lock:
+            self._values[label_values] = value
+
+    def _render(self, label_values):
+        return ["%s%s %s" % (self.name, _format_labels(self.labelnames, label_values),
+                             _format_value(self._values[label_values]))]
+
+
+class histogram(_metric):
+
+    """Counts of observations up to each bucket bound, kept per
+    bucket and summed up when rendered, with their sum"""
+
+    kind = "histogram"
+
+    def __init__(self, owner, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        _metric.__init__(self, owner, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, *label_values):
+        if not self._registry.enabled:
+            return
+        with self._registry._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [[0] * len(self.buckets), 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][index] += 1
+                    break
+            counts[1] += value
+
+    def get(self, *label_values):
+        """Return the count and the sum of the observations for the
+        label values, None if there is none"""
+        counts = self._values.get(label_values)
+        if counts is None:
+            return None
+        return sum(counts[0]), counts[1]
+
+    def _render(self, label_values):
+        counts, total = self._values[label_values]
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append("%s_bucket%s %i" % (
+                self.name, _format_labels(self.labelnames, label_values, 'le="%s"' % _format_value(bound)),
+                cumulative))
+        labels = _format_labels(self.labelnames, label_values)
+        lines.append("%s_sum%s %s" % (self.name, labels, _format_value(total)))
+        lines.append("%s_count%s %i" % (self.name, labels, cumulative))
+        return lines
+
+
+REGISTRY = registry()
+
+PHASE_SECONDS = histogram(
+    REGISTRY, "autoscaler_phase_seconds", "Seconds spent in each phase of a scaling pass", ("phase",))
+API_CALLS = counter(
+    REGISTRY, "autoscaler_api_calls_total", "Calls to the Kubernetes and cloud APIs", ("api", "call", "outcome"))
+API_CALL_SECONDS = histogram(
+    REGISTRY, "autoscaler_api_call_seconds", "Seconds calls to the Kubernetes and cloud APIs took", ("api", "call"))
+POPULATE_SECONDS = histogram(
+    REGISTRY, "autoscaler_populate_seconds", "Seconds spent pulling images onto nodes", ("mode",),
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200))
+SCALE_PASSES = counter(REGISTRY, "autoscaler_scale_passes_total", "Scaling passes run")
+NODES = gauge(REGISTRY, "autoscaler_nodes", "Nodes in the cluster at the last scaling pass")
+GOAL_NODES = gauge(REGISTRY, "autoscaler_goal_nodes", "Schedulable nodes the last scaling pass aimed for")
+CORDONED_NODES = gauge(REGISTRY, "autoscaler_cordoned_nodes", "Unschedulable nodes after the last scaling pass")
+UTILIZATION = gauge(
+    REGISTRY, "autoscaler_utilization", "Memory requested over schedulable memory at the last scaling pass")
+HOURLY_SPEND = gauge(
+    REGISTRY, "autoscaler_projected_hourly_spend_dollars", "Dollars per hour the goal of the last scaling pass costs")
+
+
+class _timer:
+
+    def __init__(self, on_exit):
+        self._on_exit = on_exit
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._on_exit(time.perf_counter() - self._start, exc_type is None)
+        return False
+
+
+class _null_timer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_TIMER = _null_timer()
+
+
+def is_enabled():
+    return REGISTRY.enabled
+
+
+def time_phase(phase):
+    """Return a context manager recording how long the phase of a
+    scaling pass inside it takes"""
+    if not REGISTRY.enabled:
+        return _NULL_TIMER
+    return _timer(lambda seconds, succeeded: PHASE_SECONDS.observe(seconds, phase))
+
+
+def api_call(api, call):
+    """Return a context manager counting a call to an API, such as
+    ("kubernetes", "list_node"), by outcome and recording how long
+    it takes"""
+    if not REGISTRY.enabled:
+        return _NULL_TIMER
+
+    def on_exit(seconds, succeeded):
+        API_CALLS.inc(api, call, "success" if succeeded else "error")
+        API_CALL_SECONDS.observe(seconds, api, call)
+    return _timer(on_exit)
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+
+    """http.server.ThreadingHTTPServer, which needs Python 3.7"""
+
+    daemon_threads = True
+
+
+def start_http_server(port, address="", owner=REGISTRY):
+    """Serve the metrics at /metrics from a background thread;
+    return the server, to shut it down"""
+
+    class metrics_handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = owner.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            scale_logger.debug("Metrics request: " + format, *args)
+
+    server = _ThreadingHTTPServer((address, port), metrics_handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def configure(options):
+    """Enable the metrics if options ask for them, and start the
+    HTTP endpoint if options.metrics_port is set; return the server
+    or None"""
+    if not (options.metrics_port or options.metrics_textfile):
+        return None
+    REGISTRY.enabled = True
+    if not options.metrics_port:
+        return None
+    scale_logger.info("Serving metrics on port %i", options.metrics_port)
+    return start_http_server(options.metrics_port)
@@ -0,0 +1,233 @@
+#!/usr/bin/python3
+
+"""Simulate packing the pods of a cluster onto its nodes, over memory
+and CPU requests, to find how many nodes the workload really needs and
+which nodes could be emptied.
+
+Pods on critical nodes stay where they are; every other pod, including
+pending pods, may be moved. All functions are read-only."""
+
+import logging
+
+scale_logger = logging.getLogger("scale")
+
+
+class placement_result:
+
+    """Outcome of a placement simulation"""
+
+    def __init__(self, node_count, new_node_count, emptiable_node_names, unplaced_count):
+        # nodes needed in total, including critical and new nodes
+        self.node_count = node_count
+        # nodes that do not exist yet
+        self.new_node_count = new_node_count
+        # existing non-critical nodes left without pods
+        self.emptiable_node_names = emptiable_node_names
+        # pods that fit on no node at all
+        self.unplaced_count = unplaced_count
+
+    def __repr__(self):
+        return "placement_result(node_count=%r, new_node_count=%r, emptiable_node_names=%r, unplaced_count=%r)" % (
+            self.node_count, self.new_node_count, self.emptiable_node_names, self.unplaced_count)
+
+
+class _bins:
+
+    """Columns describing the nodes pods are packed onto"""
+
+    def __init__(self, headroom):
+        self.headroom = headroom
+        self.names = []
+        self.memory_capacity = []
+        self.cpu_capacity = []
+        self.memory_used = []
+        self.cpu_used = []
+        self.empty = []
+
+    def add(self, name, memory_capacity, cpu_capacity):
+        self.names.append(name)
+        self.memory_capacity.append(memory_capacity)
+        self.cpu_capacity.append(cpu_capacity)
+        self.memory_used.append(0)
+        self.cpu_used.append(0)
+        self.empty.append(True)
+        return len(self.names) - 1
+
+    def fits(self, index, memory, cpu):
+        """A pod fits within headroom of the node's capacity, or
+        alone on an empty node if it is bigger than that"""
+        if self.empty[index]:
+            return memory <= self.memory_capacity[index] and cpu <= self.cpu_capacity[index]
+        return (self.memory_used[index] + memory <= self.memory_capacity[index] * self.headroom and
+                self.cpu_used[index] + cpu <= self.cpu_capacity[index] * self.headroom)
+
+    def place(self, index, memory, cpu):
+        self.memory_used[index] += memory
+        self.cpu_used[index] += cpu
+        self.empty[index] = False
+
+    def remaining_memory(self, index):
+        return self.memory_capacity[index] * self.headroom - self.memory_used[index]
+
+
+def first_fit(bins, candidates, memory, cpu):
+    """Return the first open node the pod fits on, or None"""
+    for index in candidates:
+        if bins.fits(index, memory, cpu):
+            return index
+    return None
+
+
+def best_fit(bins, candidates, memory, cpu):
+    """Return the open node the pod fits on most tightly, or None"""
+    best = None
+    best_remaining = None
+    for index in candidates:
+        if bins.fits(index, memory, cpu):
+            remaining = bins.remaining_memory(index) - memory
+            if best is None or remaining < best_remaining:
+                best = index
+                best_remaining = remaining
+    return best
+
+
+STRATEGIES = {
+    'first_fit': first_fit,
+    'best_fit': best_fit,
+}
+
+
+def simulate_placement(snapshot, strategy='first_fit', headroom=1.0, max_new_nodes=0, new_node_shape=None):
+    """Pack all pods of the ClusterSnapshot in decreasing size onto
+    as few nodes as possible and return a placement_result
+
+    strategy is a name from STRATEGIES or a function with the same
+    signature; headroom is the fraction of each node's capacity that
+    can be filled; up to max_new_nodes nodes of new_node_shape,
+    a (memory, cpu) tuple defaulting to the first node's capacity,
+    may be added when existing nodes run out"""
+    choose = STRATEGIES[strategy] if isinstance(strategy, str) else strategy
+
+    node_names = snapshot.get_node_names()
+    memory_capacities = snapshot.get_node_memory_capacities()
+    cpu_capacities = snapshot.get_node_cpu_capacities()
+    unschedulable = snapshot.get_node_unschedulable()
+    if new_node_shape is None and node_names:
+        new_node_shape = (memory_capacities[0], cpu_capacities[0])
+
+    bins = _bins(headroom)
+    bin_index = {}
+    for name, memory, cpu in zip(node_names, memory_capacities, cpu_capacities):
+        bin_index[name] = bins.add(name, memory, cpu)
+
+    # pods on critical nodes are fixed, the rest are placed again
+    movable = []
+    for node_name, memory, cpu in zip(snapshot.get_pod_node_names(),
+                                      snapshot.get_pod_memory_requests(),
+                                      snapshot.get_pod_cpu_requests()):
+        if node_name in bin_index and snapshot.is_critical(node_name):
+            bins.place(bin_index[node_name], memory, cpu)
+        else:
+            movable.append((memory, cpu))
+    movable.sort(reverse=True)
+
+    open_bins = [bin_index[name] for name in node_names if snapshot.is_critical(name)]
+    # keep schedulable and fuller nodes rather than emptying them
+    closed_bins = sorted(
+        (bin_index[name] for name in node_names if not snapshot.is_critical(name)),
+        key=lambda index: (unschedulable[index], -snapshot.get_memory_request_on_node(node_names[index])))
+    new_node_count = 0
+    unplaced_count = 0
+
+    smallest_memory = movable[-1][0] if movable else 0
+    for memory, cpu in movable:
+        index = choose(bins, open_bins, memory, cpu)
+        if index is None:
+            for position, candidate in enumerate(closed_bins):
+                if bins.fits(candidate, memory, cpu):
+                    index = closed_bins.pop(position)
+                    open_bins.append(index)
+                    break
+        if index is None and new_node_count < max_new_nodes and new_node_shape is not None and \
+                memory <= new_node_shape[0] and cpu <= new_node_shape[1]:
+            new_node_count += 1
+            index = bins.add(None, new_node_shape[0], new_node_shape[1])
+            open_bins.append(index)
+        if index is None:
+            unplaced_count += 1
+            continue
+        bins.place(index, memory, cpu)
+        if bins.remaining_memory(index) < smallest_memory:
+            # nothing left to place can fit here any more
+            open_bins.remove(index)
+
+    emptiable_node_names = [node_names[index] for index in closed_bins]
+    node_count = len(node_names) - len(emptiable_node_names) + new_node_count
+    return placement_result(node_count, new_node_count, emptiable_node_names, unplaced_count)
+
+
+class pending_placement:
+
+    """Where the pods the scheduler found no node for could run"""
+
+    def __init__(self, uncordon_names, new_node_count, unplaced_count):
+        # unschedulable nodes with room for some of the pods
+        self.uncordon_names = uncordon_names
+        # new nodes needed for the others
+        self.new_node_count = new_node_count
+        # pods that fit on no node at all
+        self.unplaced_count = unplaced_count
+
+    def __repr__(self):
+        return "pending_placement(uncordon_names=%r, new_node_count=%r, unplaced_count=%r)" % (
+            self.uncordon_names, self.new_node_count, self.unplaced_count)
+
+
+def place_pending_pods(snapshot, pods, max_new_nodes=0, new_node_shape=None):
+    """Pack the pending PodRecords pods in decreasing size into the
+    room left on the unschedulable nodes of the ClusterSnapshot, the
+    roomiest first, then onto up to max_new_nodes new nodes of
+    new_node_shape, a (memory, cpu) tuple defaulting to the first
+    node's capacity, and return a pending_placement
+
+    Uncordoning a node is free and instant, so new nodes only take
+    the pods no unschedulable node has room for"""
+    node_names = snapshot.get_node_names()
+    memory_capacities = snapshot.get_node_memory_capacities()
+    cpu_capacities = snapshot.get_node_cpu_capacities()
+    if new_node_shape is None and node_names:
+        new_node_shape = (memory_capacities[0], cpu_capacities[0])
+
+    bins = _bins(1.0)
+    bin_index = {}
+    for name, memory, cpu, unschedulable in zip(
+            node_names, memory_capacities, cpu_capacities, snapshot.get_node_unschedulable()):
+        if unschedulable and not snapshot.is_critical(name):
+            bin_index[name] = bins.add(name, memory, cpu)
+    for node_name, memory, cpu in zip(snapshot.get_pod_node_names(),
+                                      snapshot.get_pod_memory_requests(),
+                                      snapshot.get_pod_cpu_requests()):
+        if node_name in bin_index:
+            bins.place(bin_index[node_name], memory, cpu)
+    cordoned_bins = sorted(bin_index.values(), key=lambda index: -bins.remaining_memory(index))
+    new_bins = []
+    used = set()
+    unplaced_count = 0
+
+    for memory, cpu in sorted(((pod.memory_request, pod.cpu_request) for pod in pods), reverse=True):
+        index = first_fit(bins, cordoned_bins, memory, cpu)
+        if index is not None:
+            used.add(index)
+        else:
+            index = first_fit(bins, new_bins, memory, cpu)
+        if index is None and len(new_bins) < max_new_nodes and new_node_shape is not None and \
+                memory <= new_node_shape[0] and cpu <= new_node_shape[1]:
+            index = bins.add(None, new_node_shape[0], new_node_shape[1])
+            new_bins.append(index)
+        if index is None:
+            unplaced_count += 1
+            continue
+        bins.place(index, memory, cpu)
+
+    uncordon_names = [bins.names[index] for index in cordoned_bins if index in used]
+    return pending_placement(uncordon_names, len(new_bins), unplaced_count)
@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+
+"""Node pools of different machine shapes and prices, and the choice
+of how many nodes of each pool serve the demand at the least cost.
+
+A pool is a managed instance group of identical nodes. Its segment
+is part of the names of both the group and its nodes, as the segment
+given by --context-for-cloud is for a single group, and ties each
+node to its pool. Pools are read from the NODE_POOLS environment
+variable, one entry per pool separated by ':', each entry being
+
+    name,segment,memory,cpu,price,min_nodes,max_nodes[,preemptible]
+
+with memory and cpu as Kubernetes quantities and price in dollars per
+node-hour, e.g. "highmem,highmem-pool,13Gi,2,0.148,2,40". The price
+may instead be a machine type of the PRICE_TABLE (see
+autoscaler.pricing), e.g. "highmem,highmem-pool,13Gi,2,n1-highmem-2,2,40"."""
+
+import logging
+import math
+
+from .utils import parse_cpu, parse_memory
+
+scale_logger = logging.getLogger("scale")
+
+# share of the cheapest price an allocation may exceed, trading an
+# exact optimum for a search many times shorter on six or more pools
+ALLOCATION_GAP = 0.005
+
+
+class node_pool:
+
+    """A managed instance group of nodes with memory bytes, cpu
+    millicores and an hourly price each, holding between min_nodes
+    and max_nodes nodes; preemptible pools may lose their nodes at
+    any time"""
+
+    __slots__ = ('name', 'segment', 'memory', 'cpu', 'price', 'min_nodes', 'max_nodes', 'preemptible')
+
+    def __init__(self, name, segment, memory, cpu, price, min_nodes, max_nodes, preemptible=False):
+        if min_nodes < 0 or max_nodes < min_nodes:
+            raise ValueError("Pool %s needs 0 <= min_nodes <= max_nodes" % name)
+        if memory <= 0 or cpu <= 0 or price < 0:
+            raise ValueError("Pool %s needs a positive shape and price" % name)
+        self.name = name
+        self.segment = segment
+        self.memory = memory
+        self.cpu = cpu
+        self.price = price
+        self.min_nodes = min_nodes
+        self.max_nodes = max_nodes
+        self.preemptible = preemptible
+
+    def matches(self, node_name):
+        """Return True if the named node belongs to the pool"""
+        return self.segment in node_name
+
+    def __repr__(self):
+        return "node_pool(%s, memory=%i, cpu=%i, price=%r, nodes=%i-%i%s)" % (
+            self.name, self.memory, self.cpu, self.price, self.min_nodes, self.max_nodes,
+            ", preemptible" if self.preemptible else "")
+
+
+def parse_node_pool(entry, prices=None):
+    """Return the node_pool described by an entry of NODE_POOLS,
+    looking machine types up in the price_table prices"""
+    fields = [field.strip() for field in entry.split(",")]
+    if len(fields) not in (7, 8) or (len(fields) == 8 and fields[7] != "preemptible"):
+        raise ValueError("Invalid node pool %r: expected name,segment,memory,cpu,price,"
+                         "min_nodes,max_nodes[,preemptible]" % entry)
+    name, segment, memory, cpu, price, min_nodes, max_nodes = fields[:7]
+    preemptible = len(fields) == 8
+    try:
+        price = float(price)
+    except ValueError:
+        machine_type = price
+        price = None if prices is None else prices.get_price(machine_type, preemptible)
+        if price is None:
+            raise ValueError("Pool %s: no %sprice for machine type %s" % (
+                name, "preemptible " if preemptible else "", machine_type))
+    return node_pool(name, segment, parse_memory(memory), parse_cpu(cpu), price,
+                     int(min_nodes), int(max_nodes), preemptible)
+
+
+def parse_node_pools(entries, prices=None):
+    """Return the node_pool of every non-empty entry"""
+    pools = [parse_node_pool(entry, prices) for entry in entries if entry.strip()]
+    names = [pool.name for pool in pools]
+    if len(set(names)) != len(names):
+        raise ValueError("Node pool names must be unique: %s" % ", ".join(names))
+    return pools
+
+
+def get_node_pool(pools, node_name):
+    """Return the first pool the named node belongs to, None if
+    it belongs to none"""
+    for pool in pools:
+        if pool.matches(node_name):
+            return pool
+    return None
+
+
+def group_nodes_by_pool(pools, nodes):
+    """Return a dict from the name of every pool to the list of
+    its nodes; nodes of no pool are left out"""
+    result = {pool.name: [] for pool in pools}
+    for node in nodes:
+        pool = get_node_pool(pools, node.name)
+        if pool is not None:
+            result[pool.name].append(node)
+    return result
+
+
+class allocation:
+
+    """Number of nodes of each pool, by pool name, with their total
+    hourly price; feasible is False when even every pool at its
+    maximum falls short of the demand"""
+
+    def __init__(self, counts, price, feasible):
+        self.counts = counts
+        self.price = price
+        self.feasible = feasible
+
+    def __repr__(self):
+        return "allocation(%r, price=%.3f%s)" % (self.counts, self.price, "" if self.feasible else ", infeasible")
+
+
+def allocate(pools, memory, cpu, max_preemptible_share=1.0, gap=ALLOCATION_GAP):
+    """Return an allocation providing at least memory bytes and cpu
+    millicores, with no more than max_preemptible_share of the memory
+    on preemptible pools and every pool within its bounds, whose
+    hourly price is within gap of the least possible
+
+    The search assigns pools one at a time, cheapest memory first,
+    and prunes every branch whose price plus a lower bound on the
+    price of the remaining demand cannot beat the best allocation
+    found so far by more than gap, so it stays fast for the handful
+    of pools a cluster has"""
+    if not pools:
+        return allocation({}, 0.0, memory <= 0 and cpu <= 0)
+    pools = sorted(pools, key=lambda pool: (pool.price / pool.memory, pool.name))
+    # each pool provides memory, cpu and memory that stays when
+    # preemptible nodes are taken away
+    supplies = [(pool.memory, pool.cpu, 0 if pool.preemptible else pool.memory) for pool in pools]
+    demand = [memory, cpu, memory * (1 - max_preemptible_share)]
+    base_price = 0.0
+    for pool, supply in zip(pools, supplies):
+        base_price += pool.price * pool.min_nodes
+        for resource in range(3):
+            demand[resource] -= supply[resource] * pool.min_nodes
+
+    # for each index and resource, the pools from the index on that
+    # provide the resource, cheapest per unit first, with the most
+    # they can add; filling the remaining demand from them, fractions
+    # of nodes allowed, bounds the price of any allocation below
+    fill_orders = []
+    for index in range(len(pools)):
+        orders = []
+        for resource in range(3):
+            orders.append(sorted(
+                (pools[later].price / supplies[later][resource],
+                 supplies[later][resource] * (pools[later].max_nodes - pools[later].min_nodes))
+                for later in range(index, len(pools))
+                if supplies[later][resource] > 0 and pools[later].max_nodes > pools[later].min_nodes))
+        fill_orders.append(orders)
+
+    # most of each resource the pools after each index can add
+    later_supplies = [[0] * 3 for _ in range(len(pools))]
+    for index in range(len(pools) - 2, -1, -1):
+        for resource in range(3):
+            later_supplies[index][resource] = later_supplies[index + 1][resource] + supplies[index + 1][resource] * (
+                pools[index + 1].max_nodes - pools[index + 1].min_nodes)
+
+    def get_bound(index, remaining):
+        bound = 0.0
+        for resource in range(3):
+            amount = remaining[resource]
+            price = 0.0
+            for unit_price, most in fill_orders[index][resource]:
+                if amount <= 0:
+                    break
+                price += unit_price * min(amount, most)
+                amount -= most
+            if amount > 0:
+                return math.inf
+            bound = max(bound, price)
+        return bound
+
+    extra = [0] * len(pools)
+    best_extra = None
+    best_price = math.inf
+
+    def search(index, remaining, price):
+        nonlocal best_extra, best_price
+        if all(amount <= 0 for amount in remaining):
+            if price < best_price:
+                best_price = price
+                best_extra = list(extra)
+            return
+        if index == len(pools):
+            return
+        if price + get_bound(index, remaining) >= best_price * (1 - gap):
+            return
+        pool = pools[index]
+        supply = supplies[index]
+        # fewer nodes than the later pools cannot make up for, or more
+        # than cover the remaining demand alone, lead nowhere better
+        least = 0
+        most = 0
+        for resource in range(3):
+            if remaining[resource] > 0 and supply[resource] > 0:
+                least = max(least, math.ceil((remaining[resource] - later_supplies[index][resource]) / supply[resource]))
+                most = max(most, math.ceil(remaining[resource] / supply[resource]))
+        most = min(most, pool.max_nodes - pool.min_nodes)
+        if index == len(pools) - 1:
+            # the last pool only needs its fewest nodes covering the rest
+            least = most
+        for count in range(most, least - 1, -1):
+            extra[index] = count
+            search(index + 1, [remaining[resource] - supply[resource] * count for resource in range(3)],
+                   price + pool.price * count)
+        extra[index] = 0
+
+    search(0, demand, base_price)
+    if best_extra is None:
+        counts = {pool.name: pool.max_nodes for pool in pools}
+        return allocation(counts, sum(pool.price * pool.max_nodes for pool in pools), False)
+    counts = {pool.name: pool.min_nodes + count for pool, count in zip(pools, best_extra)}
+    return allocation(counts, best_price, True)
@@ -1,13 +1,73 @@
 import logging
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from .utils import populate_pods
+from . import metrics
+from .prepull import image_prepuller, image_presence_index, prepull_progress
+from .utils import pull_image_on_node
 
 scale_logger = logging.getLogger("scale")
 
 
-def populate(k8s):
+def populate(k8s, options):
+    """Pull the images in use onto the nodes lacking them, and
+    only those; return the prepull_progress"""
     # FIXME: Remove all calls to this function after auto-pulling images
     scale_logger.debug("Populate images to new or newly schedulable nodes")
-    for image_url in k8s.get_image_urls():
-        populate_pods(k8s.get_cluster_name(), image_url)
-    scale_logger.debug("Populate finished")
+    index = image_presence_index(k8s.get_nodes())
+    return _pull(k8s, index.get_missing_pulls(k8s.get_image_urls()), options)
+
+
+def populate_node(k8s, node_name, options):
+    """Pull every image onto a single, newly ready node"""
+    scale_logger.debug("Populate images to node %s", node_name)
+    return _pull(k8s, [(node_name, image_url) for image_url in sorted(k8s.get_image_urls())], options)
+
+
+def _pull(k8s, pulls, options):
+    if not pulls:
+        scale_logger.debug("Populate finished: every node holds every image")
+        return prepull_progress(0, 0, 0)
+    start = time.perf_counter()
+    if options.prepull_mode == "ssh":
+        progress = _pull_over_ssh(pulls, options)
+    else:
+        prepuller = image_prepuller(
+            k8s.get_core_api(), options.prepull_namespace, per_node=options.prepull_per_node)
+        prepuller.start(pulls)
+        progress = prepuller.wait(options.prepull_timeout, options.prepull_poll_interval)
+    metrics.POPULATE_SECONDS.observe(time.perf_counter() - start, options.prepull_mode)
+    scale_logger.debug("Populate finished: %r", progress)
+    return progress
+
+
+def _pull_over_ssh(pulls, options):
+    """Run the pulls over gcloud compute ssh, up to
+    options.prepull_workers at a time in total and
+    options.prepull_per_node at a time on each node"""
+    images_by_node = {}
+    for node_name, image_url in pulls:
+        images_by_node.setdefault(node_name, []).append(image_url)
+    # each chain of pulls runs one after the other on a single node
+    chains = []
+    for node_name, image_urls in images_by_node.items():
+        for start in range(min(options.prepull_per_node, len(image_urls))):
+            chains.append((node_name, image_urls[start::options.prepull_per_node]))
+
+    with ThreadPoolExecutor(max_workers=options.prepull_workers) as executor:
+        failed = sum(executor.map(lambda chain: _pull_chain(chain[0], chain[1], options.zone), chains))
+    return prepull_progress(len(pulls), len(pulls) - failed, failed)
+
+
+def _pull_chain(node_name, image_urls, zone):
+    """Pull the images onto the node one by one; return the
+    number of failed pulls"""
+    failed = 0
+    for image_url in image_urls:
+        try:
+            pull_image_on_node(node_name, image_url, zone)
+        except subprocess.CalledProcessError:
+            scale_logger.warning("Could not pull %s on node %s", image_url, node_name)
+            failed += 1
+    return failed
@@ -0,0 +1,231 @@
+#!/usr/bin/python3
+
+"""Pull images onto nodes from inside the cluster: one short-lived pod
+per (node, image) pull, bound to the node, that makes the kubelet pull
+the image and exits right away. A pull is over once the container has
+started, whatever its command did: an image without `true`, distroless
+for one, fails to run but is pulled all the same. Only nodes whose
+status.images lacks an image get a pod for it."""
+
+import logging
+import time
+import zlib
+from collections import deque
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+scale_logger = logging.getLogger("scale")
+
+# label carried by every pre-pull pod, valued with its puller's name
+PREPULL_LABEL = "autoscaler-prepull"
+
+PULL_PENDING = "pending"
+PULL_SUCCEEDED = "succeeded"
+PULL_FAILED = "failed"
+
+# container waiting reasons meaning the image will not be pulled
+_PULL_ERRORS = ("ErrImagePull", "ImagePullBackOff", "InvalidImageName", "ErrImageNeverPull")
+
+
+class image_presence_index:
+
+    """Which images each node of a NodeRecord list already holds,
+    according to the status.images of the nodes"""
+
+    def __init__(self, nodes):
+        self._node_names = []
+        self._images = {}
+        for node in nodes:
+            self._node_names.append(node.name)
+            self._images[node.name] = set(node.images)
+
+    def has_image(self, node_name, image_url):
+        return image_url in self._images.get(node_name, ())
+
+    def add(self, node_name, image_url):
+        """Record that the image has been pulled onto the node"""
+        self._images.setdefault(node_name, set()).add(image_url)
+
+    def get_missing_pulls(self, image_urls, node_names=None):
+        """Return the (node name, image url) pairs for the images
+        missing from each node, all nodes by default, in node order"""
+        image_urls = sorted(image_urls)
+        if node_names is None:
+            node_names = self._node_names
+        return [(node_name, image_url) for node_name in node_names
+                for image_url in image_urls if not self.has_image(node_name, image_url)]
+
+
+def get_missing_pulls(nodes, image_urls):
+    """Return the (node name, image url) pairs for the images
+    missing from each node, in node order"""
+    return image_presence_index(nodes).get_missing_pulls(image_urls)
+
+
+def get_prepull_pod_name(node_name, image_url):
+    return "prepull-%s-%08x" % (node_name, zlib.crc32(image_url.encode()))
+
+
+def make_prepull_pod(node_name, image_url, puller_name):
+    """Return a pod pulling the image on the node, bypassing
+    the scheduler so that unschedulable nodes get it too"""
+    return client.V1Pod(
+        api_version="v1",
+        kind="Pod",
+        metadata=client.V1ObjectMeta(
+            name=get_prepull_pod_name(node_name, image_url),
+            labels={PREPULL_LABEL: puller_name}),
+        spec=client.V1PodSpec(
+            node_name=node_name,
+            restart_policy="Never",
+            containers=[client.V1Container(
+                name="prepull",
+                image=image_url,
+                image_pull_policy="IfNotPresent",
+                command=["true"],
+                resources=client.V1ResourceRequirements(
+                    requests={"cpu": "1m", "memory": "8Mi"}))]))
+
+
+def _get_pull_state(pod):
+    status = pod.status
+    for container_status in getattr(status, 'container_statuses', None) or []:
+        state = container_status.state
+        if state is None:
+            continue
+        if state.running is not None or state.terminated is not None:
+            # the image is on the node, whatever the exit code
+            return PULL_SUCCEEDED
+        if state.waiting is not None and state.waiting.reason in _PULL_ERRORS:
+            return PULL_FAILED
+    phase = getattr(status, 'phase', None)
+    if phase == "Succeeded":
+        return PULL_SUCCEEDED
+    if phase == "Failed":
+        return PULL_FAILED
+    return PULL_PENDING
+
+
+class prepull_progress:
+
+    """Counts of the pulls of an image_prepuller by state"""
+
+    def __init__(self, total, succeeded, failed):
+        self.total = total
+        self.succeeded = succeeded
+        self.failed = failed
+        self.pending = total - succeeded - failed
+
+    def is_done(self):
+        return self.pending == 0
+
+    def __repr__(self):
+        return "prepull_progress(total=%r, succeeded=%r, failed=%r, pending=%r)" % (
+            self.total, self.succeeded, self.failed, self.pending)
+
+
+class image_prepuller:
+
+    """Creates the pre-pull pods for a list of (node name, image url)
+    pulls in the namespace, at most per_node at a time on each node,
+    follows them with one labelled listing per poll and deletes each
+    pod once its pull is over"""
+
+    def __init__(self, v1, namespace, name="autoscaler", per_node=2):
+        self._v1 = v1
+        self._namespace = namespace
+        self._name = name
+        self._per_node = per_node
+        self._pulls = {}
+        self._running = {}
+        self._queued = {}
+
+    def start(self, pulls):
+        """Queue one pod per pull not started yet and create as many
+        as the per-node limit allows"""
+        for node_name, image_url in pulls:
+            pod_name = get_prepull_pod_name(node_name, image_url)
+            if pod_name in self._pulls:
+                continue
+            self._pulls[pod_name] = PULL_PENDING
+            self._queued.setdefault(node_name, deque()).append((pod_name, image_url))
+        self._launch()
+        scale_logger.debug("Pulling %i images onto nodes", len(self._pulls))
+        return self.get_progress()
+
+    def _launch(self):
+        for node_name, queue in self._queued.items():
+            running = self._running.setdefault(node_name, set())
+            while queue and len(running) < self._per_node:
+                pod_name, image_url = queue.popleft()
+                try:
+                    self._v1.create_namespaced_pod(
+                        self._namespace, make_prepull_pod(node_name, image_url, self._name))
+                    running.add(pod_name)
+                except ApiException as e:
+                    if e.status == 409:
+                        # left over by an earlier run, follow it instead
+                        running.add(pod_name)
+                    else:
+                        scale_logger.warning(
+                            "Could not start pulling %s on node %s: %s", image_url, node_name, e.reason)
+                        self._pulls[pod_name] = PULL_FAILED
+
+    def poll(self):
+        """Update the state of every running pull from its pod, start
+        queued pulls in the room left and return the progress"""
+        if not any(self._running.values()):
+            return self.get_progress()
+        pods = {pod.metadata.name: pod for pod in self._v1.list_namespaced_pod(
+            self._namespace, label_selector="%s=%s" % (PREPULL_LABEL, self._name)).items}
+        for running in self._running.values():
+            for pod_name in list(running):
+                pod = pods.get(pod_name)
+                state = PULL_FAILED if pod is None else _get_pull_state(pod)
+                if state == PULL_PENDING:
+                    continue
+                self._pulls[pod_name] = state
+                running.discard(pod_name)
+                if state == PULL_FAILED:
+                    scale_logger.warning("Pre-pull pod %s failed", pod_name)
+                if pod is not None:
+                    self._delete(pod_name)
+        self._launch()
+        return self.get_progress()
+
+    def get_progress(self):
+        states = list(self._pulls.values())
+        return prepull_progress(
+            len(states), states.count(PULL_SUCCEEDED), states.count(PULL_FAILED))
+
+    def wait(self, timeout, interval=5, clock=time.monotonic, sleep=time.sleep):
+        """Poll every interval seconds until every pull is over or
+        timeout seconds have passed; pods still pending then are
+        deleted and count as failed"""
+        deadline = clock() + timeout
+        progress = self.poll()
+        while not progress.is_done() and clock() < deadline:
+            sleep(interval)
+            progress = self.poll()
+        if not progress.is_done():
+            scale_logger.warning("Gave up on %i image pulls after %.0f seconds", progress.pending, timeout)
+            for running in self._running.values():
+                for pod_name in running:
+                    self._delete(pod_name)
+                running.clear()
+            for queue in self._queued.values():
+                queue.clear()
+            for pod_name, state in self._pulls.items():
+                if state == PULL_PENDING:
+                    self._pulls[pod_name] = PULL_FAILED
+            progress = self.get_progress()
+        return progress
+
+    def _delete(self, pod_name):
+        try:
+            self._v1.delete_namespaced_pod(
+                pod_name, self._namespace, client.V1DeleteOptions(grace_period_seconds=0))
+        except ApiException as e:
+            if e.status != 404:
+                scale_logger.warning("Could not delete pre-pull pod %s: %s", pod_name, e.reason)
@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+
+"""Hourly prices of machine types, and how Compute Engine bills the
+time nodes run.
+
+The price table is a JSON file, given by PRICE_TABLE, mapping every
+machine type to its price in dollars per node-hour, or to an object
+with its "hourly" price and, if it may run preemptible, its
+"preemptible" price, e.g.
+
+    {"n1-highmem-2": {"hourly": 0.1184, "preemptible": 0.025},
+     "n1-standard-2": 0.095}
+
+Nodes are priced by the machine type and preemptible labels GKE sets
+on them. A node is billed for at least BILLING_MINIMUM seconds once
+created, then per started BILLING_INCREMENT seconds, so deleting a
+node within its billing minimum saves nothing."""
+
+import json
+import math
+
+# labels naming the machine type of a node, the newer first
+INSTANCE_TYPE_LABELS = ("node.kubernetes.io/instance-type", "beta.kubernetes.io/instance-type")
+PREEMPTIBLE_LABEL = "cloud.google.com/gke-preemptible"
+
+
+class price_table:
+
+    """Dollars per node-hour of machine types, on demand and
+    preemptible"""
+
+    def __init__(self, prices=None):
+        """prices maps every machine type to the pair of its on-demand
+        and preemptible price, the latter None if unknown"""
+        self._prices = prices or {}
+
+    def __len__(self):
+        return len(self._prices)
+
+    def get_price(self, machine_type, preemptible=False):
+        """Return the hourly price of a node of machine_type, None if
+        the table has none"""
+        hourly, preemptible_price = self._prices.get(machine_type, (None, None))
+        return preemptible_price if preemptible else hourly
+
+    def get_node_price(self, node):
+        """Return the hourly price of a NodeRecord by its labels, None
+        if it has no known machine type"""
+        labels = node.labels or {}
+        for label in INSTANCE_TYPE_LABELS:
+            if label in labels:
+                return self.get_price(labels[label], labels.get(PREEMPTIBLE_LABEL) == "true")
+        return None
+
+
+def _parse_price(machine_type, value):
+    if isinstance(value, dict):
+        hourly, preemptible = value.get("hourly"), value.get("preemptible")
+    else:
+        hourly, preemptible = value, None
+    if not isinstance(hourly, (int, float)) or hourly < 0 or \
+            not (preemptible is None or isinstance(preemptible, (int, float)) and preemptible >= 0):
+        raise ValueError("Invalid price of machine type %s: %r" % (machine_type, value))
+    return hourly, preemptible
+
+
+def load_price_table(path):
+    """Return the price_table of the JSON file at path"""
+    with open(path) as table_file:
+        table = json.load(table_file)
+    if not isinstance(table, dict):
+        raise ValueError("The price table %s should map machine types to prices" % path)
+    return price_table({machine_type: _parse_price(machine_type, value)
+                        for machine_type, value in table.items()})
+
+
+def get_price_table(options):
+    """Return the price_table of the file options.price_table, an
+    empty one if no file is set"""
+    return load_price_table(options.price_table) if options.price_table else price_table()
+
+
+class billing_model:
+
+    """Billing of nodes by the time they run: minimum seconds at
+    least, then per started increment of seconds"""
+
+    def __init__(self, minimum=600, increment=60):
+        self.minimum = minimum
+        self.increment = increment
+
+    def get_billed_seconds(self, uptime):
+        """Return the seconds billed for a node that ran uptime seconds"""
+        if uptime <= self.minimum:
+            return self.minimum
+        if self.increment <= 0:
+            return uptime
+        return self.minimum + math.ceil((uptime - self.minimum) / self.increment) * self.increment
+
+    def get_prepaid_seconds(self, node, now):
+        """Return the seconds the NodeRecord is already billed for
+        beyond now, 0 if its creation time is unknown"""
+        if node.creation_time is None:
+            return 0
+        uptime = max(now - node.creation_time, 0)
+        return self.get_billed_seconds(uptime) - uptime
+
+    def is_within_minimum(self, node, now):
+        """Return True if the NodeRecord has run for less than the
+        billing minimum, so deleting it now saves nothing"""
+        return node.creation_time is not None and now - node.creation_time < self.minimum
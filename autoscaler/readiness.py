@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+
+"""Follow a cluster resize until its new nodes are Ready, and start
+pre-pulling images on every new node as soon as it is, without
+blocking the scaling pass that asked for the resize"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .cluster_update import OPERATION_DONE
+from .listing import list_nodes
+
+scale_logger = logging.getLogger("scale")
+
+
+class readiness_tracker:
+
+    """Polls the cloud operations of a resize and the Ready condition
+    of every node that was not in known_node_names, backing off
+    exponentially from initial_delay to max_delay seconds while nothing
+    changes; on_ready is called with the name of each new node once it
+    is Ready, on up to `workers` threads
+
+    Tracking ends once the operations are done and expected_new nodes
+    are Ready, or after timeout seconds"""
+
+    def __init__(self, cluster, v1, operation, known_node_names, expected_new, on_ready,
+                 initial_delay=5, max_delay=60, timeout=900, workers=16, clock=time.monotonic, page_size=500):
+        self._cluster = cluster
+        self._v1 = v1
+        self._page_size = page_size
+        # operations of the resize still running; a resize of several
+        # node pools gives a list of operations
+        if operation is None:
+            self._operations = []
+        elif isinstance(operation, list):
+            self._operations = [item for item in operation if item is not None]
+        else:
+            self._operations = [operation]
+        self._known_node_names = set(known_node_names)
+        self._expected_new = expected_new
+        self._on_ready = on_ready
+        self._initial_delay = initial_delay
+        self._max_delay = max_delay
+        self._timeout = timeout
+        self._workers = workers
+        self._clock = clock
+
+        self._operation_done = not self._operations
+        self._ready_node_names = []
+        self._delay = initial_delay
+        self._started_at = clock()
+        self._next_poll = self._started_at
+        self._timed_out = False
+        self._stopped = threading.Event()
+        self._executor = None
+        self._thread = None
+
+    def get_ready_node_names(self):
+        """Return the names of the new nodes found Ready so far,
+        in the order they became Ready"""
+        return list(self._ready_node_names)
+
+    def get_known_node_names(self):
+        """Return the names of the nodes not to wait for: the known
+        ones and the new ones found Ready so far"""
+        return set(self._known_node_names)
+
+    def get_outstanding_count(self):
+        """Return the number of new nodes still expected to be Ready"""
+        return max(self._expected_new - len(self._ready_node_names), 0)
+
+    def is_done(self):
+        return self._timed_out or self._stopped.is_set() or (
+            self._operation_done and len(self._ready_node_names) >= self._expected_new)
+
+    def next_timeout(self):
+        """Seconds until poll could next have something to do"""
+        return max(self._next_poll - self._clock(), 0)
+
+    def poll(self):
+        """Check the operation and the nodes once, if the backoff
+        allows; return True once tracking is finished"""
+        if self.is_done():
+            return True
+        now = self._clock()
+        if now < self._next_poll:
+            return False
+
+        progressed = False
+        try:
+            progressed = self._poll_operations()
+            progressed = self._poll_nodes(now) or progressed
+        except Exception:
+            # the API may fail for a moment; back off as when nothing changed
+            scale_logger.warning("Could not check the new nodes, trying again in %.0f seconds",
+                                 self._delay, exc_info=True)
+
+        if self.is_done():
+            return True
+        if now - self._started_at >= self._timeout:
+            scale_logger.warning(
+                "Gave up waiting for new nodes after %.0f seconds, %i of %i ready",
+                now - self._started_at, len(self._ready_node_names), self._expected_new)
+            self._timed_out = True
+            return True
+
+        if progressed:
+            self._delay = self._initial_delay
+        self._next_poll = now + self._delay
+        self._delay = min(self._delay * 2, self._max_delay)
+        return False
+
+    def _poll_operations(self):
+        """Check the operations still running; return True if one
+        of them finished"""
+        if self._operation_done:
+            return False
+        running = []
+        for operation in self._operations:
+            status = self._cluster.get_operation_status(operation)
+            scale_logger.debug("Resize operation is %s", status)
+            if status != OPERATION_DONE:
+                running.append(operation)
+        progressed = len(running) < len(self._operations)
+        self._operations = running
+        self._operation_done = not running
+        return progressed
+
+    def _poll_nodes(self, now):
+        """Start pre-pulling on the new nodes found Ready; return True
+        if there were any"""
+        progressed = False
+        for node in list_nodes(self._v1, self._page_size):
+            name = node.name
+            if name in self._known_node_names or not node.ready:
+                continue
+            self._known_node_names.add(name)
+            self._ready_node_names.append(name)
+            progressed = True
+            scale_logger.info("Node %s is ready after %.0f seconds", name, now - self._started_at)
+            self._start(name)
+        return progressed
+
+    def _start(self, node_name):
+        if self._workers <= 0:
+            self._call_on_ready(node_name)
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers)
+        self._executor.submit(self._call_on_ready, node_name)
+
+    def _call_on_ready(self, node_name):
+        try:
+            self._on_ready(node_name)
+        except Exception:
+            scale_logger.exception("Failed to start pre-pulling on node %s", node_name)
+
+    def run(self):
+        """Poll until tracking is finished"""
+        while not self.poll():
+            self._stopped.wait(self.next_timeout())
+
+    def start(self):
+        """Track in a background thread and return right away"""
+        self._thread = threading.Thread(target=self.run, name="readiness", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def wait(self):
+        """Block until tracking and every on_ready call started
+        so far have finished"""
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
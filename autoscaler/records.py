@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+
+"""Compact records of the pods and nodes of the cluster, holding only
+the fields the autoscaler reads, with resource quantities already
+parsed.
+
+Records are built straight from the raw JSON of the API server, or
+from the Kubernetes model objects the watches of daemon mode deliver."""
+
+from .utils import get_pod_host_name, get_pod_memory_request, get_pod_cpu_request, \
+    get_pod_start_time, get_node_memory_capacity, get_node_cpu_capacity, \
+    is_node_ready, is_pod_unschedulable, parse_memory, parse_cpu, parse_timestamp
+
+# env variable of the notebook pods naming their image
+IMAGE_ENV_NAME = 'SINGLEUSER_IMAGE'
+
+
+class PodRecord:
+
+    """A pod: memory_request in bytes and cpu_request in millicores,
+    both of its first container, start_time in seconds since the
+    epoch, None until it has started, and unschedulable True once the
+    scheduler has found no node for it"""
+
+    __slots__ = ('namespace', 'name', 'labels', 'node_name', 'phase',
+                 'memory_request', 'cpu_request', 'image_url', 'start_time', 'unschedulable')
+
+    def __init__(self, namespace=None, name=None, labels=None, node_name=None, phase=None,
+                 memory_request=0, cpu_request=0, image_url=None, start_time=None, unschedulable=False):
+        self.namespace = namespace
+        self.name = name
+        self.labels = labels
+        self.node_name = node_name
+        self.phase = phase
+        self.memory_request = memory_request
+        self.cpu_request = cpu_request
+        self.image_url = image_url
+        self.start_time = start_time
+        self.unschedulable = unschedulable
+
+    def __repr__(self):
+        return "PodRecord(%s/%s on %s)" % (self.namespace, self.name, self.node_name)
+
+
+class NodeRecord:
+
+    """A node: memory_capacity in bytes, cpu_capacity in millicores,
+    the names of the images it holds, creation_time in seconds since
+    the epoch, None if unknown, and whether it is ready, False only
+    while it reports a Ready condition other than True"""
+
+    __slots__ = ('name', 'labels', 'unschedulable', 'memory_capacity', 'cpu_capacity', 'images', 'creation_time',
+                 'ready')
+
+    def __init__(self, name=None, labels=None, unschedulable=False, memory_capacity=0,
+                 cpu_capacity=0, images=frozenset(), creation_time=None, ready=True):
+        self.name = name
+        self.labels = labels
+        self.unschedulable = unschedulable
+        self.memory_capacity = memory_capacity
+        self.cpu_capacity = cpu_capacity
+        self.images = images
+        self.creation_time = creation_time
+        self.ready = ready
+
+    def __repr__(self):
+        return "NodeRecord(%s)" % self.name
+
+
+def _get_request(requests, name, parse):
+    try:
+        return parse(requests[name])
+    except (KeyError, TypeError):
+        return 0
+
+
+def pod_record_from_json(item):
+    """Return the PodRecord of a pod of a raw API response"""
+    metadata = item.get('metadata') or {}
+    spec = item.get('spec') or {}
+    status = item.get('status') or {}
+    containers = spec.get('containers') or ()
+    requests = None
+    image_url = None
+    if containers:
+        requests = (containers[0].get('resources') or {}).get('requests')
+        for entry in containers[0].get('env') or ():
+            if entry.get('name') == IMAGE_ENV_NAME:
+                image_url = entry.get('value')
+    start_time = status.get('startTime')
+    unschedulable = False
+    for condition in status.get('conditions') or ():
+        if condition.get('type') == 'PodScheduled':
+            unschedulable = condition.get('status') == 'False' and condition.get('reason') == 'Unschedulable'
+    return PodRecord(
+        metadata.get('namespace'), metadata.get('name'), metadata.get('labels'),
+        spec.get('nodeName'), status.get('phase'),
+        _get_request(requests, 'memory', parse_memory), _get_request(requests, 'cpu', parse_cpu),
+        image_url, None if start_time is None else parse_timestamp(start_time), unschedulable)
+
+
+def node_record_from_json(item):
+    """Return the NodeRecord of a node of a raw API response"""
+    metadata = item.get('metadata') or {}
+    status = item.get('status') or {}
+    capacity = status.get('capacity') or {}
+    images = frozenset(name for image in status.get('images') or () for name in image.get('names') or ())
+    creation_time = metadata.get('creationTimestamp')
+    return NodeRecord(
+        metadata.get('name'), metadata.get('labels'), bool((item.get('spec') or {}).get('unschedulable')),
+        parse_memory(capacity['memory']), parse_cpu(capacity['cpu']), images,
+        None if creation_time is None else parse_timestamp(creation_time), is_node_ready(status.get('conditions')))
+
+
+def pod_record_from_model(pod):
+    """Return the PodRecord of a v1.Pod"""
+    image_url = None
+    env = getattr(pod.spec.containers[0], 'env', None) if pod.spec.containers else None
+    for entry in env or ():
+        if entry.name == IMAGE_ENV_NAME:
+            image_url = entry.value
+    return PodRecord(
+        pod.metadata.namespace, pod.metadata.name, pod.metadata.labels, get_pod_host_name(pod),
+        pod.status.phase, get_pod_memory_request(pod), get_pod_cpu_request(pod), image_url,
+        get_pod_start_time(pod), is_pod_unschedulable(pod))
+
+
+def node_record_from_model(node):
+    """Return the NodeRecord of a v1.Node"""
+    images = frozenset(name for image in getattr(node.status, 'images', None) or () for name in image.names or ())
+    creation_time = getattr(node.metadata, 'creation_timestamp', None)
+    return NodeRecord(
+        node.metadata.name, getattr(node.metadata, 'labels', None), bool(node.spec.unschedulable),
+        get_node_memory_capacity(node), get_node_cpu_capacity(node), images,
+        None if creation_time is None else parse_timestamp(creation_time),
+        is_node_ready(getattr(node.status, 'conditions', None)))
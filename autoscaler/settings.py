@@ -17,11 +17,60 @@ class settings:
             os.environ.get("OPTIMAL_UTILIZATION", 0.75))
         self.min_nodes = int(os.environ.get("MIN_NODES", 15))
         self.max_nodes = int(os.environ.get("MAX_NODES", 75))
+        # "utilization" scales on the aggregate memory ratio,
+        # "placement" on a simulation packing pods onto nodes
+        self.goal_policy = os.environ.get("GOAL_POLICY", "utilization")
+        self.placement_strategy = os.environ.get(
+            "PLACEMENT_STRATEGY", "first_fit")
+        # "drain_cost" blocks the nodes expected to empty soonest first,
+        # "pods" the nodes with the fewest pods
+        self.cordon_priority = os.environ.get("CORDON_PRIORITY", "drain_cost")
+        # JupyterHub idle culler timeout and typical session length, seconds
+        self.cull_timeout = int(os.environ.get("CULL_TIMEOUT", 3600))
+        self.expected_session_seconds = int(
+            os.environ.get("EXPECTED_SESSION_SECONDS", 3600))
+        # seeds the order of nodes with equal blocking priority
+        self.tiebreak_seed = int(os.environ.get("TIEBREAK_SEED", 0))
+        # file the cordon flags and goals of recent passes are kept in
+        # across runs (see autoscaler.state); empty to keep them in
+        # memory only
+        self.state_file = os.environ.get("STATE_FILE", "")
+        # seconds a node the autoscaler uncordons stays schedulable, and one
+        # it cordons stays unschedulable unless it is needed
+        self.cordon_dwell = float(os.environ.get("CORDON_DWELL", 1800))
+        # cordoning follows the highest goal of the passes of the last
+        # SCALE_DOWN_WINDOW seconds, so the cluster only shrinks once
+        # the demand has stayed low that long
+        self.scale_down_window = float(
+            os.environ.get("SCALE_DOWN_WINDOW", 900))
+        # managed instance groups scaled together, one
+        # "name,segment,memory,cpu,price,min_nodes,max_nodes[,preemptible]"
+        # entry each (see autoscaler.pools); empty to scale the single
+        # group matching --context-for-cloud within MIN_NODES..MAX_NODES
+        self.node_pools = [pool for pool in os.environ.get(
+            "NODE_POOLS", "").split(self.env_delimiter) if pool]
+        # most of the memory demand preemptible pools may serve
+        self.max_preemptible_share = float(
+            os.environ.get("MAX_PREEMPTIBLE_SHARE", 0.5))
+        # JSON file of the dollars per node-hour of machine types (see
+        # autoscaler.pricing); empty to price NODE_POOLS entries only
+        self.price_table = os.environ.get("PRICE_TABLE", "")
+        # a node is billed for at least BILLING_MINIMUM seconds, then
+        # per started BILLING_INCREMENT seconds; empty nodes are not
+        # shut down within their billing minimum
+        self.billing_minimum = float(os.environ.get("BILLING_MINIMUM", 600))
+        self.billing_increment = float(
+            os.environ.get("BILLING_INCREMENT", 60))
 
         # TODO: Get rid of these default values specific to Data8
         # Google Cloud configs
         self.zone = os.environ.get("ZONE", "us-central1-a")
         self.project = os.environ.get("PROJECT", "92948014362")
+        # seconds a listing of the managed instances is reused for
+        self.instance_index_ttl = float(
+            os.environ.get("INSTANCE_INDEX_TTL", 60))
+        # most instances deleted by a single request
+        self.delete_batch_size = int(os.environ.get("DELETE_BATCH_SIZE", 500))
 
         # Azure configs
         self.location = ""
@@ -47,6 +96,78 @@ class settings:
         self.context_cloud = ""
 
         self.slack_token = os.environ.get("SLACK_TOKEN", "")
+        # seconds of slack messages sent together as one post, and
+        # most messages waiting to be sent
+        self.slack_window = float(os.environ.get("SLACK_WINDOW", 2))
+        self.slack_queue_size = int(os.environ.get("SLACK_QUEUE_SIZE", 100))
+
+        # most pods read from the API server per request
+        self.list_page_size = int(os.environ.get("LIST_PAGE_SIZE", 500))
+
+        # number of node patches sent to the API server concurrently
+        self.patch_workers = int(os.environ.get("PATCH_WORKERS", 10))
+
+        # waiting for new nodes: first and longest delay between
+        # two polls, and when to give up, in seconds
+        self.readiness_initial_delay = float(
+            os.environ.get("READINESS_INITIAL_DELAY", 5))
+        self.readiness_max_delay = float(
+            os.environ.get("READINESS_MAX_DELAY", 60))
+        self.readiness_timeout = float(
+            os.environ.get("READINESS_TIMEOUT", 900))
+        # number of nodes images are pulled onto concurrently
+        self.prepull_workers = int(os.environ.get("PREPULL_WORKERS", 16))
+        # "pods" pulls images with a pod per node and image, "ssh"
+        # with populate.bash over gcloud compute ssh
+        self.prepull_mode = os.environ.get("PREPULL_MODE", "pods")
+        self.prepull_namespace = os.environ.get(
+            "PREPULL_NAMESPACE", "kube-system")
+        self.prepull_timeout = float(os.environ.get("PREPULL_TIMEOUT", 600))
+        self.prepull_poll_interval = float(
+            os.environ.get("PREPULL_POLL_INTERVAL", 5))
+        # most images pulled onto a single node at the same time
+        self.prepull_per_node = int(os.environ.get("PREPULL_PER_NODE", 2))
+
+        # scaling ahead of the demand expected over the next
+        # FORECAST_HORIZON seconds, about the time a new node takes to
+        # boot and pull images, e.g. 600; 0 scales on the current
+        # demand only
+        self.forecast_horizon = float(os.environ.get("FORECAST_HORIZON", 0))
+        # file the demand history is kept in across runs; empty to
+        # keep it in memory only
+        self.forecast_file = os.environ.get("FORECAST_FILE", "")
+        # seconds per recorded peak, weeks of history kept, and
+        # seconds the short-term trend is fitted over
+        self.forecast_interval = float(os.environ.get("FORECAST_INTERVAL", 300))
+        self.forecast_weeks = int(os.environ.get("FORECAST_WEEKS", 4))
+        self.forecast_trend_window = float(
+            os.environ.get("FORECAST_TREND_WINDOW", 1800))
+
+        # gzip-compressed JSON Lines file every scaling pass is
+        # appended to, for autoscaler.trace to replay; empty for none
+        self.trace_file = os.environ.get("TRACE_FILE", "")
+
+        # port serving Prometheus metrics at /metrics, and file they
+        # are written to after every scaling pass, for the node
+        # exporter textfile collector; metrics are off if neither is set
+        self.metrics_port = int(os.environ.get("METRICS_PORT", 0))
+        self.metrics_textfile = os.environ.get("METRICS_TEXTFILE", "")
+
+        # most clusters scaled at the same time when several
+        # --context are given
+        self.cluster_workers = int(os.environ.get("CLUSTER_WORKERS", 4))
+        # seconds before starting again the daemon of a cluster that
+        # failed, when several --context are given
+        self.cluster_retry_interval = float(
+            os.environ.get("CLUSTER_RETRY_INTERVAL", 60))
+
+        # daemon mode
+        self.daemon_debounce = float(os.environ.get("DAEMON_DEBOUNCE", 10))
+        # most seconds a change waits for its scaling pass while
+        # further changes keep arriving within the debounce
+        self.daemon_max_wait = float(os.environ.get("DAEMON_MAX_WAIT", 60))
+        self.daemon_resync_interval = float(
+            os.environ.get("DAEMON_RESYNC_INTERVAL", 300))
 
         # only used for debugging
         self.default_context = os.environ.get("DEFAULT_CONTEXT", "prod")
@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+
+"""Model of notebook demand over a teaching week: arrivals at an
+hourly rate, surges of lab sections starting on the hour, and the
+memory and length of every session"""
+
+import math
+
+HOURS_PER_WEEK = 168
+MONDAY = 0
+FRIDAY = 4
+
+
+def hour_of_week(seconds):
+    """Return the hour of the week, 0 being Monday 0:00 UTC, of a
+    time in seconds since the epoch"""
+    # the epoch fell on a Thursday
+    return int((seconds // 3600 + 3 * 24) % HOURS_PER_WEEK)
+
+
+class demand_profile:
+
+    """Notebook arrivals per hour for every hour of the week, and the
+    hours of the week at which a lab section of lab_size students
+    starts; sessions last lognormally distributed times around
+    mean_session seconds and request one of memory_choices bytes"""
+
+    def __init__(self, hourly_rates, lab_hours=(), lab_size=40, lab_spread=600,
+                 mean_session=2700, session_sigma=0.6, memory_choices=(2 ** 30,)):
+        assert len(hourly_rates) == HOURS_PER_WEEK
+        self.hourly_rates = list(hourly_rates)
+        self.lab_hours = frozenset(lab_hours)
+        self.lab_size = lab_size
+        self.lab_spread = lab_spread
+        self.mean_session = mean_session
+        self.session_sigma = session_sigma
+        self.memory_choices = tuple(memory_choices)
+
+    def get_rate(self, seconds):
+        """Return the arrivals per hour at the given time"""
+        return self.hourly_rates[hour_of_week(seconds)]
+
+    def next_arrival(self, now, rng):
+        """Return the time of the next arrival after now, outside of
+        lab sections, None if none is expected within a week"""
+        for _ in range(HOURS_PER_WEEK + 1):
+            hour_end = (now // 3600 + 1) * 3600
+            rate = self.get_rate(now)
+            if rate > 0:
+                arrival = now + rng.expovariate(rate / 3600)
+                if arrival < hour_end:
+                    return arrival
+            # arrivals are memoryless, start again at the next hour
+            now = hour_end
+        return None
+
+    def lab_arrivals(self, hour_start, rng):
+        """Return the arrival times of a lab section starting at
+        hour_start, or an empty list if none starts then"""
+        if hour_of_week(hour_start) not in self.lab_hours:
+            return []
+        return sorted(hour_start + rng.uniform(0, self.lab_spread) for _ in range(self.lab_size))
+
+    def session(self, rng):
+        """Return the memory request and active length of a session"""
+        mu = math.log(self.mean_session) - self.session_sigma ** 2 / 2
+        return rng.choice(self.memory_choices), rng.lognormvariate(mu, self.session_sigma)
+
+
+def default_profile(peak_rate=120, night_rate=4, lab_size=40, deadline_rate=200):
+    """Return the demand of a large course: quiet nights, busy
+    weekday afternoons, lab sections on the hour from 9:00 to 17:00
+    on weekdays and a Friday night deadline"""
+    rates = []
+    for hour in range(HOURS_PER_WEEK):
+        day, hour_of_day = divmod(hour, 24)
+        if hour_of_day < 8:
+            rate = night_rate
+        elif hour_of_day < 18:
+            rate = peak_rate if day < 5 else peak_rate / 3
+        else:
+            rate = peak_rate / 2 if day < 5 else peak_rate / 4
+        if day == FRIDAY and hour_of_day >= 20:
+            rate = deadline_rate
+        rates.append(rate)
+    lab_hours = [day * 24 + hour_of_day for day in range(MONDAY, FRIDAY + 1) for hour_of_day in range(9, 17)]
+    return demand_profile(
+        rates, lab_hours, lab_size,
+        memory_choices=(512 * 2 ** 20, 2 ** 30, 2 ** 30, 2 * 2 ** 30))
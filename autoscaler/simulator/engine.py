@@ -0,0 +1,235 @@
+#!/usr/bin/python3
+
+"""Discrete-event simulation of a teaching term: notebooks arrive
+and leave following a demand_profile, nodes take time to boot and to
+pull the notebook image, and the real Autoscaler scales the simulated
+cluster every scale_interval seconds of virtual time.
+
+Run a term from the command line with autoscaler-simulate; settings
+are read from the environment as for the autoscaler itself."""
+
+import argparse
+import copy
+import csv
+import heapq
+import itertools
+import logging
+import random
+from array import array
+
+from ..settings import settings
+from .demand import default_profile
+from .fakes import sim_autoscaler, sim_cloud, sim_cluster, sim_k8s, sim_pod
+
+scale_logger = logging.getLogger("scale")
+
+WEEK = 7 * 24 * 3600
+
+# label of the simulated notebook pods, made preemptible
+NOTEBOOK_LABEL = "student"
+
+TIME_SERIES_COLUMNS = ("time", "nodes", "booting", "cordoned", "running",
+                       "pending", "requested_memory", "utilization", "goal")
+
+
+class simulation_config:
+
+    """Parameters of a simulated term; start defaults to a Monday,
+    0:00 UTC, and the nodes to the n1-highmem-2 nodes of the
+    test cluster"""
+
+    def __init__(self, weeks=16, start=1503273600, scale_interval=300, sample_interval=900,
+                 node_memory=13317664 * 1024, node_cpu=2000, initial_nodes=None,
+                 boot_latency=120, pull_time=150, seed=0):
+        self.weeks = weeks
+        self.start = start
+        self.scale_interval = scale_interval
+        self.sample_interval = sample_interval
+        self.node_memory = node_memory
+        self.node_cpu = node_cpu
+        self.initial_nodes = initial_nodes
+        self.boot_latency = boot_latency
+        self.pull_time = pull_time
+        self.seed = seed
+
+
+class simulation_result:
+
+    """Time series sampled every sample_interval seconds, with
+    totals over the whole term"""
+
+    def __init__(self):
+        self.columns = {name: array('d') for name in TIME_SERIES_COLUMNS}
+        self.waits = array('d')
+        # nodes paid for, booting ones included
+        self.node_hours = 0.0
+        self.pending_pod_minutes = 0.0
+        self.scale_passes = 0
+
+    def add_sample(self, **values):
+        for name in TIME_SERIES_COLUMNS:
+            self.columns[name].append(values[name])
+
+    def get_wait_percentile(self, percentile):
+        """Return the given percentile of the seconds notebooks
+        waited for, from arrival until their node held the image"""
+        if not self.waits:
+            return 0.0
+        waits = sorted(self.waits)
+        return waits[min(int(len(waits) * percentile / 100), len(waits) - 1)]
+
+    def write_csv(self, path):
+        """Write the time series to a CSV file, one row per sample"""
+        with open(path, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(TIME_SERIES_COLUMNS)
+            writer.writerows(zip(*(self.columns[name] for name in TIME_SERIES_COLUMNS)))
+
+    def __repr__(self):
+        return ("simulation_result(scale_passes=%r, notebooks=%r, node_hours=%.1f, pending_pod_minutes=%.1f, "
+                "median_wait=%.0f, p95_wait=%.0f, max_wait=%.0f)") % (
+            self.scale_passes, len(self.waits), self.node_hours, self.pending_pod_minutes,
+            self.get_wait_percentile(50), self.get_wait_percentile(95), self.get_wait_percentile(100))
+
+
+class simulation:
+
+    """Drives a sim_autoscaler over a sim_cluster through a term of
+    virtual time; options are copied, with confirmations, the cloud
+    and Kubernetes actions and Slack adapted to the simulation"""
+
+    def __init__(self, options, config=None, profile=None):
+        self.config = config if config is not None else simulation_config()
+        self.profile = profile if profile is not None else default_profile()
+        self.options = copy.copy(options)
+        self.options.yes = True
+        self.options.test_cloud = False
+        self.options.test_k8s = False
+        self.options.slack_token = ""
+        self.options.forecast_file = ""
+        self.options.metrics_textfile = ""
+        self.options.preemptible_labels = [NOTEBOOK_LABEL]
+        # the simulated cluster is a single group of identical nodes
+        self.options.node_pools = []
+
+        self._events = []
+        self._sequence = itertools.count()
+        self._rng = random.Random(self.config.seed)
+        self._pod_number = 0
+        self._last_time = self.config.start
+
+        self.cluster = sim_cluster(self.config.node_memory, self.config.node_cpu,
+                                   self.config.boot_latency, self.config.pull_time, self._schedule)
+        self.cluster.now = self.config.start
+        initial_nodes = self.config.initial_nodes
+        if initial_nodes is None:
+            initial_nodes = self.options.min_nodes
+        self.cluster.add_nodes(initial_nodes, ready=True)
+        self.k8s = sim_k8s(self.options, self.cluster)
+        self.autoscaler = sim_autoscaler(
+            self.options, cluster=sim_cloud(self.cluster), k8s=self.k8s, clock=lambda: self.cluster.now)
+        self.autoscaler._goal = initial_nodes
+        self.result = simulation_result()
+
+    def _schedule(self, time, kind, payload=None):
+        heapq.heappush(self._events, (time, next(self._sequence), kind, payload))
+
+    def _new_pod(self):
+        self._pod_number += 1
+        memory, active = self.profile.session(self._rng)
+        # idle notebooks stay until the culler removes them
+        return sim_pod("notebook-%i" % self._pod_number, memory, self.cluster.now,
+                       active + self.options.cull_timeout, {NOTEBOOK_LABEL: ""})
+
+    def _place(self):
+        for pod in self.cluster.place_pending():
+            self.result.waits.append(pod.start - pod.arrival)
+
+    def _sample(self):
+        nodes = self.cluster.get_ready_nodes()
+        schedulable = [node for node in nodes if node.is_schedulable()]
+        requested = sum(node.memory_used for node in nodes) + sum(pod.memory for pod in self.cluster.pending)
+        capacity = sum(node.memory for node in schedulable)
+        self.result.add_sample(
+            time=self.cluster.now,
+            nodes=len(nodes),
+            booting=self.cluster.get_booting_count(),
+            cordoned=len(nodes) - len(schedulable),
+            running=len(self.cluster.running),
+            pending=len(self.cluster.pending),
+            requested_memory=requested,
+            utilization=requested / capacity if capacity else 0.0,
+            goal=self.autoscaler._goal)
+
+    def _advance(self, time):
+        elapsed = time - self._last_time
+        self.result.node_hours += len(self.cluster.nodes) * elapsed / 3600
+        self.result.pending_pod_minutes += len(self.cluster.pending) * elapsed / 60
+        self._last_time = time
+        self.cluster.now = time
+
+    def run(self):
+        """Simulate the whole term and return the simulation_result"""
+        start = self.config.start
+        end = start + self.config.weeks * WEEK
+        first_arrival = self.profile.next_arrival(start, self._rng)
+        if first_arrival is not None:
+            self._schedule(first_arrival, "arrival")
+        self._schedule(start, "hour")
+        self._schedule(start, "scale")
+        self._schedule(start, "sample")
+
+        while self._events and self._events[0][0] <= end:
+            time, _, kind, payload = heapq.heappop(self._events)
+            self._advance(time)
+            if kind == "arrival" or kind == "lab_arrival":
+                self.cluster.arrive(self._new_pod())
+                self._place()
+                if kind == "arrival":
+                    next_arrival = self.profile.next_arrival(time, self._rng)
+                    if next_arrival is not None:
+                        self._schedule(next_arrival, "arrival")
+            elif kind == "departure":
+                self.cluster.depart(payload)
+                self._place()
+            elif kind == "node_ready":
+                payload.object.ready = True
+                self._place()
+            elif kind == "hour":
+                for arrival in self.profile.lab_arrivals(time, self._rng):
+                    self._schedule(arrival, "lab_arrival")
+                self._schedule(time + 3600, "hour")
+            elif kind == "scale":
+                self.k8s.refresh()
+                self.autoscaler.scale()
+                self.result.scale_passes += 1
+                self._place()
+                self._schedule(time + self.config.scale_interval, "scale")
+            elif kind == "sample":
+                self._sample()
+                self._schedule(time + self.config.sample_interval, "sample")
+        self._advance(end)
+        return self.result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulate a teaching term scaled by the autoscaler with the settings of the environment")
+    parser.add_argument("--weeks", type=float, default=16, help="Length of the term")
+    parser.add_argument("--scale-interval", type=float, default=300,
+                        help="Seconds between two scaling passes")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the demand")
+    parser.add_argument("--csv", help="Write the time series to this CSV file")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s')
+    scale_logger.setLevel(logging.WARNING)
+    config = simulation_config(weeks=args.weeks, scale_interval=args.scale_interval, seed=args.seed)
+    result = simulation(settings(), config).run()
+    print(result)
+    if args.csv:
+        result.write_csv(args.csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/python3
+
+"""In-memory stand-ins for the cluster the Autoscaler controls: the
+nodes and pods, a kube-scheduler placing pending pods, and the
+Kubernetes and cloud controls the Autoscaler talks to. Time only moves
+when the simulation engine advances it."""
+
+from ..autoscaler import Autoscaler
+from ..cluster_update import abstract_cluster_control, OPERATION_DONE
+from ..kubernetes_control import k8s_control, bulk_patch_result
+from ..records import NodeRecord, PodRecord
+
+SIMULATION_NAMESPACE = "simulation"
+
+
+class sim_node:
+
+    """A node created at created_at, booting until ready_at and
+    holding the notebook image from images_at on"""
+
+    __slots__ = ('name', 'memory', 'ready_at', 'images_at', 'memory_used', 'pod_count', 'object')
+
+    def __init__(self, name, memory, cpu, ready_at, images_at, created_at):
+        self.name = name
+        self.memory = memory
+        self.ready_at = ready_at
+        self.images_at = images_at
+        self.memory_used = 0
+        self.pod_count = 0
+        self.object = NodeRecord(name, memory_capacity=memory, cpu_capacity=cpu, creation_time=created_at,
+                                 ready=ready_at <= created_at)
+
+    def is_schedulable(self):
+        return not self.object.unschedulable
+
+
+class sim_pod:
+
+    """A notebook pod, arriving at `arrival` and running for
+    `duration` seconds once its node holds the image"""
+
+    __slots__ = ('name', 'memory', 'arrival', 'duration', 'node', 'start', 'object')
+
+    def __init__(self, name, memory, arrival, duration, labels):
+        self.name = name
+        self.memory = memory
+        self.arrival = arrival
+        self.duration = duration
+        self.node = None
+        self.start = None
+        self.object = PodRecord(SIMULATION_NAMESPACE, name, labels, phase="Pending", memory_request=memory)
+
+
+class sim_cluster:
+
+    """Nodes and pods of the simulated cluster; placing a pod or
+    booting a node asks the engine, through `schedule`, for the
+    event ending it"""
+
+    def __init__(self, node_memory, node_cpu, boot_latency, pull_time, schedule):
+        self.node_memory = node_memory
+        self.node_cpu = node_cpu
+        self.boot_latency = boot_latency
+        self.pull_time = pull_time
+        self._schedule = schedule
+        self.now = 0
+        self.nodes = {}
+        self.pending = []
+        self.running = {}
+        self._node_number = 0
+
+    def add_nodes(self, count, ready=False):
+        """Start booting count nodes, or add them ready with the
+        image already pulled"""
+        for _ in range(count):
+            self._node_number += 1
+            ready_at = self.now if ready else self.now + self.boot_latency
+            images_at = self.now if ready else ready_at + self.pull_time
+            node = sim_node("sim-node-%i" % self._node_number, self.node_memory, self.node_cpu, ready_at, images_at,
+                            self.now)
+            self.nodes[node.name] = node
+            if not ready:
+                self._schedule(ready_at, "node_ready", node)
+
+    def remove_node(self, name):
+        node = self.nodes.pop(name, None)
+        if node is not None and node.pod_count:
+            raise AssertionError("Node %s shut down with %i pods" % (name, node.pod_count))
+
+    def set_unschedulable(self, name, value):
+        self.nodes[name].object.unschedulable = value
+
+    def get_ready_nodes(self):
+        return [node for node in self.nodes.values() if node.ready_at <= self.now]
+
+    def get_booting_count(self):
+        return sum(1 for node in self.nodes.values() if node.ready_at > self.now)
+
+    def arrive(self, pod):
+        self.pending.append(pod)
+
+    def depart(self, pod):
+        node = self.nodes[pod.node]
+        node.memory_used -= pod.memory
+        node.pod_count -= 1
+        del self.running[pod.name]
+
+    def place_pending(self):
+        """Bind pending pods in arrival order to the ready, schedulable
+        node with the least memory requested that fits them, as the
+        default kube-scheduler spreads pods; return the pods placed"""
+        if not self.pending:
+            return []
+        candidates = [node for node in self.get_ready_nodes() if node.is_schedulable()]
+        placed = []
+        still_pending = []
+        for pod in self.pending:
+            best = None
+            for node in candidates:
+                if node.memory - node.memory_used >= pod.memory and (
+                        best is None or node.memory_used < best.memory_used):
+                    best = node
+            if best is None:
+                still_pending.append(pod)
+                continue
+            best.memory_used += pod.memory
+            best.pod_count += 1
+            pod.node = best.name
+            pod.start = max(self.now, best.images_at)
+            pod.object.node_name = best.name
+            pod.object.phase = "Running"
+            pod.object.start_time = pod.start
+            self.running[pod.name] = pod
+            self._schedule(pod.start + pod.duration, "departure", pod)
+            placed.append(pod)
+        self.pending = still_pending
+        return placed
+
+    def get_pod_objects(self):
+        return [pod.object for pod in self.running.values()] + [pod.object for pod in self.pending]
+
+    def get_node_objects(self):
+        return [node.object for node in self.get_ready_nodes()]
+
+
+class sim_k8s(k8s_control):
+
+    """k8s_control reading the simulated cluster instead of the
+    Kubernetes API"""
+
+    def __init__(self, options, cluster):
+        self._context = "simulation"
+        self._options = options
+        self._v1 = None
+        self._cluster = cluster
+        self.refresh()
+
+    def refresh(self):
+        """Load the current state of the simulated cluster"""
+        self._load(self._cluster.get_pod_objects(), self._cluster.get_node_objects())
+
+    def set_unschedulable(self, node_name, value=True):
+        assert not self._snapshot.is_critical(node_name)
+        self._cluster.set_unschedulable(node_name, value)
+
+    def set_unschedulable_bulk(self, node_names, value=True):
+        for node_name in node_names:
+            self.set_unschedulable(node_name, value)
+        return bulk_patch_result(list(node_names), {})
+
+
+class sim_cloud(abstract_cluster_control):
+
+    """Cloud control of the simulated cluster; a resize boots the
+    missing nodes, counting nodes still booting like a managed
+    instance group does"""
+
+    def __init__(self, cluster):
+        self._cluster = cluster
+
+    def add_new_node(self, cluster_size, pool=None):
+        self._cluster.add_nodes(max(cluster_size - len(self._cluster.nodes), 0))
+        return None
+
+    def shutdown_specified_node(self, name):
+        self._cluster.remove_node(name)
+
+    def get_operation_status(self, operation):
+        return OPERATION_DONE
+
+    def get_target_size(self, pool=None):
+        return len(self._cluster.nodes)
+
+
+class sim_autoscaler(Autoscaler):
+
+    """The Autoscaler over the simulated cluster; the engine models
+    node boot and image pulls itself, so resizes are not tracked"""
+
+    def _track_new_nodes(self, operation):
+        pass
@@ -4,25 +4,135 @@
 
 import requests
 import logging
+import threading
+import time
+from collections import deque
+
+scale_logger = logging.getLogger("scale")
+
+SLACK_POST_URL = "https://slack.com/api/chat.postMessage"
 
 
 class slack_handler(logging.Handler):
 
-    def __init__(self, token, channel="C510S0Z2L", username="blueprint-cluster"):
+    """Posts log records to a Slack channel from a background
+    thread over a single pooled session, so that logging never waits
+    on Slack. Records arriving within `window` seconds of the first
+    one waiting are sent as one message; at most `capacity` records
+    wait in the queue, the oldest dropped first"""
+
+    def __init__(self, token, channel="C510S0Z2L", username="blueprint-cluster",
+                 window=2, capacity=100, timeout=10, url=SLACK_POST_URL, session=None):
         logging.Handler.__init__(self, level=logging.INFO)
         self.token = token
         self.channel = channel
         self.username = username
+        self.window = window
+        self.timeout = timeout
+        self.url = url
+        self._session = session or requests.Session()
+        self._queue = deque(maxlen=capacity)
+        self._dropped = 0
+        self._sending = False
+        self._flushing = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = None
 
     def message(self, text):
+        """Post a single message right away"""
         if self.token:
-            return requests.get(
-                "https://slack.com/api/chat.postMessage?token=%s&channel=%s&text=%s&username=%s&as_user=true" % (
-                    self.token,
-                    self.channel,
-                    "Cluster autoscaler: " + text,
-                    self.username
-                ))
+            response = self._session.post(
+                self.url,
+                data={
+                    "channel": self.channel,
+                    "text": "Cluster autoscaler: " + text,
+                    "username": self.username,
+                    "as_user": "true"
+                },
+                headers={"Authorization": "Bearer %s" % self.token},
+                timeout=self.timeout)
+            if response.status_code != 200 or not response.json().get("ok", False):
+                scale_logger.warning("Slack refused a message: %s", response.text)
+            return response
 
     def emit(self, record):
-        self.message(record.getMessage())
+        if not self.token:
+            return
+        try:
+            text = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._condition:
+            if self._closed:
+                return
+            if len(self._queue) == self._queue.maxlen:
+                self._dropped += 1
+            self._queue.append((time.monotonic(), text))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._send_forever, name="slack", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _next_batch(self):
+        """Wait for the coalescing window of the oldest queued record
+        to pass; return its text and the texts queued meanwhile, None
+        once closed with nothing left to send"""
+        with self._condition:
+            while not self._queue and not self._closed:
+                self._condition.wait()
+            if not self._queue:
+                return None
+            deadline = self._queue[0][0] + self.window
+            while not (self._closed or self._flushing) and time.monotonic() < deadline:
+                self._condition.wait(deadline - time.monotonic())
+            texts = [text for _, text in self._queue]
+            self._queue.clear()
+            if self._dropped:
+                texts.insert(0, "(%i earlier messages dropped)" % self._dropped)
+                self._dropped = 0
+            self._sending = True
+            return texts
+
+    def _send_forever(self):
+        while True:
+            texts = self._next_batch()
+            if texts is None:
+                return
+            try:
+                self.message("\n".join(texts))
+            except (requests.RequestException, ValueError):
+                scale_logger.warning("Could not send %i messages to slack", len(texts), exc_info=True)
+            finally:
+                with self._condition:
+                    self._sending = False
+                    self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Send whatever is queued without waiting for the coalescing
+        window, and wait until it is sent"""
+        with self._condition:
+            if self._thread is None:
+                return
+            deadline = None if timeout is None else time.monotonic() + timeout
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                while self._queue or self._sending:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            finally:
+                self._flushing -= 1
+
+    def close(self):
+        """Flush and stop the sender thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(self.timeout + self.window)
+        self._session.close()
+        logging.Handler.close(self)
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+
+"""State kept across scaling passes, and across runs when STATE_FILE
+is set: when the autoscaler last cordoned or uncordoned each node,
+and the goals of recent passes.
+
+The state is a small JSON file, replaced atomically after every pass,
+such as
+
+    {"nodes": {"gke-prod-highmem-pool-0df1a536-17c7": {"unschedulable": true, "time": 1498161596}},
+     "goals": [{"time": 1498161596, "goal": 20, "pool_goals": {}}]}"""
+
+import json
+import logging
+import os
+import tempfile
+
+scale_logger = logging.getLogger("scale")
+
+
+class scaling_state:
+
+    """When the autoscaler last set the unschedulable flag of each
+    node, and the goal, and goals of the pools, of recent passes"""
+
+    def __init__(self, nodes=None, goals=None):
+        # node name -> {"unschedulable": flag set, "time": when}
+        self.nodes = nodes or {}
+        # {"time", "goal", "pool_goals"} of every recent pass, oldest first
+        self.goals = goals or []
+
+    def record_flags(self, node_names, unschedulable, now):
+        """Record that the named nodes were given the unschedulable flag now"""
+        for name in node_names:
+            self.nodes[name] = {"unschedulable": unschedulable, "time": now}
+
+    def get_flag_age(self, node_name, unschedulable, now):
+        """Return the seconds since the autoscaler gave the node the
+        unschedulable flag, None if the last flag it set differs or
+        it set none"""
+        entry = self.nodes.get(node_name)
+        if entry is None or entry["unschedulable"] != unschedulable:
+            return None
+        return now - entry["time"]
+
+    def forget_nodes(self, node_names):
+        """Drop the flags of the nodes not in node_names, gone from
+        the cluster"""
+        kept = set(node_names)
+        self.nodes = {name: entry for name, entry in self.nodes.items() if name in kept}
+
+    def record_goal(self, now, goal, pool_goals, window):
+        """Record the goal of the pass at now, forgetting goals older
+        than window seconds"""
+        self.goals = [entry for entry in self.goals if now - entry["time"] < window]
+        self.goals.append({"time": now, "goal": goal, "pool_goals": dict(pool_goals)})
+
+    def get_stable_goal(self, now, window):
+        """Return the highest goal of the passes of the last window
+        seconds, and the highest goal of every pool, None if no goal
+        was recorded then"""
+        recent = [entry for entry in self.goals if now - entry["time"] < window]
+        if not recent:
+            return None, {}
+        pool_goals = {}
+        for entry in recent:
+            for name, goal in entry["pool_goals"].items():
+                pool_goals[name] = max(pool_goals.get(name, goal), goal)
+        return max(entry["goal"] for entry in recent), pool_goals
+
+    def save(self, path):
+        """Write the state to path, replacing it atomically"""
+        directory = os.path.dirname(os.path.abspath(path))
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix=".state-")
+        try:
+            with os.fdopen(descriptor, "w") as state_file:
+                json.dump({"nodes": self.nodes, "goals": self.goals}, state_file, separators=(",", ":"))
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+
+def load_state(path):
+    """Return the state saved at path, or an empty one if there is
+    none or it cannot be read"""
+    try:
+        with open(path) as state_file:
+            saved = json.load(state_file)
+        return scaling_state(dict(saved["nodes"]), list(saved["goals"]))
+    except FileNotFoundError:
+        return scaling_state()
+    except (OSError, ValueError, KeyError, TypeError):
+        scale_logger.warning("Could not read the scaling state in %s", path, exc_info=True)
+        return scaling_state()
@@ -0,0 +1,231 @@
+#!/usr/bin/python3
+
+"""Record the state and decision of every scaling pass to a trace
+file, and replay traces through a scaling policy offline.
+
+A trace is a gzip-compressed JSON Lines file, one line per pass. Each
+line holds the time, the settings, compact records of the nodes and
+the pods that were not omitted, and the decision taken. Replay reads
+one line at a time, so traces of any length fit in memory."""
+
+import argparse
+import gzip
+import json
+import logging
+import time
+
+from .cluster_snapshot import ClusterSnapshot
+from .kubernetes_control import k8s_control
+from .placement import simulate_placement
+from .records import NodeRecord, PodRecord
+from .settings import settings
+from .workload import schedule_goal
+
+scale_logger = logging.getLogger("scale")
+
+# settings written to every trace line
+TRACED_SETTINGS = (
+    "max_utilization", "min_utilization", "optimal_utilization", "min_nodes",
+    "max_nodes", "goal_policy", "placement_strategy", "cordon_priority",
+    "preemptible_labels", "omit_labels", "omit_namespaces")
+
+# first bytes of every gzip member
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _labels_to_dict(labels):
+    if labels is None:
+        return None
+    if hasattr(labels, "_asdict"):
+        return dict(labels._asdict())
+    return dict(labels)
+
+
+def node_record(node):
+    """Return the compact, JSON serializable record of a NodeRecord"""
+    return {
+        "name": node.name,
+        "unschedulable": bool(node.unschedulable),
+        "memory": node.memory_capacity,
+        "cpu": node.cpu_capacity,
+        "creation_time": node.creation_time,
+        "ready": node.ready
+    }
+
+
+def pod_record(pod):
+    """Return the compact, JSON serializable record of a PodRecord"""
+    return {
+        "namespace": pod.namespace,
+        "name": pod.name,
+        "labels": _labels_to_dict(pod.labels),
+        "node": pod.node_name,
+        "phase": pod.phase,
+        "memory": pod.memory_request,
+        "cpu": pod.cpu_request,
+        "start_time": pod.start_time,
+        "unschedulable": pod.unschedulable
+    }
+
+
+def node_from_record(record):
+    """Return the NodeRecord of a trace record"""
+    return NodeRecord(record["name"], unschedulable=record["unschedulable"],
+                      memory_capacity=record["memory"], cpu_capacity=record["cpu"],
+                      creation_time=record.get("creation_time"), ready=record.get("ready", True))
+
+
+def pod_from_record(record):
+    """Return the PodRecord of a trace record"""
+    return PodRecord(record["namespace"], record["name"], record["labels"], record["node"], record["phase"],
+                     record["memory"], record["cpu"], start_time=record["start_time"],
+                     unschedulable=record.get("unschedulable", False))
+
+
+class trace_recorder:
+
+    """Appends one line per scaling pass to a gzip-compressed
+    JSON Lines trace file"""
+
+    def __init__(self, path, clock=time.time):
+        self._path = path
+        self._clock = clock
+
+    def record(self, k8s, options, decision):
+        """Append the cluster state seen by k8s, the traced settings and
+        the decision, a dict such as {"goal": 20, "blocked": [...]}"""
+        line = {
+            "time": self._clock(),
+            "cluster": k8s.get_cluster_name(),
+            "settings": {name: getattr(options, name) for name in TRACED_SETTINGS},
+            "nodes": [node_record(node) for node in k8s.get_nodes()],
+            "pods": [pod_record(pod) for pod in k8s.get_pods()],
+            "decision": decision
+        }
+        # one gzip member per line, so an interrupted write
+        # loses at most that line
+        with gzip.open(self._path, "at") as trace_file:
+            trace_file.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+
+def is_gzip_file(path):
+    """Return True if the file at path starts like gzip data,
+    whatever its name"""
+    with open(path, "rb") as data_file:
+        return data_file.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+
+
+def read_trace(path):
+    """Yield the lines of a trace file one by one, as dicts; files
+    that are not gzip-compressed are read as plain JSON Lines"""
+    opener = gzip.open if is_gzip_file(path) else open
+    with opener(path, "rt") as trace_file:
+        for line in trace_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+class trace_k8s(k8s_control):
+
+    """k8s_control over the state of a single trace line, with
+    no API access"""
+
+    _test = True
+
+    def __init__(self, options, line):
+        self._context = line.get("cluster", "")
+        self._options = options
+        self._v1 = None
+        self._load([pod_from_record(record) for record in line["pods"]],
+                   [node_from_record(record) for record in line["nodes"]])
+
+    def set_unschedulable(self, node_name, value=True):
+        pass
+
+
+class replay_report:
+
+    """Totals of a policy replayed over traces"""
+
+    def __init__(self):
+        self.passes = 0
+        # node count of the policy times the time until the next pass
+        self.node_hours = 0.0
+        # pods fitting on none of the nodes of the policy, times the
+        # time until the next pass
+        self.pending_pod_minutes = 0.0
+        # nodes added plus nodes removed between passes
+        self.churn = 0
+
+    def __repr__(self):
+        return "replay_report(passes=%r, node_hours=%.1f, pending_pod_minutes=%.1f, churn=%r)" % (
+            self.passes, self.node_hours, self.pending_pod_minutes, self.churn)
+
+
+def count_unplaced_pods(k8s, options, node_count):
+    """Return how many pods of the cluster fit on none of node_count
+    schedulable nodes: the critical nodes and the fullest other nodes,
+    then new nodes like the first one"""
+    snapshot = k8s.get_snapshot()
+    all_nodes = k8s.get_nodes()
+    kept = sorted(all_nodes, key=lambda node: (
+        not snapshot.is_critical(node.name),
+        -snapshot.get_memory_request_on_node(node.name)))[:node_count]
+    nodes = [NodeRecord(node.name, node.labels, False, node.memory_capacity, node.cpu_capacity, node.images,
+                        node.creation_time)
+             for node in kept]
+    new_node_shape = None
+    if all_nodes:
+        new_node_shape = (all_nodes[0].memory_capacity, all_nodes[0].cpu_capacity)
+    result = simulate_placement(
+        ClusterSnapshot(k8s.get_pods(), nodes, options.preemptible_labels),
+        max_new_nodes=max(node_count - len(nodes), 0), new_node_shape=new_node_shape)
+    return result.unplaced_count
+
+
+def replay(lines, policy=schedule_goal, options=None):
+    """Run the policy, a function like schedule_goal taking a
+    k8s_control and settings and returning a node count, over the
+    trace lines in time order; return a replay_report"""
+    if options is None:
+        options = settings()
+    report = replay_report()
+    previous = None
+    for line in lines:
+        k8s = trace_k8s(options, line)
+        goal = int(policy(k8s, options))
+        pending = count_unplaced_pods(k8s, options, goal)
+        if previous is not None:
+            previous_time, previous_goal, previous_pending = previous
+            elapsed = line["time"] - previous_time
+            report.node_hours += previous_goal * elapsed / 3600
+            report.pending_pod_minutes += previous_pending * elapsed / 60
+            report.churn += abs(goal - previous_goal)
+        report.passes += 1
+        previous = (line["time"], goal, pending)
+    return report
+
+
+def _read_traces(paths):
+    for path in paths:
+        for line in read_trace(path):
+            yield line
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay scaling traces through the policy configured in the environment")
+    parser.add_argument("traces", nargs="+", help="Trace files, in time order")
+    parser.add_argument(
+        "--goal-policy", help="Override GOAL_POLICY, utilization or placement")
+    args = parser.parse_args()
+
+    options = settings()
+    if args.goal_policy:
+        options.goal_policy = args.goal_policy
+    logging.getLogger("scale").setLevel(logging.WARNING)
+    print(replay(_read_traces(args.traces), schedule_goal, options))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,21 +3,32 @@
 """Kubernetes API access functions"""
 
 import logging
+import math
+import re
 import subprocess
 import os
+from datetime import datetime, timezone
+from decimal import Decimal
+from functools import lru_cache
 
 scale_logger = logging.getLogger("scale")
 logging.getLogger("kubernetes").setLevel(logging.WARNING)
 
-SYMBOLS = {
-    'customary': ('B', 'K', 'M', 'G', 'T', 'P', 'E', 'Z', 'Y'),
-    'customary_ext': ('byte', 'kilo', 'mega', 'giga', 'tera', 'peta', 'exa',
-                      'zetta', 'iotta'),
-    'iec': ('Bi', 'Ki', 'Mi', 'Gi', 'Ti', 'Pi', 'Ei', 'Zi', 'Yi'),
-    'iec_ext': ('byte', 'kibi', 'mebi', 'gibi', 'tebi', 'pebi', 'exbi',
-                'zebi', 'yobi'),
+# Kubernetes resource quantity suffixes, see
+# https://github.com/kubernetes/apimachinery/blob/master/pkg/api/resource/quantity.go
+QUANTITY_MULTIPLIERS = {
+    '': Decimal(1),
+    'n': Decimal('1e-9'), 'u': Decimal('1e-6'), 'm': Decimal('1e-3'),
+    'k': Decimal(10) ** 3, 'M': Decimal(10) ** 6, 'G': Decimal(10) ** 9,
+    'T': Decimal(10) ** 12, 'P': Decimal(10) ** 15, 'E': Decimal(10) ** 18,
+    'Ki': Decimal(2) ** 10, 'Mi': Decimal(2) ** 20, 'Gi': Decimal(2) ** 30,
+    'Ti': Decimal(2) ** 40, 'Pi': Decimal(2) ** 50, 'Ei': Decimal(2) ** 60,
 }
 
+_QUANTITY_PATTERN = re.compile(
+    r'([+-]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+))'
+    r'(?:[eE]([+-]?[0-9]+)|(Ki|Mi|Gi|Ti|Pi|Ei|[numkMGTPE])?)')
+
 
 def get_pod_host_name(pod):
     """Return the host node name of the pod"""
@@ -39,70 +50,105 @@ def get_pod_memory_request(pod):
     return node_memory_request
 
 
+def get_pod_cpu_request(pod):
+    """Returns the CPU requested by the pod,
+    in millicores"""
+    cpu_request = 0
+    try:
+        cpu_request = parse_cpu(pod.spec.containers[0].resources.requests['cpu'])
+    except (KeyError, TypeError):
+        pass
+    return cpu_request
+
+
+def get_pod_start_time(pod):
+    """Return when the pod started as seconds since the epoch,
+    None if it has not started"""
+    start_time = getattr(getattr(pod, 'status', None), 'start_time', None)
+    if start_time is None:
+        return None
+    return parse_timestamp(start_time)
+
+
+def is_pod_unschedulable(pod):
+    """Return True if the scheduler found no node for the pod, as
+    the PodScheduled condition it sets with a FailedScheduling
+    event says"""
+    for condition in getattr(getattr(pod, 'status', None), 'conditions', None) or ():
+        if condition.type == 'PodScheduled':
+            return condition.status == 'False' and condition.reason == 'Unschedulable'
+    return False
+
+
+def is_node_ready(conditions):
+    """Return True if the Ready condition among the conditions of a
+    node, API models or raw JSON dicts, is True; False while the node
+    boots, and without a Ready condition, which a node has none of
+    until its kubelet first reports"""
+    for condition in conditions or ():
+        if isinstance(condition, dict):
+            condition_type, status = condition.get('type'), condition.get('status')
+        else:
+            condition_type, status = condition.type, condition.status
+        if condition_type == 'Ready':
+            return status == 'True'
+    return False
+
+
+def parse_timestamp(value):
+    """Return a Kubernetes timestamp, a datetime or a string such as
+    '2017-06-22T19:58:03Z', as seconds since the epoch"""
+    if isinstance(value, str):
+        value = datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ')
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
 def get_node_memory_capacity(node):
     """Converts the specific memory entry
     of the kubernetes API into the byte capacity"""
     return convert_size(node.status.capacity['memory'])
 
 
+def get_node_cpu_capacity(node):
+    """Returns the CPU capacity of the node,
+    in millicores"""
+    return parse_cpu(node.status.capacity['cpu'])
+
+
 def convert_size(s):
-    if s.isdigit():
-        return int(s)
-    else:
-        return human2bytes(s)
+    """Return the number of bytes of a Kubernetes memory quantity"""
+    return parse_memory(s)
 
 
-def human2bytes(s):
-    """
-    Copied from https://code.activestate.com/recipes/578019-bytes-to-human-human-to-bytes-converter/
-
-    Attempts to guess the string format based on default symbols
-    set and return the corresponding bytes as an integer.
-    When unable to recognize the format ValueError is raised.
-
-      >>> human2bytes('0 B')
-      0
-      >>> human2bytes('1 K')
-      1024
-      >>> human2bytes('1 M')
-      1048576
-      >>> human2bytes('1 Gi')
-      1073741824
-      >>> human2bytes('1 tera')
-      1099511627776
-
-      >>> human2bytes('0.5kilo')
-      512
-      >>> human2bytes('0.1  byte')
-      0
-      >>> human2bytes('1 k')  # k is an alias for K
-      1024
-      >>> human2bytes('12 foo')
-      Traceback (most recent call last):
-          ...
-      ValueError: can't interpret '12 foo'
-    """
-    init = s
-    num = ""
-    while s and s[0:1].isdigit() or s[0:1] == '.':
-        num += s[0]
-        s = s[1:]
-    num = float(num)
-    letter = s.strip()
-    for _, sset in SYMBOLS.items():
-        if letter in sset:
-            break
-    else:
-        if letter == 'k':
-            # treat 'k' as an alias for 'K' as per: http://goo.gl/kTQMs
-            sset = SYMBOLS['customary']
-            letter = letter.upper()
-        else:
-            raise ValueError("can't interpret %r" % init)
-    prefix = {sset[0]: 1}
-    for i, s in enumerate(sset[1:]):
-        prefix[s] = 1 << (i + 1) * 10
-    return int(num * prefix[letter])
+@lru_cache(maxsize=1024)
+def parse_quantity(s):
+    """Return the exact value of a Kubernetes resource quantity
+    such as '512Mi', '1G', '100m' or '1e3' as a Decimal
+
+    Binary suffixes (Ki, Mi, ...) are powers of 1024, decimal
+    suffixes (k, M, ...) powers of 1000, and 'm' is a thousandth.
+    Raises ValueError for anything else."""
+    match = _QUANTITY_PATTERN.fullmatch(s)
+    if match is None:
+        raise ValueError("can't interpret %r" % s)
+    number, exponent, suffix = match.groups()
+    if exponent is not None:
+        return Decimal(number).scaleb(int(exponent))
+    return Decimal(number) * QUANTITY_MULTIPLIERS[suffix or '']
+
+
+@lru_cache(maxsize=1024)
+def parse_memory(s):
+    """Return a Kubernetes memory quantity in bytes, rounded up"""
+    return int(math.ceil(parse_quantity(s)))
+
+
+@lru_cache(maxsize=1024)
+def parse_cpu(s):
+    """Return a Kubernetes CPU quantity in millicores, rounded up"""
+    return int(math.ceil(parse_quantity(s) * 1000))
 
 
 def check_list_intersection(list1, list2):
@@ -120,6 +166,15 @@ def populate_pods(pool_name, url):
     subprocess.check_call(cmd)
 
 
+def pull_image_on_node(node_name, url, zone):
+    """Pull the given url image on a single node, the way
+    populate.bash does on every node"""
+    cmd = ["gcloud", "compute", "ssh", "%s@%s" % (os.environ.get("USER", "").lower(), node_name),
+           "--zone=%s" % zone, "--",
+           "/usr/share/google/dockercfg_update.sh && docker pull %s" % url]
+    subprocess.check_call(cmd)
+
+
 def user_confirm(prompt=None, default_response=False):
     """prompts for yes or no reponse from the user. Returns True for yes and
     False for no.
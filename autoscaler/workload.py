@@ -6,45 +6,165 @@ All functions in the file should be read-only and cause no side effects."""
 
 import logging
 
-from .utils import get_node_memory_capacity
+from .placement import simulate_placement
+from .pools import allocate, allocation, get_node_pool
+
 scale_logger = logging.getLogger("scale")
 
 
 def get_effective_utilization(k8s):
     """Return effective workload in the given list of nodes"""
+    memory_usage = k8s.get_total_cluster_memory_usage()
+    memory_capacity = k8s.get_total_cluster_memory_capacity()
+    scale_logger.debug("Current memory usage is %i", memory_usage)
+    scale_logger.debug("Total memory capacity is %i", memory_capacity)
     try:
-        scale_logger.debug(
-            "Current memory usage is %i", k8s.get_total_cluster_memory_usage())
-        scale_logger.debug(
-            "Total memory capacity is %i", k8s.get_total_cluster_memory_capacity())
-        utilization_percentage = k8s.get_total_cluster_memory_usage(
-        ) / k8s.get_total_cluster_memory_capacity()
-        return utilization_percentage
+        return memory_usage / memory_capacity
     except ZeroDivisionError:
         return float("inf")
 
 
-def schedule_goal(k8s, options):
+def schedule_goal(k8s, options, forecast=None):
     """Return the goal number of schedulable nodes, including nodes running
-    critical pods, given the current situation"""
+    critical pods, given the current situation and, if not None, the
+    peak memory demand forecast over the next node boot time
+
+    The forecast only counts when it expects the demand to grow beyond
+    the current one"""
+    goal = _schedule_current_goal(k8s, options)
+    if forecast is None or not k8s.get_nodes() or forecast <= k8s.get_total_cluster_memory_usage():
+        return goal
+    forecast_goal = _bound_cluster_size(
+        forecast / options.optimal_utilization / _get_mean_node_memory(k8s), options)
+    if forecast_goal > goal:
+        scale_logger.info("Scaling ahead to %i nodes for the %i bytes of demand forecast", forecast_goal, forecast)
+        return forecast_goal
+    return goal
+
+
+def _schedule_current_goal(k8s, options):
     scale_logger.info("Current scheduling target: %f ~ %f",
                       k8s.get_min_utilization(), k8s.get_max_utilization())
 
     current_utilization = get_effective_utilization(k8s)
     scale_logger.info("Current cluster utilization is %f", current_utilization)
 
+    if options.goal_policy == "placement":
+        return _bound_cluster_size(get_placement_goal(k8s, options), options)
+
     if current_utilization >= options.min_utilization and current_utilization <= options.max_utilization:
         # leave unchanged
         return len(k8s.get_nodes()) - k8s.get_num_unschedulable()
     else:
         # need to scale down or up
         required_num = k8s.get_total_cluster_memory_usage(
-        ) / options.optimal_utilization / get_node_memory_capacity(k8s.get_nodes()[0])
-
-        minimum_nodes = options.min_nodes
-        maximum_nodes = options.max_nodes
-        # Ensure that new_cluster_size remains within the bounds of min and max
-        # nodes
-        new_cluster_size = minimum_nodes if required_num < minimum_nodes else required_num
-        new_cluster_size = maximum_nodes if required_num > maximum_nodes else new_cluster_size
-        return int(round(new_cluster_size))
+        ) / options.optimal_utilization / _get_mean_node_memory(k8s)
+        return _bound_cluster_size(required_num, options)
+
+
+def _get_mean_node_memory(k8s):
+    """Return the mean memory capacity of the schedulable nodes, or of
+    all nodes if none is, standing for the nodes the cluster grows by
+    when their shapes differ"""
+    snapshot = k8s.get_snapshot()
+    capacities = snapshot.get_node_memory_capacities()
+    schedulable = [capacity for capacity, unschedulable in zip(capacities, snapshot.get_node_unschedulable())
+                   if not unschedulable]
+    capacities = schedulable or capacities
+    return sum(capacities) / len(capacities)
+
+
+def schedule_pool_goals(k8s, options, pools, forecast=None):
+    """Return the allocation of schedulable nodes to the pools: the
+    nodes schedulable in each pool now while the utilization stays
+    within bounds and they can take the forecast demand, otherwise
+    the cheapest mix of nodes serving the memory and CPU requests, or
+    the memory demand forecast if higher, at the optimal utilization
+
+    Nodes of no pool keep serving the demand they can take; every
+    pool stays within its own bounds, MIN_NODES and MAX_NODES do not
+    apply"""
+    snapshot = k8s.get_snapshot()
+    schedulable_counts = {pool.name: 0 for pool in pools}
+    pool_memory = 0
+    other_memory = 0
+    other_cpu = 0
+    for name, memory, cpu, unschedulable in zip(
+            snapshot.get_node_names(), snapshot.get_node_memory_capacities(),
+            snapshot.get_node_cpu_capacities(), snapshot.get_node_unschedulable()):
+        if unschedulable:
+            continue
+        pool = get_node_pool(pools, name)
+        if pool is None:
+            other_memory += memory
+            other_cpu += cpu
+        else:
+            schedulable_counts[pool.name] += 1
+            pool_memory += memory
+
+    current_utilization = get_effective_utilization(k8s)
+    scale_logger.info("Current cluster utilization is %f", current_utilization)
+    memory_request = k8s.get_total_cluster_memory_usage()
+    if forecast is not None:
+        memory_request = max(memory_request, forecast)
+    if options.min_utilization <= current_utilization <= options.max_utilization and \
+            memory_request <= (pool_memory + other_memory) * options.max_utilization:
+        counts = {pool.name: min(max(schedulable_counts[pool.name], pool.min_nodes), pool.max_nodes)
+                  for pool in pools}
+        return allocation(counts, sum(pool.price * counts[pool.name] for pool in pools), True)
+
+    result = allocate(
+        pools,
+        memory_request / options.optimal_utilization - other_memory,
+        sum(snapshot.get_pod_cpu_requests()) / options.optimal_utilization - other_cpu,
+        options.max_preemptible_share)
+    if not result.feasible:
+        scale_logger.warning("Every pool at its maximum still falls short of the demand")
+    scale_logger.info("Cheapest pool sizes: %s, at $%.2f per hour", ", ".join(
+        "%s %i" % (name, count) for name, count in sorted(result.counts.items())), result.price)
+    return result
+
+
+def get_projected_hourly_spend(k8s, prices, goal, pools=(), pool_goals=None):
+    """Return the dollars per hour the goal number of schedulable
+    nodes costs, None if no node has a price
+
+    With pools, every pool costs its price times its goal in
+    pool_goals, and the nodes of no pool the price of their machine
+    type in the price_table prices; without, the goal costs the mean
+    price of the nodes priced by prices"""
+    nodes = k8s.get_nodes()
+    if pools:
+        node_prices = [prices.get_node_price(node) for node in nodes if get_node_pool(pools, node.name) is None]
+        return sum(pool.price * pool_goals[pool.name] for pool in pools) + sum(
+            price for price in node_prices if price is not None)
+    node_prices = [price for price in map(prices.get_node_price, nodes) if price is not None]
+    if not node_prices:
+        return None
+    return goal * sum(node_prices) / len(node_prices)
+
+
+def get_placement_goal(k8s, options):
+    """Return the number of nodes needed to place every pod, packing
+    nodes up to the optimal utilization"""
+    result = simulate_placement(
+        k8s.get_snapshot(),
+        strategy=options.placement_strategy,
+        headroom=options.optimal_utilization,
+        max_new_nodes=max(options.max_nodes - len(k8s.get_nodes()), 0))
+    scale_logger.info(
+        "Placement simulation needs %i nodes, %i of them new; %i nodes could be emptied",
+        result.node_count, result.new_node_count, len(result.emptiable_node_names))
+    if result.unplaced_count:
+        scale_logger.warning("%i pods fit on no node", result.unplaced_count)
+    return result.node_count
+
+
+def _bound_cluster_size(required_num, options):
+    minimum_nodes = options.min_nodes
+    maximum_nodes = options.max_nodes
+    # Ensure that new_cluster_size remains within the bounds of min and max
+    # nodes
+    new_cluster_size = minimum_nodes if required_num < minimum_nodes else required_num
+    new_cluster_size = maximum_nodes if required_num > maximum_nodes else new_cluster_size
+    return int(round(new_cluster_size))
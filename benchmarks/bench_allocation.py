@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+
+"""Time the cheapest allocation of nodes to pools for clusters of 2 to
+8 pools, over demands from nothing to all the pools can serve.
+
+Run from the repository root: python -m benchmarks.bench_allocation"""
+
+import random
+import time
+
+from autoscaler.pools import allocate, node_pool
+
+GI = 2 ** 30
+
+# machine shapes: memory, cpu millicores, dollars per hour
+SHAPES = [(13 * GI, 2000, 0.148), (7.5 * GI, 2000, 0.095), (52 * GI, 8000, 0.59),
+          (26 * GI, 4000, 0.296), (3.75 * GI, 1000, 0.0475), (104 * GI, 16000, 1.18)]
+
+
+def make_pools(num_pools, seed=0):
+    rng = random.Random(seed)
+    pools = []
+    for i in range(num_pools):
+        memory, cpu, price = SHAPES[i % len(SHAPES)]
+        preemptible = i >= len(SHAPES) // 2 and rng.random() < 0.5
+        pools.append(node_pool("pool-%d" % i, "pool-%d" % i, memory, cpu, price * (0.3 if preemptible else 1),
+                               rng.randrange(3), rng.randrange(10, 60), preemptible))
+    return pools
+
+
+def main():
+    print("pools\tcases\tmean (ms)\tmax (ms)")
+    for num_pools in [2, 4, 6, 8]:
+        pools = make_pools(num_pools)
+        memory = sum(pool.memory * pool.max_nodes for pool in pools)
+        cpu = sum(pool.cpu * pool.max_nodes for pool in pools)
+        times = []
+        for step in range(50):
+            fraction = 0.9 * step / 49
+            start = time.perf_counter()
+            allocate(pools, memory * fraction, cpu * fraction * 0.5, 0.5)
+            times.append(time.perf_counter() - start)
+        print("%d\t%d\t%.2f\t\t%.2f" % (num_pools, len(times), 1000 * sum(times) / len(times), 1000 * max(times)))
+
+
+if __name__ == "__main__":
+    main()
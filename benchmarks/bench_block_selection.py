@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+
+"""Compare the list-based choice of nodes to block that
+Autoscaler._update_unschedulable used to make with
+select_nodes_to_block on synthetic clusters of up to 1,000 nodes.
+
+Run from the repository root: python -m benchmarks.bench_block_selection"""
+
+import heapq
+import random
+
+from autoscaler.autoscaler import select_nodes_to_block
+from autoscaler.records import NodeRecord
+from .bench_cluster_snapshot import bench
+
+
+def make_nodes(num_nodes, seed=0):
+    rng = random.Random(seed)
+    return [NodeRecord("node-%d" % i, {'pool': 'highmem'}, rng.random() < 0.3, 13317664 * 1024, 2000)
+            for i in range(num_nodes)]
+
+
+def list_based(nodes, calculate_priority, number_unschedulable):
+    """The selection as it was written before, minus the shuffle"""
+    schedulable_nodes = []
+    unschedulable_nodes = []
+    priority = []
+    for count in range(len(nodes)):
+        if nodes[count].unschedulable:
+            unschedulable_nodes.append(nodes[count])
+        else:
+            schedulable_nodes.append(nodes[count])
+        priority.append((calculate_priority(nodes[count]), count))
+
+    toBlock = []
+    toUnBlock = []
+    heapq.heapify(priority)
+    for _ in range(number_unschedulable):
+        if len(priority) > 0:
+            _, index = heapq.heappop(priority)
+            if nodes[index] in schedulable_nodes:
+                toBlock.append(nodes[index])
+        else:
+            break
+    for _, index in priority:
+        if nodes[index] in unschedulable_nodes:
+            toUnBlock.append(nodes[index])
+    return toBlock, toUnBlock
+
+
+def main():
+    print("nodes\tlist (s)\tselect (s)\tspeedup")
+    for num_nodes in [70, 250, 1000]:
+        nodes = make_nodes(num_nodes)
+        pods = {node.name: random.Random(node.name).randrange(30) for node in nodes}
+
+        def calculate_priority(node): return pods[node.name]
+        number_unschedulable = num_nodes // 2
+
+        list_time, (list_block, list_unblock) = bench(
+            list_based, nodes, calculate_priority, number_unschedulable)
+        select_time, (block, unblock) = bench(
+            select_nodes_to_block, nodes, calculate_priority, number_unschedulable)
+        assert len(list_block) - len(list_unblock) == len(block) - len(unblock)
+        print("%d\t%.4f\t\t%.4f\t\t%.0fx" % (num_nodes, list_time, select_time, list_time / select_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+
+"""Compare per-node pod counting through a linear scan of all pods
+with the indexed ClusterSnapshot on a synthetic cluster.
+
+Run from the repository root: python -m benchmarks.bench_cluster_snapshot"""
+
+import random
+import time
+from types import SimpleNamespace
+
+from autoscaler.cluster_snapshot import ClusterSnapshot
+from autoscaler.records import node_record_from_model, pod_record_from_model
+from autoscaler.utils import get_pod_host_name
+
+
+def make_cluster(num_nodes, num_pods, seed=0):
+    """Pods and nodes shaped like v1.Pod and v1.Node"""
+    rng = random.Random(seed)
+    nodes = [
+        SimpleNamespace(
+            metadata=SimpleNamespace(name="node-%d" % i),
+            spec=SimpleNamespace(unschedulable=rng.random() < 0.1),
+            status=SimpleNamespace(capacity={'memory': '13317664Ki', 'cpu': '2'}))
+        for i in range(num_nodes)
+    ]
+    pods = []
+    for i in range(num_pods):
+        container = SimpleNamespace(
+            resources=SimpleNamespace(requests={'memory': rng.choice(['256Mi', '512Mi', '1Gi', '2Gi'])}))
+        pods.append(SimpleNamespace(
+            metadata=SimpleNamespace(namespace="default", name="pod-%d" % i, labels={'student': ''}),
+            spec=SimpleNamespace(node_name=rng.choice(nodes).metadata.name, containers=[container]),
+            status=SimpleNamespace(phase="Running", start_time=None)))
+    return pods, nodes
+
+
+def to_records(pods, nodes):
+    return [pod_record_from_model(pod) for pod in pods], [node_record_from_model(node) for node in nodes]
+
+
+def linear_scan(pods, nodes):
+    """Per-node counting as k8s_control.get_pods_number_on_node used to do"""
+    counts = []
+    for node in nodes:
+        result = 0
+        for pod in pods:
+            if get_pod_host_name(pod) == node.metadata.name:
+                result += 1
+        counts.append(result)
+    return counts
+
+
+def indexed(pods, nodes, passes):
+    """Build the snapshot once, then answer every per-node query from it"""
+    snapshot = ClusterSnapshot(pods, nodes, ['student'])
+    return [[snapshot.get_pods_number_on_node(node.name) for node in nodes]
+            for _ in range(passes)]
+
+
+def bench(f, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    print("nodes\tpods\tlinear (s)\tsnapshot (s)\tspeedup")
+    for num_nodes, num_pods in [(70, 3000), (70, 10000), (500, 10000)]:
+        pods, nodes = make_cluster(num_nodes, num_pods)
+        # each scaling pass queries every node about three times
+        linear_time, linear_counts = bench(lambda: [linear_scan(pods, nodes) for _ in range(3)])
+        indexed_time, indexed_counts = bench(indexed, *to_records(pods, nodes), 3)
+        assert linear_counts[0] == indexed_counts[0]
+        print("%d\t%d\t%.4f\t\t%.4f\t\t%.0fx" % (
+            num_nodes, num_pods, linear_time, indexed_time, linear_time / indexed_time))
+
+
+if __name__ == "__main__":
+    main()
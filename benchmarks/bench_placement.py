@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+
+"""Time the placement simulation on the cluster in tests/test-data
+and on synthetic clusters of up to 5k pods.
+
+Run from the repository root: python -m benchmarks.bench_placement"""
+
+import random
+
+from autoscaler.cluster_snapshot import ClusterSnapshot
+from autoscaler.placement import simulate_placement
+from autoscaler.records import NodeRecord, PodRecord
+from autoscaler.utils import parse_cpu, parse_memory
+from tests.test_kubernetes_control import get_test_k8s
+from .bench_cluster_snapshot import bench
+
+
+def make_cluster(num_nodes, num_pods, seed=0):
+    """Student pods of mixed sizes spread over highmem nodes,
+    a tenth of them still pending"""
+    rng = random.Random(seed)
+    nodes = [NodeRecord("node-%d" % i, memory_capacity=parse_memory('52Gi'), cpu_capacity=8000)
+             for i in range(num_nodes)]
+    pods = []
+    for i in range(num_pods):
+        memory = parse_memory(rng.choice(['256Mi', '512Mi', '1Gi', '1Gi', '2Gi']))
+        cpu = parse_cpu(rng.choice(['50m', '100m', '200m']))
+        node_name = None if rng.random() < 0.1 else rng.choice(nodes).name
+        pods.append(PodRecord(name="pod-%d" % i, labels={'student': ''}, node_name=node_name,
+                              memory_request=memory, cpu_request=cpu))
+    return pods, nodes
+
+
+def main():
+    print("cluster\t\t\tstrategy\tnodes\tnew\temptiable\ttime (s)")
+    snapshots = [("test-data", get_test_k8s().get_snapshot())]
+    for num_nodes, num_pods in [(70, 1000), (150, 5000)]:
+        pods, nodes = make_cluster(num_nodes, num_pods)
+        snapshots.append(("%d nodes, %d pods" % (num_nodes, num_pods),
+                          ClusterSnapshot(pods, nodes, ['student'])))
+    for name, snapshot in snapshots:
+        for strategy in ['first_fit', 'best_fit']:
+            t, result = bench(simulate_placement, snapshot, strategy, 0.75, 75)
+            print("%-20s\t%s\t%i\t%i\t%i\t\t%.4f" % (
+                name, strategy, result.node_count, result.new_node_count,
+                len(result.emptiable_node_names), t))
+
+
+if __name__ == "__main__":
+    main()
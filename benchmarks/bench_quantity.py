@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+
+"""Compare the size parser the autoscaler used to have, a float
+based reading of IEC suffixes, with the cached Kubernetes quantity
+parser on the memory requests of a cluster, which reuse a handful of
+sizes.
+
+Run from the repository root: python -m benchmarks.bench_quantity"""
+
+import random
+import time
+
+from autoscaler.utils import parse_memory, parse_quantity
+
+# sizes both parsers read the same way
+SIZES = ['256Mi', '512Mi', '1Gi', '1.5Gi', '2Gi', '13317664Ki', '95360Ki']
+
+
+IEC_SUFFIXES = ('Bi', 'Ki', 'Mi', 'Gi', 'Ti', 'Pi', 'Ei', 'Zi', 'Yi')
+
+
+def human2bytes(s):
+    """The former parser, adapted from
+    https://code.activestate.com/recipes/578019-bytes-to-human-human-to-bytes-converter/
+    and reduced to the IEC suffixes of SIZES"""
+    num = ""
+    while s and s[0:1].isdigit() or s[0:1] == '.':
+        num += s[0]
+        s = s[1:]
+    letter = s.strip()
+    if letter not in IEC_SUFFIXES:
+        raise ValueError("can't interpret %r" % letter)
+    return int(float(num) * (1 << IEC_SUFFIXES.index(letter) * 10))
+
+
+def legacy(values):
+    return [int(v) if v.isdigit() else human2bytes(v) for v in values]
+
+
+def cached(values):
+    return [parse_memory(v) for v in values]
+
+
+def uncached(values):
+    parse_memory.cache_clear()
+    parse_quantity.cache_clear()
+    result = []
+    for v in values:
+        result.append(parse_memory(v))
+        parse_memory.cache_clear()
+        parse_quantity.cache_clear()
+    return result
+
+
+def bench(f, values, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f(values)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    rng = random.Random(0)
+    values = [rng.choice(SIZES) for _ in range(100000)]
+    legacy_time, legacy_result = bench(legacy, values)
+    print("human2bytes:\t\t%.4fs" % legacy_time)
+    for name, f in [("parse_memory, no cache", uncached), ("parse_memory, cached", cached)]:
+        t, result = bench(f, values)
+        assert result == legacy_result
+        print("%s:\t%.4fs\t%.1fx" % (name, t, legacy_time / t))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+
+"""Compare the memory held by the pods of a cluster kept as full
+v1.Pod models, as list_pod_for_all_namespaces returns them, with the
+same pods kept as PodRecord read page by page from the raw JSON.
+
+Run from the repository root: python -m benchmarks.bench_records"""
+
+import copy
+import gc
+import json
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from kubernetes.client import ApiClient
+
+from autoscaler.records import pod_record_from_json, pod_record_from_model
+
+PAGE_SIZE = 500
+
+
+def make_pages(num_pods):
+    """Raw JSON pages of num_pods pods copied from the test cluster"""
+    with open("tests/test-data/pods-all-namespaces.json") as pods_file:
+        templates = json.load(pods_file)["items"]
+    for item in templates:
+        item["spec"]["nodeName"] = item["spec"].pop("node_name", None)
+    items = []
+    for i in range(num_pods):
+        item = copy.deepcopy(templates[i % len(templates)])
+        item["metadata"]["name"] = "pod-%d" % i
+        items.append(item)
+    return [json.dumps({"metadata": {}, "items": items[start:start + PAGE_SIZE]}).encode()
+            for start in range(0, num_pods, PAGE_SIZE)]
+
+
+def as_models(pages):
+    api_client = ApiClient()
+    pods = []
+    for page in pages:
+        pods.extend(api_client.deserialize(SimpleNamespace(data=page), "V1PodList").items)
+    return pods
+
+
+def as_records(pages):
+    pods = []
+    for page in pages:
+        pods.extend(pod_record_from_json(item) for item in json.loads(page)["items"])
+    return pods
+
+
+def measure(f, pages):
+    """Return the bytes still held by the result of f, the peak
+    bytes while building it and the seconds it took"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = f(pages)
+    seconds = time.perf_counter() - start
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held, peak, seconds, result
+
+
+def main():
+    print("pods\tform\t\theld (MB)\tpeak (MB)\ttime (s)")
+    for num_pods in [1000, 10000]:
+        pages = make_pages(num_pods)
+        results = []
+        for name, f in [("v1.Pod", as_models), ("PodRecord", as_records)]:
+            held, peak, seconds, pods = measure(f, pages)
+            results.append((held, pods))
+            print("%d\t%-10s\t%.1f\t\t%.1f\t\t%.2f" % (num_pods, name, held / 2 ** 20, peak / 2 ** 20, seconds))
+            del pods
+        (model_held, models), (record_held, records) = results
+        assert [(pod.name, pod.memory_request) for pod in map(pod_record_from_model, models)] == \
+            [(pod.name, pod.memory_request) for pod in records]
+        print("%d\theld %.0fx less as records" % (num_pods, model_held / record_held))
+
+
+if __name__ == "__main__":
+    main()
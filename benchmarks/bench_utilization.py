@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+
+"""Compare computing the effective utilization by re-walking every
+pod and node and re-parsing their quantities (as workload.py used to)
+with reading the totals parsed once into the ClusterSnapshot columns.
+
+Run from the repository root: python -m benchmarks.bench_utilization"""
+
+from autoscaler.cluster_snapshot import ClusterSnapshot
+from autoscaler.utils import get_pod_memory_request, get_node_memory_capacity
+from .bench_cluster_snapshot import make_cluster, bench, to_records
+
+
+def per_call_rescan(pods, nodes):
+    """Four full rescans per pass, as get_effective_utilization and
+    schedule_goal used to do"""
+    def usage():
+        return sum(get_pod_memory_request(pod) for pod in pods)
+
+    def capacity():
+        return sum(get_node_memory_capacity(node) for node in nodes if not node.spec.unschedulable)
+
+    usage(), capacity()
+    return usage() / capacity(), usage()
+
+
+def columnar(pods, nodes):
+    snapshot = ClusterSnapshot(pods, nodes, ['student'])
+    usage = snapshot.get_total_memory_request()
+    return usage / snapshot.get_schedulable_memory_capacity(), usage
+
+
+def main():
+    print("nodes\tpods\trescan (s)\tcolumnar (s)\tspeedup")
+    for num_nodes, num_pods in [(70, 3000), (70, 10000), (500, 30000)]:
+        pods, nodes = make_cluster(num_nodes, num_pods)
+        rescan_time, rescan_result = bench(per_call_rescan, pods, nodes)
+        columnar_time, columnar_result = bench(columnar, *to_records(pods, nodes))
+        assert rescan_result == columnar_result
+        print("%d\t%d\t%.4f\t\t%.4f\t\t%.1fx" % (
+            num_nodes, num_pods, rescan_time, columnar_time, rescan_time / columnar_time))
+
+
+if __name__ == "__main__":
+    main()
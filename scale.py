@@ -5,7 +5,6 @@
 import logging
 import argparse
 import random
-import time
 
 from workload import schedule_goal
 from update_nodes import update_unschedulable
@@ -15,7 +14,8 @@ from utils import user_confirm
 from kubernetes_control import k8s_control
 from kubernetes_control_test import k8s_control_test
 from slack_message import slack_handler
-from populate import populate
+from populate import populate_node
+from readiness import readiness_tracker
 
 logging.basicConfig(
     format='%(asctime)s %(levelname)s %(message)s')
@@ -48,21 +48,28 @@ def shutdown_empty_nodes_test(nodes, k8s, cluster):
     shutdown_empty_nodes(nodes, k8s, cluster, True)
 
 
-def resize_for_new_nodes(new_total_nodes, k8s, cluster, test=False):
+def resize_for_new_nodes(new_total_nodes, k8s, cluster, options, test=False):
     """create new nodes to match new_total_nodes required
-    only for scaling up"""
+    only for scaling up; return a readiness_tracker pulling
+    images onto the new nodes as they become ready"""
     if confirm(("Resizing up to: %d nodes" % new_total_nodes)):
         scale_logger.info("Resizing up to: %d nodes", new_total_nodes)
         if not test:
-            cluster.add_new_node(new_total_nodes)
-            wait_time = 130
-            scale_logger.debug(
-                "Sleeping for %i seconds for the node to be ready for populating", wait_time)
-            time.sleep(wait_time)
-            populate(k8s)
+            operation = cluster.add_new_node(new_total_nodes)
+            known_node_names = [node.metadata.name for node in k8s.nodes]
+            return readiness_tracker(
+                cluster, k8s.get_core_api(), operation,
+                known_node_names, new_total_nodes - len(known_node_names),
+                lambda node_name: populate_node(k8s, node_name, options),
+                initial_delay=options.readiness_initial_delay,
+                max_delay=options.readiness_max_delay,
+                timeout=options.readiness_timeout,
+                workers=options.prepull_workers).start()
+    return None
 
-def resize_for_new_nodes_test(new_total_nodes, k8s, cluster):
-    resize_for_new_nodes(new_total_nodes, k8s, cluster, True)
+
+def resize_for_new_nodes_test(new_total_nodes, k8s, cluster, options):
+    return resize_for_new_nodes(new_total_nodes, k8s, cluster, options, True)
 
 
 def scale(options):
@@ -106,20 +113,23 @@ def scale(options):
     if confirm(("Updating unschedulable flags to ensure %i nodes are unschedulable" % max(len(k8s.nodes) - goal, 0))):
         update_unschedulable(max(len(k8s.nodes) - goal, 0), nodes, k8s)
 
+    readiness = None
     if goal > len(k8s.nodes):
         scale_logger.info(
             "Resize the cluster to %i nodes to satisfy the demand", goal)
         if options.test_cloud:
-            resize_for_new_nodes_test(goal, k8s, cluster)
+            readiness = resize_for_new_nodes_test(goal, k8s, cluster, options)
         else:
             slack_logger.info(
                 "Cluster resized to %i nodes to satisfy the demand", goal)
-            resize_for_new_nodes(goal, k8s, cluster)
+            readiness = resize_for_new_nodes(goal, k8s, cluster, options)
     if options.test_cloud:
         shutdown_empty_nodes_test(nodes, k8s, cluster)
     else:
         # CRITICAL NODES SHOULD NOT BE SHUTDOWN
         shutdown_empty_nodes(nodes, k8s, cluster)
+    if readiness is not None:
+        readiness.wait()
 
 
 if __name__ == "__main__":
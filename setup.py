@@ -19,7 +19,7 @@ setup(
     author_email='',
     description='Autoscaler for the jupyterhub-k8s cluster.',
     long_description=__doc__,
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     include_package_data=True,
     zip_safe=False,
     platforms='any',
@@ -27,6 +27,9 @@ setup(
     entry_points={
         'console_scripts': [
             'autoscaler = autoscaler.main:main',
+            'autoscaler-replay = autoscaler.trace:main',
+            'autoscaler-simulate = autoscaler.simulator.engine:main',
+            'autoscaler-backtest = autoscaler.forecast:main',
         ],
     },
     classifiers=[
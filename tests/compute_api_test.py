@@ -0,0 +1,73 @@
+class RequestTest:
+
+    def __init__(self, result):
+        self._result = result
+
+    def execute(self):
+        return self._result
+
+
+class InstanceGroupManagersTest:
+
+    def __init__(self, compute):
+        self._compute = compute
+
+    def list(self, zone, project):
+        return RequestTest({'items': [{'name': name} for name in self._compute.groups]})
+
+    def listManagedInstances(self, instanceGroupManager, project, zone):
+        self._compute.calls.append(('listManagedInstances', instanceGroupManager))
+        return RequestTest({'managedInstances': [
+            {'instance': self._compute.instance_url(name), 'instanceStatus': 'RUNNING'}
+            for name in self._compute.groups[instanceGroupManager]
+        ]})
+
+    def deleteInstances(self, instanceGroupManager, project, zone, body):
+        self._compute.calls.append(('deleteInstances', instanceGroupManager, body))
+        if 'deleteInstances' in self._compute.failing_requests:
+            raise IOError("deleteInstances failed")
+        for url in body['instances']:
+            self._compute.groups[instanceGroupManager].remove(url.rsplit('/', 1)[-1])
+        return RequestTest({'name': 'operation-delete', 'status': 'PENDING'})
+
+    def get(self, instanceGroupManager, project, zone):
+        self._compute.calls.append(('get', instanceGroupManager))
+        return RequestTest({'name': instanceGroupManager, 'targetSize': len(self._compute.groups[instanceGroupManager])})
+
+    def resize(self, instanceGroupManager, project, zone, size):
+        self._compute.calls.append(('resize', instanceGroupManager, size))
+        return RequestTest({'name': 'operation-resize', 'status': 'PENDING'})
+
+
+class ZoneOperationsTest:
+
+    def __init__(self, compute):
+        self._compute = compute
+
+    def get(self, project, zone, operation):
+        self._compute.calls.append(('zoneOperations.get', operation))
+        return RequestTest(self._compute.operations[operation])
+
+
+class ComputeApiTest:
+
+    """Stands in for the Compute Engine client returned by
+    googleapiclient.discovery.build; groups maps each managed
+    instance group name to the names of its instances"""
+
+    def __init__(self, groups):
+        self.groups = groups
+        self.calls = []
+        # names of the requests that raise instead of succeeding
+        self.failing_requests = set()
+        # zone operations by name, as zoneOperations().get returns them
+        self.operations = {}
+
+    def instance_url(self, name):
+        return "https://www.googleapis.com/compute/v1/projects/data-8/zones/us-central1-a/instances/" + name
+
+    def instanceGroupManagers(self):
+        return InstanceGroupManagersTest(self)
+
+    def zoneOperations(self):
+        return ZoneOperationsTest(self)
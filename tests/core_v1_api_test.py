@@ -1,12 +1,95 @@
+import json
+import time
+from types import SimpleNamespace
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
 from .testing_utils import json_to_object
 
 
+def _get_field(item, path):
+    for key in path.split("."):
+        item = (item or {}).get(key)
+    return item
+
+
+def _matches_field(item, term):
+    if "!=" in term:
+        path, value = term.split("!=")
+        return _get_field(item, path) != value
+    path, value = term.split("=")
+    return _get_field(item, path) == value
+
+
+def _matches_label(item, term):
+    labels = item["metadata"].get("labels") or {}
+    if term.startswith("!"):
+        return term[1:] not in labels
+    key, _, value = term.partition("=")
+    return key in labels and (not value or labels[key] == value)
+
+
+class ApiClientTest:
+
+    """Serves the objects of test files as the API server would, as
+    raw JSON pages of at most `limit` objects, filtered by the
+    selectors; files maps each resource path to its test file"""
+
+    def __init__(self, files):
+        self._items = {}
+        for resource_path, file_name in files.items():
+            with open(file_name) as test_file:
+                items = json.load(test_file)["items"]
+            for item in items:
+                # the pods test file was saved with the Python attribute name
+                if "node_name" in item.get("spec", {}):
+                    item["spec"]["nodeName"] = item["spec"].pop("node_name")
+            self._items[resource_path] = items
+        self.requests = []
+        # answer the next request continuing a listing with 410 Gone
+        self.expire_continue = False
+        # an API server too old to page ignores limit and continue
+        self.paging = True
+
+    def call_api(self, resource_path, method, query_params=None, **kwargs):
+        assert method == "GET" and resource_path in self._items
+        params = dict(query_params or ())
+        self.requests.append(params)
+        if "continue" in params and self.expire_continue:
+            self.expire_continue = False
+            raise ApiException(status=410, reason="Gone")
+        items = [
+            item for item in self._items[resource_path]
+            if all(_matches_field(item, term) for term in params.get("fieldSelector", "").split(",") if term) and
+            all(_matches_label(item, term) for term in params.get("labelSelector", "").split(",") if term)]
+        metadata = {}
+        if self.paging:
+            start = int(params.get("continue", 0))
+            end = start + params["limit"]
+            if end < len(items):
+                metadata["continue"] = str(end)
+            items = items[start:end]
+        return SimpleNamespace(data=json.dumps({"metadata": metadata, "items": items}).encode())
+
+
 class CoreV1ApiTest:
 
-    def __init__(self):
+    def __init__(self, api_client=None):
+        self.api_client = ApiClientTest({
+            "/api/v1/pods": "tests/test-data/pods-all-namespaces.json",
+            "/api/v1/nodes": "tests/test-data/nodes.json"})
         self._nodes = json_to_object("tests/test-data/nodes.json")
         self._all_pods = json_to_object("tests/test-data/pods-all-namespaces.json")
         self.new_nodes = {}
+        # artificial round trip time and failures of patch_node
+        self.patch_latency = 0
+        self.failing_nodes = set()
+        # watch events to replay, keyed by the name of the list function
+        self.events = {'list_node': [], 'list_pod_for_all_namespaces': []}
+        # pods created through the namespaced calls, by (namespace, name)
+        self.namespaced_pods = {}
+        self.deleted_pods = []
 
     def list_node(self):
         return self._nodes
@@ -15,4 +98,57 @@ class CoreV1ApiTest:
         return self._all_pods
 
     def patch_node(self, node_name, new_node):
+        time.sleep(self.patch_latency)
+        if node_name in self.failing_nodes:
+            raise ApiException(status=500, reason="Internal Server Error")
         self.new_nodes[node_name] = new_node
+
+    def create_namespaced_pod(self, namespace, body):
+        key = (namespace, body.metadata.name)
+        if key in self.namespaced_pods:
+            raise ApiException(status=409, reason="AlreadyExists")
+        self.namespaced_pods[key] = body
+        return body
+
+    def list_namespaced_pod(self, namespace, label_selector=None):
+        label, _, value = (label_selector or "").partition("=")
+        return client.V1PodList(items=[
+            pod for (pod_namespace, _), pod in self.namespaced_pods.items()
+            if pod_namespace == namespace and (not label or (pod.metadata.labels or {}).get(label) == value)
+        ])
+
+    def delete_namespaced_pod(self, name, namespace, body):
+        if self.namespaced_pods.pop((namespace, name), None) is None:
+            raise ApiException(status=404, reason="NotFound")
+        self.deleted_pods.append(name)
+
+    def set_pod_phase(self, namespace, name, phase, waiting_reason=None, exit_code=None):
+        """Move a namespaced pod along as the kubelet would"""
+        container_statuses = None
+        state = None
+        if waiting_reason:
+            state = client.V1ContainerState(waiting=client.V1ContainerStateWaiting(reason=waiting_reason))
+        elif exit_code is not None:
+            state = client.V1ContainerState(terminated=client.V1ContainerStateTerminated(exit_code=exit_code))
+        if state is not None:
+            container_statuses = [client.V1ContainerStatus(
+                name="prepull", image="", image_id="", ready=False, restart_count=0, state=state)]
+        self.namespaced_pods[(namespace, name)].status = client.V1PodStatus(
+            phase=phase, container_statuses=container_statuses)
+
+
+class WatchTest:
+
+    """Replays the events queued on a CoreV1ApiTest in place of
+    kubernetes.watch.Watch"""
+
+    calls = []
+
+    def stream(self, func, **kwargs):
+        WatchTest.calls.append((func.__name__, kwargs))
+        events = func.__self__.events[func.__name__]
+        while events:
+            yield events.pop(0)
+
+    def stop(self):
+        pass
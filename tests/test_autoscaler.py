@@ -1,35 +1,100 @@
-from autoscaler import autoscaler, settings, workload
+import time
+
+from autoscaler import autoscaler, pools, pricing, settings, state, workload
+from autoscaler.cluster_update import abstract_cluster_control
+from autoscaler.records import NodeRecord, PodRecord
 from .test_kubernetes_control import get_test_k8s
-from .testing_utils import check_expected
+from .testing_utils import check_expected, make_node
 
 
-class ClusterTest:
+class ClusterTest(abstract_cluster_control):
 
     def __init__(self):
-        self.shutdown_nodes = []
+        self.shutdown_node_names = []
         self.goals = []
+        self.target_size = None
 
     def shutdown_specified_node(self, node):
-        self.shutdown_nodes.append(node)
+        self.shutdown_node_names.append(node)
+
+    def add_new_node(self, goal, pool=None):
+        self.goals.append(goal if pool is None else (pool, goal))
 
-    def add_new_node(self, goal):
-        self.goals.append(goal)
+    def get_target_size(self, pool=None):
+        return self.target_size
 
 
 class AutoscalerTest(autoscaler.Autoscaler):
     def __init__(self, options):
         self._options = options
+        self._clock = time.time
         self._cluster = ClusterTest()
         self._k8s = get_test_k8s()
         self._non_critical_nodes = []
+        self._readiness = None
+        self._decision = {}
+        self._trace = None
+        self._history = None
+        self._prices = pricing.price_table()
+        self._billing = pricing.billing_model(options.billing_minimum, options.billing_increment)
+        self._pools = []
+        self._pool_goals = {}
+        self._state = state.scaling_state()
+        self._pending_uncordon = set()
+        self._pending_new_nodes = {}
+        self._requested_sizes = {}
 
         self._add_slack_handler()
 
 
+class TestSelectNodesToBlock:
+
+    def test_select(self):
+        nodes = [make_node('a'), make_node('b', unschedulable=True), make_node('c'), make_node('d', unschedulable=True)]
+        priorities = {'a': 3, 'b': 2, 'c': 0, 'd': 5}
+        toBlock, toUnBlock = autoscaler.select_nodes_to_block(
+            nodes, lambda node: priorities[node.name], 2)
+        assert [node.name for node in toBlock] == ['c']
+        assert [node.name for node in toUnBlock] == ['d']
+
+    def test_more_than_available(self):
+        nodes = [make_node('a'), make_node('b', unschedulable=True)]
+        toBlock, toUnBlock = autoscaler.select_nodes_to_block(nodes, lambda node: 0, 5)
+        assert [node.name for node in toBlock] == ['a']
+        assert toUnBlock == []
+
+    def test_ties_are_deterministic(self):
+        nodes = [make_node('node-%d' % i) for i in range(20)]
+        first, _ = autoscaler.select_nodes_to_block(nodes, lambda node: 0, 5, seed=1)
+        again, _ = autoscaler.select_nodes_to_block(list(reversed(nodes)), lambda node: 0, 5, seed=1)
+        other, _ = autoscaler.select_nodes_to_block(nodes, lambda node: 0, 5, seed=2)
+        assert first == again
+        # ties are not simply broken by position in the list
+        assert first != nodes[:5]
+        assert first != other
+
+
+class TestUnschedulableTarget:
+
+    def test_target(self):
+        # unblocking for the goal is immediate
+        assert autoscaler.get_unschedulable_target(20, 5, 17, 18) == 3
+        # blocking stops at the stable goal, never unblocking for it
+        assert autoscaler.get_unschedulable_target(20, 1, 15, 18) == 2
+        assert autoscaler.get_unschedulable_target(20, 3, 15, 19) == 3
+        assert autoscaler.get_unschedulable_target(20, 0, 25, 25) == 0
+
+
 class TestAuotscaler(object):
 
     _autoscaler = AutoscalerTest(settings.settings())
 
+    def test_single_slack_handler(self):
+        AutoscalerTest(settings.settings())
+        handlers = [handler for handler in autoscaler.slack_logger.handlers
+                    if isinstance(handler, autoscaler.slack_handler)]
+        assert len(handlers) == 1
+
     def test_update_nodes(self):
         nodes = self._autoscaler._get_non_critical_nodes()
 
@@ -141,54 +206,204 @@ class TestAuotscaler(object):
 
     def test_get_non_critical_nodes(self):
         result = self._autoscaler._get_non_critical_nodes()
-        assert str(result) == """\
-[X(metadata=X(name='gke-prod-highmem-pool-custom-wwk5'), spec=X(unschedulable=False), status=X(alloca\
-table={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'}, cap\
-acity={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'})), X\
-(metadata=X(name='gke-prod-highmem-pool-custom-wwk6'), spec=X(unschedulable=True), status=X(allocatab\
-le={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'}, capaci\
-ty={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'}))]"""\
-        or str(result) == """\
-[X(metadata=X(name='gke-prod-highmem-pool-custom-wwk6'), spec=X(unschedulable=True), status=X(alloca\
-table={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'}, cap\
-acity={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'})), X\
-(metadata=X(name='gke-prod-highmem-pool-custom-wwk5'), spec=X(unschedulable=False), status=X(allocatab\
-le={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'}, capaci\
-ty={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'}))]"""
+        assert sorted((node.name, node.unschedulable) for node in result) == [
+            ('gke-prod-highmem-pool-custom-wwk5', False), ('gke-prod-highmem-pool-custom-wwk6', True)]
+        assert all(node.memory_capacity == 13317664 * 1024 and node.cpu_capacity == 2000 for node in result)
 
     def test_update_non_critical_node_list(self):
         self._autoscaler._update_non_critical_node_list()
-        assert str(self._autoscaler._non_critical_nodes) == """\
-[X(metadata=X(name='gke-prod-highmem-pool-custom-wwk5'), spec=X(unschedulable=False), status=X(alloca\
-table={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'}, cap\
-acity={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'})), X\
-(metadata=X(name='gke-prod-highmem-pool-custom-wwk6'), spec=X(unschedulable=True), status=X(allocatab\
-le={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'}, capaci\
-ty={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'}))]"""\
-        or str(self._autoscaler._non_critical_nodes) == """\
-[X(metadata=X(name='gke-prod-highmem-pool-custom-wwk6'), spec=X(unschedulable=True), status=X(alloca\
-table={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'}, cap\
-acity={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'})), X\
-(metadata=X(name='gke-prod-highmem-pool-custom-wwk5'), spec=X(unschedulable=False), status=X(allocatab\
-le={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'}, capaci\
-ty={'alpha.kubernetes.io/nvidia-gpu': '0', 'cpu': '2', 'memory': '13317664Ki', 'pods': '110'}))]"""
+        assert sorted((node.name, node.unschedulable) for node in self._autoscaler._non_critical_nodes) == [
+            ('gke-prod-highmem-pool-custom-wwk5', False), ('gke-prod-highmem-pool-custom-wwk6', True)]
 
     def test_resize_for_new_nodes(self):
-        autoscaler.populate = lambda x: None
+        autoscaler.populate = lambda *args: None
         autoscaler.confirm = lambda x: True
-        self._autoscaler._resize_for_new_nodes(wait_time=0)
+        self._autoscaler._resize_for_new_nodes()
+        self._autoscaler.wait_for_new_nodes()
         assert self._autoscaler._cluster.goals == [15]
 
     def test_shutdown_empty_nodes(self):
         self._autoscaler._shutdown_empty_nodes()
-        assert self._autoscaler._cluster.shutdown_nodes == ['gke-prod-highmem-pool-custom-wwk6']
+        assert self._autoscaler._cluster.shutdown_node_names == ['gke-prod-highmem-pool-custom-wwk6']
+
+    def test_keep_nodes_within_billing_minimum(self):
+        scaler = AutoscalerTest(settings.settings())
+        scaler._update_non_critical_node_list()
+        # wwk6 is empty and blocked but three minutes into its billing minimum
+        for node in scaler._non_critical_nodes:
+            node.creation_time = 1000
+        scaler._clock = lambda: 1180
+        scaler._shutdown_empty_nodes()
+        assert scaler._decision["shutdown"] == []
+        assert scaler._decision["within_billing_minimum"] == ['gke-prod-highmem-pool-custom-wwk6']
+        assert scaler._cluster.shutdown_node_names == []
+
+        scaler._clock = lambda: 1600
+        scaler._shutdown_empty_nodes()
+        assert scaler._cluster.shutdown_node_names == ['gke-prod-highmem-pool-custom-wwk6']
+
+    def test_cordon_dwell(self):
+        scaler = AutoscalerTest(settings.settings())
+        autoscaler.populate = lambda *args: None
+        scaler._update_non_critical_node_list()
+        scaler._goal = 15
+        # wwk5 was uncordoned 100 seconds ago
+        scaler._state.record_flags(['gke-prod-highmem-pool-custom-wwk5'], False, 100)
+        scaler._clock = lambda: 200
+        assert scaler._update_unschedulable(lambda node: 0) == 0
+        assert scaler._decision["held_schedulable"] == ['gke-prod-highmem-pool-custom-wwk5']
+
+        scaler._clock = lambda: 2000
+        assert scaler._update_unschedulable(lambda node: 0) == 1
+        assert scaler._decision["blocked"] == ['gke-prod-highmem-pool-custom-wwk5']
+        assert scaler._state.get_flag_age('gke-prod-highmem-pool-custom-wwk5', True, 2000) == 0
+
+    def test_cordon_dwell_keeps_blocked_nodes(self):
+        scaler = AutoscalerTest(settings.settings())
+        autoscaler.populate = lambda *args: None
+        scaler._update_non_critical_node_list()
+        scaler._goal = 16
+        scaler._state.record_flags(['gke-prod-highmem-pool-custom-wwk6'], True, 100)
+        scaler._clock = lambda: 200
+
+        # wwk5 now ranks first, but wwk6 was cordoned recently
+        def calculate_priority(node): return 0 if node.name.endswith('wwk5') else 1
+        assert scaler._update_unschedulable(calculate_priority) == 0
+        assert scaler._decision["blocked"] == scaler._decision["unblocked"] == []
+
+    def test_scale_down_window(self):
+        scaler = AutoscalerTest(settings.settings())
+        autoscaler.populate = lambda *args: None
+        scaler._update_non_critical_node_list()
+        scaler._state.record_goal(0, 17, {}, 900)
+        scaler._goal = 15
+        scaler._state.record_goal(600, 15, {}, 900)
+        # the goal of 17 nodes ten minutes ago still holds wwk5 open,
+        # though it does not unblock wwk6
+        scaler._clock = lambda: 600
+        assert scaler._update_unschedulable(lambda node: 0 if node.unschedulable else 1) == 0
+        assert scaler._decision["blocked"] == scaler._decision["unblocked"] == []
+
+        scaler._clock = lambda: 1000
+        assert scaler._get_stable_goals(1000) == (15, {})
+        assert scaler._update_unschedulable(lambda node: 0 if node.unschedulable else 1) == 1
 
     def test_scale(self):
         autoscaler_settings = settings.settings()
         autoscaler_settings.test_cloud = False
         self._autoscaler = AutoscalerTest(autoscaler_settings)
-        autoscaler.populate = lambda x: None
+        autoscaler.populate = lambda *args: None
         autoscaler.confirm = lambda x: True
         self._autoscaler.scale()
         assert self._autoscaler._cluster.goals == []
-        assert self._autoscaler._cluster.shutdown_nodes == ['gke-prod-highmem-pool-custom-wwk6']
+        assert self._autoscaler._cluster.shutdown_node_names == ['gke-prod-highmem-pool-custom-wwk6']
+
+    def test_forecast_without_history(self):
+        autoscaler_settings = settings.settings()
+        autoscaler_settings.forecast_horizon = 600
+        scaler = AutoscalerTest(autoscaler_settings)
+        autoscaler.populate = lambda *args: None
+        scaler.scale()
+        # the first pass has only the current demand to go by
+        assert scaler._decision["forecast"] is None
+        assert scaler._decision["goal"] == 15
+
+    def test_track_new_nodes(self):
+        trackers = []
+
+        class TrackerTest:
+
+            def __init__(self, cluster, v1, operation, known_node_names, expected_new, on_ready, **kwargs):
+                self.known_node_names = set(known_node_names)
+                self.expected_new = expected_new
+                self.stopped = False
+                trackers.append(self)
+
+            def start(self):
+                return self
+
+            def stop(self):
+                self.stopped = True
+
+            def is_done(self):
+                return self.stopped
+
+            def get_known_node_names(self):
+                return self.known_node_names | {'gke-prod-highmem-pool-0df1a536-ready'}
+
+            def get_outstanding_count(self):
+                return 1
+
+        scaler = AutoscalerTest(settings.settings())
+        nodes = scaler._k8s.get_nodes() + [NodeRecord('gke-prod-highmem-pool-0df1a536-new', ready=False)]
+        scaler._k8s._load(scaler._k8s.get_pods(), nodes)
+        scaler._goal = 20
+        real_tracker = autoscaler.readiness_tracker
+        autoscaler.readiness_tracker = TrackerTest
+        try:
+            scaler._track_new_nodes(None)
+            # the node of an earlier resize that is not ready yet is
+            # waited for as well
+            assert 'gke-prod-highmem-pool-0df1a536-new' not in trackers[0].known_node_names
+            assert len(trackers[0].known_node_names) == 17
+            assert trackers[0].expected_new == 3
+            scaler._track_new_nodes(None)
+            assert trackers[0].stopped
+            assert trackers[1].known_node_names == trackers[0].get_known_node_names()
+            assert trackers[1].expected_new == 3
+        finally:
+            autoscaler.readiness_tracker = real_tracker
+
+    def test_scale_for_pending_pods(self):
+        autoscaler_settings = settings.settings()
+        autoscaler_settings.test_cloud = False
+        autoscaler_settings.yes = True
+        scaler = AutoscalerTest(autoscaler_settings)
+        operations = []
+        scaler._track_new_nodes = operations.append
+        autoscaler.populate = lambda *args: None
+        pending = [PodRecord('datahub', name, {'jupyter': ''}, phase='Pending', memory_request=memory * 2 ** 30,
+                             unschedulable=unschedulable)
+                   for name, memory, unschedulable in [('a', 10, True), ('b', 8, True), ('c', 12, False)]]
+        scaler._k8s._load(scaler._k8s.get_pods() + pending, scaler._k8s.get_nodes())
+        scaler.scale()
+        # the 10Gi pod fits on the empty, cordoned wwk6, the 8Gi pod
+        # needs a new node; pod c has not been tried yet
+        assert scaler._decision["pending_pods"] == 2
+        assert scaler._decision["pending_uncordon"] == ['gke-prod-highmem-pool-custom-wwk6']
+        assert scaler._decision["pending_new_nodes"] == {None: 1}
+        assert scaler._decision["unblocked"] == ['gke-prod-highmem-pool-custom-wwk6']
+        assert scaler._cluster.goals == [18]
+        assert scaler._cluster.shutdown_node_names == []
+
+        # the new node is booting: the pods wait for it, no more is
+        # asked for, whether it has registered yet or not
+        scaler._cluster.target_size = 18
+        scaler.scale()
+        assert scaler._decision["pending_new_nodes"] == {}
+        nodes = scaler._k8s.get_nodes() + [NodeRecord(
+            'gke-prod-highmem-pool-0df1a536-new', memory_capacity=13 * 2 ** 30, cpu_capacity=2000, ready=False)]
+        scaler._k8s._load(scaler._k8s.get_pods(), nodes)
+        scaler.scale()
+        assert scaler._decision["pending_new_nodes"] == {}
+        assert scaler._cluster.goals == [18]
+
+    def test_scale_pools(self):
+        autoscaler_settings = settings.settings()
+        autoscaler_settings.test_cloud = False
+        autoscaler_settings.node_pools = [
+            "main,0df1a536,13317664Ki,2,0.148,2,20", "custom,pool-custom,13317664Ki,2,0.05,0,5"]
+        scaler = AutoscalerTest(autoscaler_settings)
+        scaler._pools = pools.parse_node_pools(autoscaler_settings.node_pools)
+        operations = []
+        scaler._track_new_nodes = operations.append
+        autoscaler.populate = lambda *args: None
+        scaler.scale()
+        # 42Gi and 9 CPUs at the optimal utilization: the two main
+        # nodes the pool keeps and three of the cheaper custom nodes
+        assert scaler._decision["pool_goals"] == {"main": 2, "custom": 3}
+        assert scaler._decision["unblocked"] == ['gke-prod-highmem-pool-custom-wwk6']
+        assert scaler._cluster.goals == [("custom", 3)]
+        assert operations == [[None]]
+        # the node just unblocked is not shut down
+        assert scaler._cluster.shutdown_node_names == []
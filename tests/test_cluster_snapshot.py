@@ -0,0 +1,69 @@
+import pytest
+
+from copy import deepcopy
+from autoscaler.cluster_snapshot import ClusterSnapshot
+from .test_kubernetes_control import get_test_k8s
+from .testing_utils import check_expected, make_node, make_pod
+
+
+class TestClusterSnapshot:
+
+    _k8s = get_test_k8s()
+    _snapshot = _k8s.get_snapshot()
+
+    def test_get_pods_number_on_node(self):
+        check_expected(self._snapshot.get_pods_number_on_node, ['gke-prod-highmem-pool-0df1a536-wvjl'], int, 6)
+        check_expected(self._snapshot.get_pods_number_on_node, ['gke-prod-highmem-pool-custom-wwk5'], int, 0)
+        check_expected(self._snapshot.get_pods_number_on_node, ['no-such-node'], int, 0)
+
+    def test_get_memory_request_on_node(self):
+        total = sum(self._snapshot.get_memory_request_on_node(node.name)
+                    for node in self._k8s.get_nodes())
+        assert total == self._k8s.get_total_cluster_memory_usage()
+        check_expected(self._snapshot.get_memory_request_on_node, ['gke-prod-highmem-pool-custom-wwk6'], int, 0)
+
+    def test_is_critical(self):
+        assert self._snapshot.is_critical('gke-prod-highmem-pool-0df1a536-wvjl')
+        assert not self._snapshot.is_critical('gke-prod-highmem-pool-custom-wwk5')
+        assert list(self._snapshot.get_critical_node_names()) == self._k8s.get_critical_node_names()
+
+    def test_schedulable_split(self):
+        assert self._snapshot.get_unschedulable_node_names() == (
+            'gke-prod-highmem-pool-0df1a536-0zc0', 'gke-prod-highmem-pool-custom-wwk6')
+        assert len(self._snapshot.get_schedulable_node_names()) == 15
+        check_expected(self._snapshot.get_num_schedulable, [], int, 1)
+        check_expected(self._snapshot.get_num_unschedulable, [], int, 2)
+
+    def test_memory_totals(self):
+        check_expected(self._snapshot.get_total_memory_request, [], int, 33822867456)
+        check_expected(self._snapshot.get_schedulable_memory_capacity, [], int, 204559319040)
+        check_expected(self._snapshot.get_node_memory_capacity, ['gke-prod-highmem-pool-custom-wwk6'], int, 13637287936)
+        assert len(self._snapshot.get_node_memory_capacities()) == len(self._snapshot.get_node_names()) == 17
+        assert sum(self._snapshot.get_pod_memory_requests()) == 33822867456
+        assert len(self._snapshot.get_pod_node_names()) == 28
+
+    def test_get_memory_request_by_label(self):
+        snapshot = ClusterSnapshot([
+            make_pod('node-1', '1Gi', labels={'course': 'stat28'}),
+            make_pod('node-1', '512Mi', labels={'course': 'prob140'}),
+            make_pod('node-2', '1Gi', labels={'course': 'stat28'}),
+            make_pod('node-2', '1Gi', labels={}),
+        ], [make_node('node-1', '4Gi'), make_node('node-2', '4Gi', unschedulable=True)], ['course'])
+        assert snapshot.get_memory_request_by_label('course') == {'stat28': 2147483648, 'prob140': 536870912}
+        assert snapshot.get_memory_request_by_label('missing') == {}
+        check_expected(snapshot.get_total_memory_request, [], int, 3758096384)
+        check_expected(snapshot.get_schedulable_memory_capacity, [], int, 4294967296)
+
+    def test_immutable(self):
+        with pytest.raises(AttributeError):
+            self._snapshot._num_schedulable = 3
+        with pytest.raises(TypeError):
+            self._snapshot._pod_counts['no-such-node'] = 1
+        assert deepcopy(self._snapshot) is self._snapshot
+        with pytest.raises(TypeError):
+            self._snapshot.get_pod_memory_requests()[0] = 1
+
+    def test_empty(self):
+        snapshot = ClusterSnapshot([], [], [''])
+        check_expected(snapshot.get_num_unschedulable, [], int, 0)
+        check_expected(snapshot.get_pods_number_on_node, ['node'], int, 0)
@@ -0,0 +1,171 @@
+import json
+
+from autoscaler import cluster_update, pools, settings
+from .compute_api_test import ComputeApiTest
+from .testing_utils import FakeClock, check_expected
+
+
+def get_test_gce(groups):
+    options = settings.settings()
+    options.context_cloud = 'prod'
+    compute = ComputeApiTest(groups)
+    return cluster_update.gce_cluster_control(options, compute), compute
+
+
+class TestManagedInstanceIndex:
+
+    def test_ttl(self):
+        listings = []
+
+        def list_instances():
+            listings.append(True)
+            return [{'instance': 'https://compute/instances/node-1'},
+                    {'instance': 'https://compute/instances/node-10'}]
+
+        clock = FakeClock()
+        index = cluster_update.managed_instance_index(list_instances, 60, clock)
+        check_expected(index.get_url, ['node-1'], str, 'https://compute/instances/node-1')
+        check_expected(index.get_url, ['node-10'], str, 'https://compute/instances/node-10')
+        assert len(listings) == 1
+
+        clock.now = 60
+        index.get_url('node-1')
+        assert len(listings) == 2
+
+        index.invalidate()
+        index.get_url('node-1')
+        assert len(listings) == 3
+
+    def test_unknown_name(self):
+        index = cluster_update.managed_instance_index(
+            lambda: [{'instance': 'https://compute/instances/node-10'}], 60, FakeClock())
+        # exact matches only, no substring of node-10
+        assert index.get_url('node-1') is None
+        assert index.get_urls(['node-1', 'node-10']) == {'node-10': 'https://compute/instances/node-10'}
+
+    def test_get_urls_lists_once(self):
+        listings = []
+
+        def list_instances():
+            listings.append(True)
+            return [{'instance': 'https://compute/instances/node-10'}]
+
+        index = cluster_update.managed_instance_index(list_instances, 60, FakeClock())
+        assert index.get_urls(['node-1', 'node-2', 'node-10']) == {'node-10': 'https://compute/instances/node-10'}
+        assert len(listings) == 1
+
+        # names missing from a cached listing list the group once more
+        assert index.get_urls(['node-1', 'node-2', 'node-3']) == {}
+        assert len(listings) == 2
+        assert index.get_urls(['node-10']) == {'node-10': 'https://compute/instances/node-10'}
+        assert len(listings) == 2
+
+
+class TestGceClusterControl:
+
+    def test_configure_managed_group_name(self):
+        gce, _ = get_test_gce({'gke-prod-highmem-pool-0df1a536-grp': [], 'gke-stat28-pool-grp': []})
+        assert gce.group == 'gke-prod-highmem-pool-0df1a536-grp'
+
+    def test_shutdown_specified_node(self):
+        gce, compute = get_test_gce({'gke-prod-pool-grp': ['node-1', 'node-10', 'node-11']})
+        gce.shutdown_specified_node('node-1')
+        gce.shutdown_specified_node('node-11')
+        assert gce.shutdown_specified_node('no-such-node') is None
+        assert compute.groups['gke-prod-pool-grp'] == ['node-10']
+        # one listing for both deletions, one more for the unknown name
+        assert [call[0] for call in compute.calls] == [
+            'listManagedInstances', 'deleteInstances', 'deleteInstances', 'listManagedInstances']
+
+        gce.reset_cache()
+        gce.shutdown_specified_node('node-10')
+        assert compute.calls[-2][0] == 'listManagedInstances'
+        assert compute.calls[-1] == ('deleteInstances', 'gke-prod-pool-grp',
+                                     {'instances': [compute.instance_url('node-10')]})
+
+    def test_shutdown_nodes(self):
+        gce, compute = get_test_gce({'gke-prod-pool-grp': ['node-%i' % i for i in range(5)]})
+        gce.options.delete_batch_size = 3
+        result = gce.shutdown_nodes(['node-0', 'node-1', 'no-such-node', 'node-2', 'node-3'])
+        assert result == {
+            'node-0': cluster_update.SHUTDOWN_REQUESTED,
+            'node-1': cluster_update.SHUTDOWN_REQUESTED,
+            'node-2': cluster_update.SHUTDOWN_REQUESTED,
+            'node-3': cluster_update.SHUTDOWN_REQUESTED,
+            'no-such-node': cluster_update.SHUTDOWN_NOT_FOUND
+        }
+        assert compute.groups['gke-prod-pool-grp'] == ['node-4']
+        deletions = [call[2]['instances'] for call in compute.calls if call[0] == 'deleteInstances']
+        assert deletions == [
+            [compute.instance_url('node-0'), compute.instance_url('node-1'), compute.instance_url('node-2')],
+            [compute.instance_url('node-3')]
+        ]
+
+    def test_shutdown_nodes_failure(self):
+        gce, compute = get_test_gce({'gke-prod-pool-grp': ['node-0', 'node-1']})
+        compute.failing_requests.add('deleteInstances')
+        assert gce.shutdown_nodes(['node-0', 'node-1']) == {
+            'node-0': cluster_update.SHUTDOWN_FAILED,
+            'node-1': cluster_update.SHUTDOWN_FAILED
+        }
+
+    def test_add_new_node(self):
+        gce, compute = get_test_gce({'gke-prod-pool-grp': []})
+        gce.add_new_node(20)
+        assert compute.calls == [('resize', 'gke-prod-pool-grp', 20)]
+
+    def test_get_target_size(self):
+        gce, compute = get_test_gce({'gke-prod-pool-grp': ['gke-prod-pool-a', 'gke-prod-pool-b']})
+        assert gce.get_target_size() == 2
+        assert compute.calls == [('get', 'gke-prod-pool-grp')]
+
+    def test_get_operation_status(self):
+        gce, compute = get_test_gce({'gke-prod-pool-grp': []})
+        operation = gce.add_new_node(20)
+        compute.operations['operation-resize'] = {'name': 'operation-resize', 'status': 'RUNNING'}
+        check_expected(gce.get_operation_status, [operation], str, 'RUNNING')
+        compute.operations['operation-resize'] = {'name': 'operation-resize', 'status': 'DONE'}
+        check_expected(gce.get_operation_status, [operation], str, cluster_update.OPERATION_DONE)
+
+    def test_node_pools(self):
+        options = settings.settings()
+        options.node_pools = ["highmem,highmem-pool,13Gi,2,0.148,0,40", "spot,spot-pool,13Gi,2,0.03,0,10,preemptible"]
+        compute = ComputeApiTest({
+            'gke-prod-highmem-pool-grp': ['gke-prod-highmem-pool-1', 'gke-prod-highmem-pool-2'],
+            'gke-prod-spot-pool-grp': ['gke-prod-spot-pool-1'],
+            'gke-prod-default-grp': ['gke-prod-default-1']})
+        gce = cluster_update.gce_cluster_control(options, compute)
+        assert gce.groups == {'highmem': 'gke-prod-highmem-pool-grp', 'spot': 'gke-prod-spot-pool-grp'}
+
+        gce.add_new_node(12, 'spot')
+        assert compute.calls[-1] == ('resize', 'gke-prod-spot-pool-grp', 12)
+
+        result = gce.shutdown_nodes(['gke-prod-highmem-pool-2', 'gke-prod-spot-pool-1', 'gke-prod-default-1'])
+        assert result == {
+            'gke-prod-highmem-pool-2': cluster_update.SHUTDOWN_REQUESTED,
+            'gke-prod-spot-pool-1': cluster_update.SHUTDOWN_REQUESTED,
+            'gke-prod-default-1': cluster_update.SHUTDOWN_NOT_FOUND
+        }
+        assert compute.groups == {
+            'gke-prod-highmem-pool-grp': ['gke-prod-highmem-pool-1'],
+            'gke-prod-spot-pool-grp': [],
+            'gke-prod-default-grp': ['gke-prod-default-1']}
+        # each group is listed once, and the node of no pool in none
+        assert sorted(call[1] for call in compute.calls if call[0] == 'listManagedInstances') == [
+            'gke-prod-highmem-pool-grp', 'gke-prod-spot-pool-grp']
+
+    def test_node_pools_priced_by_machine_type(self, tmp_path):
+        options = settings.settings()
+        options.node_pools = ["spot,spot-pool,13Gi,2,n1-highmem-2,0,10,preemptible"]
+        options.price_table = str(tmp_path / "prices.json")
+        with open(options.price_table, "w") as table_file:
+            json.dump({"n1-highmem-2": {"hourly": 0.1184, "preemptible": 0.025}}, table_file)
+        compute = ComputeApiTest({'gke-prod-spot-pool-grp': []})
+        gce = cluster_update.gce_cluster_control(options, compute)
+        assert [(pool.name, pool.price) for pool in gce.pools] == [('spot', 0.025)]
+        assert gce.groups == {'spot': 'gke-prod-spot-pool-grp'}
+
+        # pools parsed by the caller are used as they are
+        parsed = pools.parse_node_pools(["spot,spot-pool,13Gi,2,0.03,0,10,preemptible"])
+        gce = cluster_update.gce_cluster_control(options, compute, parsed)
+        assert gce.pools is parsed
@@ -0,0 +1,117 @@
+import threading
+import time
+
+from autoscaler import clusters, settings
+
+
+class FakeAutoscaler:
+
+    attempts = []
+
+    def __init__(self, options):
+        FakeAutoscaler.attempts.append(options.context)
+        if options.context == "missing":
+            # as k8s_control does for a context it cannot find
+            raise SystemExit(1)
+        self.context = options.context
+        self.thread_names = []
+        self.waited = False
+
+    def scale(self):
+        self.thread_names.append(threading.current_thread().name)
+        if self.context == "failing":
+            raise RuntimeError("API server unreachable")
+
+    def wait_for_new_nodes(self):
+        self.waited = True
+
+    def update_state(self, pods, nodes):
+        pass
+
+    def get_k8s(self):
+        return self
+
+    def get_core_api(self):
+        return None
+
+
+class FakeMirror:
+
+    def __init__(self, v1):
+        pass
+
+    def set_on_change(self, callback):
+        pass
+
+    def start(self):
+        pass
+
+    def resync(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_pods(self):
+        return []
+
+    def get_nodes(self):
+        return []
+
+
+def make_scheduler(contexts):
+    options = settings.settings()
+    FakeAutoscaler.attempts = []
+    return clusters.cluster_scheduler(
+        [clusters.get_cluster_options(options, context) for context in contexts],
+        workers=2, autoscaler_factory=FakeAutoscaler, mirror_factory=FakeMirror)
+
+
+class TestClusterOptions:
+
+    def test_cluster_file(self):
+        assert clusters.get_cluster_file("", "prod") == ""
+        assert clusters.get_cluster_file("/var/lib/autoscaler/state.json", "prod") == \
+            "/var/lib/autoscaler/state-prod.json"
+        assert clusters.get_cluster_file("trace.jsonl.gz", "stat28") == "trace-stat28.jsonl.gz"
+        assert clusters.get_cluster_file("history", "prob140") == "history-prob140"
+
+    def test_cluster_options(self):
+        options = settings.settings()
+        options.state_file = "state.json"
+        options.trace_file = ""
+        prod = clusters.get_cluster_options(options, "prod")
+        stat28 = clusters.get_cluster_options(options, "stat28", "stat28-pool")
+        assert (prod.context, prod.context_cloud, prod.state_file) == ("prod", "prod", "state-prod.json")
+        assert (stat28.context, stat28.context_cloud, stat28.state_file) == ("stat28", "stat28-pool", "state-stat28.json")
+        assert prod.trace_file == ""
+        assert options.state_file == "state.json"
+
+
+class TestClusterScheduler:
+
+    def test_scale_once(self):
+        scheduler = make_scheduler(["prod", "missing", "failing", "datahub"])
+        assert scheduler.scale_once() == ["missing", "failing"]
+        # the clusters that failed did not stop the others
+        for context in ["prod", "datahub"]:
+            autoscaler = scheduler._autoscalers[context]
+            assert autoscaler.thread_names == [context]
+            assert autoscaler.waited
+        assert sorted(FakeAutoscaler.attempts) == ["datahub", "failing", "missing", "prod"]
+
+    def test_daemons(self):
+        scheduler = make_scheduler(["prod", "missing"])
+        threads = scheduler.start_daemons(retry_interval=0.01)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and not (
+                "prod" in scheduler._autoscalers and scheduler._autoscalers["prod"].thread_names and
+                FakeAutoscaler.attempts.count("missing") >= 3):
+            time.sleep(0.01)
+        scheduler.stop()
+        for thread in threads:
+            thread.join(10)
+            assert not thread.is_alive()
+        assert scheduler._autoscalers["prod"].thread_names[0] == "prod"
+        # the cluster that failed to start is tried again
+        assert FakeAutoscaler.attempts.count("missing") >= 3
@@ -0,0 +1,215 @@
+import threading
+import time
+
+from autoscaler import daemon, settings
+from .core_v1_api_test import CoreV1ApiTest, WatchTest
+from .test_autoscaler import AutoscalerTest
+from .testing_utils import FakeClock, make_node_object, make_pod_object, objdict
+
+
+class RecordingLock:
+
+    """Records the scaling passes run when it is acquired"""
+
+    def __init__(self):
+        self.autoscaler = None
+        self.held_during = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.held_during.append(self.autoscaler.passes)
+        return False
+
+
+class CountingAutoscaler(AutoscalerTest):
+
+    def __init__(self, options):
+        AutoscalerTest.__init__(self, options)
+        self.passes = 0
+
+    def scale(self):
+        self.passes += 1
+
+
+class FlakyCoreV1Api(CoreV1ApiTest):
+
+    """Fails the first `failures` listings of nodes"""
+
+    def __init__(self, failures):
+        CoreV1ApiTest.__init__(self)
+        self.failures = failures
+        self.node_listings = 0
+
+    def list_node(self):
+        self.node_listings += 1
+        if self.node_listings <= self.failures:
+            raise ConnectionError("API server unreachable")
+        return CoreV1ApiTest.list_node(self)
+
+
+class BrokenWatch:
+
+    def stream(self, func, **kwargs):
+        raise ConnectionError("API server unreachable")
+
+    def stop(self):
+        pass
+
+
+class TestClusterMirror:
+
+    _v1 = CoreV1ApiTest()
+
+    def setup_method(self):
+        self._mirror = daemon.cluster_mirror(self._v1, watcher_factory=WatchTest)
+        self._mirror.resync()
+
+    def test_resync(self):
+        assert len(self._mirror.get_nodes()) == 17
+        assert len(self._mirror.get_pods()) == 84
+
+    def test_apply_events(self):
+        self._v1.events['list_pod_for_all_namespaces'] = [
+            {'type': 'ADDED', 'object': make_pod_object("jupyter-a", "gke-prod-highmem-pool-custom-wwk5", "Pending", "10")},
+            {'type': 'MODIFIED', 'object': make_pod_object("jupyter-a", "gke-prod-highmem-pool-custom-wwk5", "Pending", "11")},
+            {'type': 'MODIFIED', 'object': make_pod_object("jupyter-a", "gke-prod-highmem-pool-custom-wwk5", "Running", "12")},
+        ]
+        relevant = []
+        self._mirror.set_on_change(lambda: relevant.append(True))
+        self._mirror.watch_once(daemon.PODS)
+
+        assert len(self._mirror.get_pods()) == 85
+        assert len(relevant) == 2
+        assert self._mirror.get_resource_version(daemon.PODS) == "12"
+
+        self._v1.events['list_pod_for_all_namespaces'] = [
+            {'type': 'DELETED', 'object': make_pod_object("jupyter-a", "gke-prod-highmem-pool-custom-wwk5", "Running", "13")},
+        ]
+        self._mirror.watch_once(daemon.PODS)
+        assert len(self._mirror.get_pods()) == 84
+        assert len(relevant) == 3
+        # the second watch resumes where the first one stopped
+        assert WatchTest.calls[-1] == ('list_pod_for_all_namespaces', {'timeout_seconds': 300, 'resource_version': '12'})
+
+    def test_node_heartbeat_is_irrelevant(self):
+        assert not self._mirror.apply_event(daemon.NODES, {
+            'type': 'MODIFIED', 'object': make_node_object("gke-prod-highmem-pool-custom-wwk5", False, "20", ready=True)})
+        assert self._mirror.apply_event(daemon.NODES, {
+            'type': 'MODIFIED', 'object': make_node_object("gke-prod-highmem-pool-custom-wwk5", True, "21", ready=True)})
+        assert self._mirror.get_resource_version(daemon.NODES) == "21"
+
+    def test_node_becoming_ready_is_relevant(self):
+        assert self._mirror.apply_event(daemon.NODES, {'type': 'ADDED', 'object': make_node_object("new-node", ready=False)})
+        assert not self._mirror.apply_event(daemon.NODES, {
+            'type': 'MODIFIED', 'object': make_node_object("new-node", resource_version="2", ready=False)})
+        assert self._mirror.apply_event(daemon.NODES, {
+            'type': 'MODIFIED', 'object': make_node_object("new-node", resource_version="3", ready=True)})
+
+    def test_expired_watch_lists_again(self):
+        self._mirror.apply_event(daemon.NODES, {'type': 'ADDED', 'object': make_node_object("new-node")})
+        assert len(self._mirror.get_nodes()) == 18
+        assert self._mirror.apply_event(daemon.NODES, {
+            'type': 'ERROR', 'object': objdict(code=410), 'raw_object': {'code': 410}})
+        assert len(self._mirror.get_nodes()) == 17
+
+    def test_watch_survives_failed_listing(self):
+        v1 = FlakyCoreV1Api(failures=3)
+        mirror = daemon.cluster_mirror(v1, watcher_factory=BrokenWatch, min_backoff=0.001, max_backoff=0.004)
+        thread = threading.Thread(target=mirror._watch_forever, args=(daemon.NODES,), daemon=True)
+        thread.start()
+        deadline = time.monotonic() + 10
+        while v1.node_listings < 6 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        # the watch keeps listing again after the listings that failed
+        assert thread.is_alive()
+        assert len(mirror.get_nodes()) == 17
+        mirror.stop()
+        thread.join(10)
+        assert not thread.is_alive()
+
+
+class TestScaleDaemon:
+
+    _v1 = CoreV1ApiTest()
+
+    def setup_method(self):
+        self._clock = FakeClock()
+        self._autoscaler = CountingAutoscaler(settings.settings())
+        self._mirror = daemon.cluster_mirror(self._v1, watcher_factory=WatchTest)
+        self._daemon = daemon.scale_daemon(
+            self._autoscaler, self._mirror, debounce=10, resync_interval=300, clock=self._clock)
+        self._mirror.resync()
+
+    def test_first_poll_scales(self):
+        assert self._daemon.poll()
+        assert self._autoscaler.passes == 1
+        assert len(self._autoscaler.get_k8s().get_nodes()) == 17
+
+    def test_debounce(self):
+        self._daemon.poll()
+        self._clock.now = 100
+        self._v1.events['list_node'] = [
+            {'type': 'ADDED', 'object': make_node_object("new-node-1")},
+            {'type': 'ADDED', 'object': make_node_object("new-node-2")},
+        ]
+        self._mirror.watch_once(daemon.NODES)
+        assert self._daemon.next_timeout() == 10
+
+        self._clock.now = 105
+        assert not self._daemon.poll()
+        self._clock.now = 110
+        assert self._daemon.poll()
+        assert self._autoscaler.passes == 2
+        assert len(self._autoscaler.get_k8s().get_nodes()) == 19
+        assert not self._daemon.poll()
+
+    def test_resync_interval(self):
+        self._daemon.poll()
+        # a node the watch never reported gone
+        self._mirror._objects[daemon.NODES]["gone"] = make_node_object("gone")
+        self._clock.now = 299
+        assert not self._daemon.poll()
+        assert self._daemon.next_timeout() == 1
+        self._clock.now = 300
+        assert self._daemon.poll()
+        assert self._autoscaler.passes == 2
+        # the mirror was listed again before the pass
+        assert len(self._autoscaler.get_k8s().get_nodes()) == 17
+
+    def test_resync_fails(self):
+        mirror = daemon.cluster_mirror(FlakyCoreV1Api(failures=2), watcher_factory=WatchTest)
+        mirror._objects[daemon.NODES]["gone"] = make_node_object("gone")
+        scale_daemon = daemon.scale_daemon(self._autoscaler, mirror, debounce=10, resync_interval=300, clock=self._clock)
+        scale_daemon.poll()
+        self._clock.now = 300
+        # no pass on the stale mirror, but another listing soon
+        assert not scale_daemon.poll()
+        assert scale_daemon.next_timeout() == 10
+        self._clock.now = 310
+        assert not scale_daemon.poll()
+        self._clock.now = 320
+        assert scale_daemon.poll()
+        assert self._autoscaler.passes == 2
+        assert len(self._autoscaler.get_k8s().get_nodes()) == 17
+
+    def test_max_wait(self):
+        self._daemon.poll()
+        # a change every five seconds never lets the debounce settle
+        for step in range(1, 13):
+            self._clock.now = 100 + 5 * step
+            self._daemon.notify()
+            assert not self._daemon.poll()
+        assert self._daemon.next_timeout() == 5
+        self._clock.now = 165
+        assert self._daemon.poll()
+        assert self._autoscaler.passes == 2
+
+    def test_pass_lock(self):
+        lock = RecordingLock()
+        lock.autoscaler = self._autoscaler
+        scale_daemon = daemon.scale_daemon(
+            self._autoscaler, self._mirror, debounce=10, resync_interval=300, clock=self._clock, pass_lock=lock)
+        assert scale_daemon.poll()
+        assert lock.held_during == [1]
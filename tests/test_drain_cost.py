@@ -0,0 +1,45 @@
+from autoscaler import drain_cost, settings
+from autoscaler.cluster_snapshot import ClusterSnapshot
+from .test_kubernetes_control import get_test_k8s
+from .testing_utils import check_expected, make_node, make_pod
+
+NOW = 1500000000
+
+
+class TestDrainCost:
+
+    _options = settings.settings()
+
+    def test_estimate_pod_remaining_time(self):
+        check_expected(drain_cost.estimate_pod_remaining_time, [0, self._options], int, 7200)
+        check_expected(drain_cost.estimate_pod_remaining_time, [None, self._options], int, 7200)
+        check_expected(drain_cost.estimate_pod_remaining_time, [1800, self._options], int, 5400)
+        # idle since the end of its session, culled within the window left
+        check_expected(drain_cost.estimate_pod_remaining_time, [5400, self._options], int, 1800)
+        check_expected(drain_cost.estimate_pod_remaining_time, [7199, self._options], int, 1)
+        # outlived the cull window, so still in use
+        check_expected(drain_cost.estimate_pod_remaining_time, [10000, self._options], int, 3600)
+
+    def test_get_drain_costs(self):
+        snapshot = ClusterSnapshot([
+            # one young 12 GiB notebook
+            make_pod('node-big', '12Gi', start_time=NOW - 60),
+            # three small notebooks running for hours
+            make_pod('node-small', '256Mi', start_time=NOW - 3 * 3600),
+            make_pod('node-small', '256Mi', start_time=NOW - 4 * 3600),
+            make_pod('node-small', '256Mi', start_time=NOW - 5 * 3600),
+            make_pod(None, '1Gi'),
+        ], [make_node('node-big', '52Gi', '8'), make_node('node-small', '52Gi', '8'), make_node('node-empty', '52Gi', '8')], ['student'])
+        costs = drain_cost.get_drain_costs(snapshot, self._options, NOW)
+        assert costs == {
+            'node-big': (7140, 12884901888),
+            'node-small': (3600, 805306368),
+            'node-empty': (0, 0)
+        }
+        assert sorted(costs, key=costs.get) == ['node-empty', 'node-small', 'node-big']
+
+    def test_fixture_nodes(self):
+        k8s = get_test_k8s()
+        costs = drain_cost.get_drain_costs(k8s.get_snapshot(), self._options, NOW)
+        assert len(costs) == 17
+        assert costs['gke-prod-highmem-pool-custom-wwk5'] == (0, 0)
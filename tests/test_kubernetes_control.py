@@ -1,4 +1,5 @@
 import pytest
+import time
 
 from copy import deepcopy
 from autoscaler import kubernetes_control, kubernetes_control_test, settings
@@ -126,6 +127,38 @@ class TestKubernetesControl:
         assert node_name in k8s._v1.new_nodes
         assert str(k8s._v1.new_nodes[node_name]) == expected
 
+    def test_set_unschedulable_bulk(self):
+        k8s = deepcopy(self._k8s)
+        k8s._v1.failing_nodes = {'node-3'}
+        node_names = ['node-%i' % i for i in range(6)]
+        result = k8s.set_unschedulable_bulk(node_names, True)
+        assert result.succeeded == ['node-0', 'node-1', 'node-2', 'node-4', 'node-5']
+        assert list(result.failed) == ['node-3']
+        assert sorted(k8s._v1.new_nodes) == result.succeeded
+        assert k8s.set_unschedulable_bulk([], True).succeeded == []
+
+        with pytest.raises(AssertionError):
+            k8s.set_unschedulable_bulk(['gke-prod-highmem-pool-0df1a536-wvjl'], True)
+
+    def test_set_unschedulable_bulk_concurrency(self):
+        k8s = deepcopy(self._k8s)
+        k8s._v1.patch_latency = 0.05
+        node_names = ['node-%i' % i for i in range(20)]
+
+        start = time.perf_counter()
+        for node_name in node_names[:10]:
+            k8s.set_unschedulable(node_name, True)
+        serial = time.perf_counter() - start
+
+        k8s._options.patch_workers = 10
+        start = time.perf_counter()
+        result = k8s.set_unschedulable_bulk(node_names, True)
+        concurrent = time.perf_counter() - start
+
+        assert len(result.succeeded) == 20
+        # twice the nodes in well under the serial time
+        assert concurrent < serial / 2
+
     def test_get_total_cluster_memory_usage(self):
         check_expected(self._k8s.get_total_cluster_memory_usage, [], int, 33822867456)
 
@@ -193,3 +226,20 @@ gke-prod-highmem-pool-custom-wwk6\t0\tU\tP
         k8s_test.set_unschedulable(node_name, value=test_value)
         assert k8s_test.is_test() is True
         assert node_name not in k8s_test._v1.new_nodes
+
+
+class TestContextClient:
+
+    def test_context_client(self, monkeypatch):
+        loaded = []
+        monkeypatch.setattr(kubernetes_control.config, "list_kube_config_contexts", lambda: (
+            [{"name": "gke_data8_us-central1-a_prod"}, {"name": "gke_data8_us-central1-a_stat28"}], None))
+        monkeypatch.setattr(kubernetes_control.config, "new_client_from_config", lambda context: loaded.append(context) or context)
+        monkeypatch.setattr(kubernetes_control.config, "load_kube_config", None)
+        assert kubernetes_control.get_context_client("stat28") == (
+            "gke_data8_us-central1-a_stat28", "gke_data8_us-central1-a_stat28")
+        assert loaded == ["gke_data8_us-central1-a_stat28"]
+        with pytest.raises(LookupError):
+            kubernetes_control.get_context_client("prob140")
+        with pytest.raises(ValueError):
+            kubernetes_control.get_context_client("gke_data8")
@@ -0,0 +1,71 @@
+import calendar
+import time
+
+from autoscaler import listing, records, settings
+from .core_v1_api_test import CoreV1ApiTest
+from .test_kubernetes_control import get_test_k8s
+
+
+def list_test_pods(v1, page_size=10):
+    options = settings.settings()
+    return listing.list_pods(
+        v1, listing.get_pod_field_selector(options), listing.get_pod_label_selector(options), page_size)
+
+
+class TestListing:
+
+    def test_selectors(self):
+        options = settings.settings()
+        options.omit_namespaces = ["kube-system", "tmp"]
+        options.omit_labels = ["", "hub"]
+        assert listing.get_pod_field_selector(options) == (
+            "status.phase!=Succeeded,status.phase!=Failed,status.phase!=Unknown,"
+            "metadata.namespace!=kube-system,metadata.namespace!=tmp")
+        assert listing.get_pod_label_selector(options) == "!hub"
+        options.omit_labels = [""]
+        assert listing.get_pod_label_selector(options) == ""
+
+    def test_pages(self):
+        v1 = CoreV1ApiTest()
+        pods = list_test_pods(v1)
+        # 28 pods outside kube-system, 10 per page
+        assert len(pods) == 28
+        assert [request.get("continue") for request in v1.api_client.requests] == [None, "10", "20"]
+        assert all(pod.namespace != "kube-system" for pod in pods)
+
+    def test_same_pods_as_full_listing(self):
+        k8s = get_test_k8s()
+        expected = k8s._filter_pods([records.pod_record_from_model(pod)
+                                     for pod in CoreV1ApiTest().list_pod_for_all_namespaces().items])
+        pods = list_test_pods(CoreV1ApiTest())
+
+        def describe(pod):
+            return (pod.namespace, pod.name, pod.node_name, pod.memory_request,
+                    pod.cpu_request, pod.phase, pod.image_url)
+        assert [describe(pod) for pod in pods] == [describe(pod) for pod in expected]
+        # the test file holds the start times under their JSON name,
+        # which only the raw listing reads
+        first = next(pod for pod in CoreV1ApiTest().list_pod_for_all_namespaces().items
+                     if pod.metadata.name == pods[0].name)
+        assert pods[0].start_time == calendar.timegm(time.strptime(first.status.startTime, "%Y-%m-%dT%H:%M:%SZ"))
+        assert k8s.get_image_urls() == k8s._get_image_urls()
+
+    def test_nodes(self):
+        v1 = CoreV1ApiTest()
+        nodes = listing.list_nodes(v1, page_size=5)
+        assert len(v1.api_client.requests) == 4
+        assert [node.name for node in nodes] == [
+            node.metadata.name for node in CoreV1ApiTest().list_node().items]
+        assert sum(node.unschedulable for node in nodes) == 2
+
+    def test_expired_listing_starts_over(self):
+        v1 = CoreV1ApiTest()
+        v1.api_client.expire_continue = True
+        assert len(list_test_pods(v1)) == 28
+        assert [request.get("continue") for request in v1.api_client.requests] == [None, "10", None, "10", "20"]
+
+    def test_server_without_paging(self):
+        v1 = CoreV1ApiTest()
+        v1.api_client.paging = False
+        assert len(list_test_pods(v1)) == 28
+        assert len(v1.api_client.requests) == 1
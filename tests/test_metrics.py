@@ -0,0 +1,116 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from autoscaler import metrics, settings
+from .test_autoscaler import AutoscalerTest
+
+
+@pytest.fixture
+def enabled():
+    metrics.REGISTRY.clear()
+    metrics.REGISTRY.enabled = True
+    yield metrics.REGISTRY
+    metrics.REGISTRY.enabled = False
+    metrics.REGISTRY.clear()
+
+
+class TestRegistry:
+
+    def make_registry(self):
+        owner = metrics.registry()
+        owner.enabled = True
+        return owner
+
+    def test_render(self):
+        owner = self.make_registry()
+        calls = metrics.counter(owner, "calls_total", "Calls", ("call",))
+        nodes = metrics.gauge(owner, "nodes", "Nodes")
+        seconds = metrics.histogram(owner, "seconds", "Seconds", buckets=(1, 10))
+        calls.inc('list "all"')
+        calls.inc('list "all"', amount=2)
+        nodes.set(17)
+        for value in (0.5, 2, 20):
+            seconds.observe(value)
+        assert owner.render().splitlines() == [
+            "# HELP calls_total Calls",
+            "# TYPE calls_total counter",
+            'calls_total{call="list \\"all\\""} 3.0',
+            "# HELP nodes Nodes",
+            "# TYPE nodes gauge",
+            "nodes 17.0",
+            "# HELP seconds Seconds",
+            "# TYPE seconds histogram",
+            'seconds_bucket{le="1.0"} 1',
+            'seconds_bucket{le="10.0"} 2',
+            'seconds_bucket{le="+Inf"} 3',
+            "seconds_sum 22.5",
+            "seconds_count 3",
+        ]
+
+    def test_disabled_records_nothing(self):
+        owner = metrics.registry()
+        calls = metrics.counter(owner, "calls_total", "Calls")
+        seconds = metrics.histogram(owner, "seconds", "Seconds")
+        calls.inc()
+        seconds.observe(1)
+        assert calls.get() is None
+        assert seconds.get() is None
+        assert metrics.time_phase("goal") is metrics.api_call("kubernetes", "list_node")
+
+    def test_write_textfile(self, tmp_path):
+        owner = self.make_registry()
+        metrics.gauge(owner, "nodes", "Nodes").set(3)
+        path = str(tmp_path / "autoscaler.prom")
+        owner.write_textfile(path)
+        with open(path) as metrics_file:
+            assert metrics_file.read() == owner.render()
+        assert [entry.name for entry in tmp_path.iterdir()] == ["autoscaler.prom"]
+
+
+class TestInstrumentation:
+
+    def test_api_call_outcomes(self, enabled):
+        with metrics.api_call("gce", "resize"):
+            pass
+        with pytest.raises(ValueError):
+            with metrics.api_call("gce", "resize"):
+                raise ValueError()
+        assert metrics.API_CALLS.get("gce", "resize", "success") == 1
+        assert metrics.API_CALLS.get("gce", "resize", "error") == 1
+        assert metrics.API_CALL_SECONDS.get("gce", "resize")[0] == 2
+
+    def test_scale(self, enabled, tmp_path):
+        options = settings.settings()
+        options.yes = True
+        options.metrics_textfile = str(tmp_path / "autoscaler.prom")
+        scaler = AutoscalerTest(options)
+        scaler.scale()
+        assert metrics.SCALE_PASSES.get() == 1
+        for phase in ("scale", "goal", "cordon", "shutdown"):
+            assert metrics.PHASE_SECONDS.get(phase)[0] == 1
+        assert metrics.NODES.get() == 17
+        assert metrics.GOAL_NODES.get() == scaler._goal
+        assert metrics.CORDONED_NODES.get() is not None
+        with open(options.metrics_textfile) as metrics_file:
+            assert "autoscaler_scale_passes_total 1.0" in metrics_file.read()
+
+    def test_http_endpoint(self, enabled):
+        metrics.NODES.set(5)
+        server = metrics.start_http_server(0, "127.0.0.1")
+        try:
+            url = "http://127.0.0.1:%i" % server.server_address[1]
+            with urllib.request.urlopen(url + "/metrics") as response:
+                assert response.headers["Content-Type"] == metrics.CONTENT_TYPE
+                assert "autoscaler_nodes 5.0" in response.read().decode()
+            with pytest.raises(urllib.error.HTTPError):
+                urllib.request.urlopen(url + "/")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_configure(self):
+        options = settings.settings()
+        assert metrics.configure(options) is None
+        assert not metrics.is_enabled()
@@ -0,0 +1,112 @@
+import pytest
+
+from autoscaler import placement, settings, workload
+from autoscaler.cluster_snapshot import ClusterSnapshot
+from autoscaler.utils import parse_cpu, parse_memory
+from .test_kubernetes_control import get_test_k8s
+from .testing_utils import check_expected, make_node, make_pod
+
+
+def make_snapshot(pods, nodes):
+    return ClusterSnapshot(pods, nodes, ['student'])
+
+
+NODES = [make_node('node-a'), make_node('node-b'), make_node('node-c')]
+
+
+class TestPlacement:
+
+    @pytest.mark.parametrize("strategy", ['first_fit', 'best_fit'])
+    def test_consolidate(self, strategy):
+        snapshot = make_snapshot(
+            [make_pod('node-a'), make_pod('node-a'), make_pod('node-a'),
+             make_pod('node-b'), make_pod('node-c'), make_pod(None)], NODES)
+        result = placement.simulate_placement(snapshot, strategy)
+        assert result.node_count == 2
+        assert result.new_node_count == 0
+        assert result.emptiable_node_names == ['node-c']
+        assert result.unplaced_count == 0
+
+    def test_critical_pods_stay(self):
+        snapshot = make_snapshot(
+            [make_pod('node-a'), make_pod('node-a'), make_pod('node-a'),
+             make_pod('node-b'), make_pod('node-c', labels={}), make_pod(None)], NODES)
+        result = placement.simulate_placement(snapshot)
+        assert result.node_count == 2
+        assert result.emptiable_node_names == ['node-b']
+
+    def test_headroom(self):
+        snapshot = make_snapshot([make_pod('node-a') for _ in range(6)], NODES)
+        check_expected(lambda: placement.simulate_placement(snapshot, headroom=1.0).node_count, [], int, 2)
+        check_expected(lambda: placement.simulate_placement(snapshot, headroom=0.5).node_count, [], int, 3)
+
+    def test_cpu(self):
+        snapshot = make_snapshot([make_pod('node-a', '256Mi', '1500m') for _ in range(3)], NODES)
+        assert placement.simulate_placement(snapshot).node_count == 3
+
+    def test_unschedulable_nodes_emptied_first(self):
+        nodes = [make_node('node-a', unschedulable=True), make_node('node-b'), make_node('node-c')]
+        snapshot = make_snapshot([make_pod('node-a'), make_pod('node-a'), make_pod('node-b')], nodes)
+        result = placement.simulate_placement(snapshot)
+        assert result.node_count == 1
+        assert sorted(result.emptiable_node_names) == ['node-a', 'node-c']
+
+    def test_new_nodes(self):
+        snapshot = make_snapshot([make_pod(None, '3Gi') for _ in range(5)], NODES)
+        result = placement.simulate_placement(snapshot, max_new_nodes=1)
+        assert result.node_count == 4
+        assert result.new_node_count == 1
+        assert result.unplaced_count == 1
+        assert result.emptiable_node_names == []
+
+    def test_oversize_pods(self):
+        snapshot = make_snapshot([make_pod(None, '3Gi'), make_pod(None, '5Gi')], NODES)
+        result = placement.simulate_placement(snapshot, headroom=0.5, max_new_nodes=3)
+        # a pod over the headroom may still take a node to itself
+        assert result.node_count == 1
+        assert result.unplaced_count == 1
+
+    def test_custom_strategy(self):
+        calls = []
+
+        def never_reuse(bins, candidates, memory, cpu):
+            calls.append(memory)
+            return None
+
+        snapshot = make_snapshot([make_pod('node-a') for _ in range(3)], NODES)
+        assert placement.simulate_placement(snapshot, never_reuse).node_count == 3
+        assert len(calls) == 3
+
+    def test_schedule_goal(self):
+        options = settings.settings()
+        options.goal_policy = "placement"
+        options.min_nodes = 1
+        # every pod in the fixtures runs on a critical node
+        check_expected(workload.schedule_goal, [get_test_k8s(), options], int, 15)
+
+
+class TestPendingPlacement:
+
+    def test_cordoned_nodes_first(self):
+        nodes = [make_node('node-a'), make_node('node-b', unschedulable=True),
+                 make_node('node-c', unschedulable=True)]
+        snapshot = make_snapshot([make_pod('node-a', '3Gi'), make_pod('node-b', '3Gi')], nodes)
+        pending = [make_pod(None, '3Gi'), make_pod(None, '1Gi'), make_pod(None, '2Gi')]
+        # the 3Gi and 1Gi pods fit into the empty node-c, the 2Gi pod
+        # in neither the rest of node-c nor node-b
+        result = placement.place_pending_pods(snapshot, pending, max_new_nodes=2)
+        assert result.uncordon_names == ['node-c']
+        assert result.new_node_count == 1
+        assert result.unplaced_count == 0
+
+        result = placement.place_pending_pods(snapshot, pending)
+        assert (result.new_node_count, result.unplaced_count) == (0, 1)
+
+    def test_new_node_shape(self):
+        snapshot = make_snapshot([], [make_node('node-a')])
+        pending = [make_pod(None, '3Gi'), make_pod(None, '3Gi'), make_pod(None, '12Gi')]
+        result = placement.place_pending_pods(snapshot, pending, max_new_nodes=5)
+        assert (result.uncordon_names, result.new_node_count, result.unplaced_count) == ([], 2, 1)
+        result = placement.place_pending_pods(snapshot, pending, max_new_nodes=5,
+                                              new_node_shape=(parse_memory('16Gi'), parse_cpu('4')))
+        assert (result.new_node_count, result.unplaced_count) == (2, 0)
@@ -0,0 +1,115 @@
+import itertools
+import random
+
+import pytest
+
+from autoscaler import pools, pricing
+from autoscaler.records import NodeRecord
+
+GI = 2 ** 30
+
+
+def get_cheapest_price(node_pools, memory, cpu, max_preemptible_share):
+    """Price of the cheapest allocation, trying every one"""
+    best = None
+    for counts in itertools.product(*[range(pool.min_nodes, pool.max_nodes + 1) for pool in node_pools]):
+        shapes = list(zip(counts, node_pools))
+        if sum(count * pool.memory for count, pool in shapes) >= memory and \
+                sum(count * pool.cpu for count, pool in shapes) >= cpu and \
+                sum(count * pool.memory for count, pool in shapes if not pool.preemptible) >= \
+                memory * (1 - max_preemptible_share):
+            price = sum(count * pool.price for count, pool in shapes)
+            if best is None or price < best:
+                best = price
+    return best
+
+
+class TestNodePools:
+
+    def test_parse_node_pools(self):
+        highmem, spot = pools.parse_node_pools([
+            "highmem,highmem-pool,13Gi,2,0.148,2,40", "", "spot, spot-pool, 52Gi, 8, 0.12, 0, 10, preemptible"])
+        assert (highmem.name, highmem.segment, highmem.memory, highmem.cpu, highmem.price) == (
+            "highmem", "highmem-pool", 13 * GI, 2000, 0.148)
+        assert (highmem.min_nodes, highmem.max_nodes, highmem.preemptible) == (2, 40, False)
+        assert (spot.segment, spot.memory, spot.cpu, spot.preemptible) == ("spot-pool", 52 * GI, 8000, True)
+
+    def test_parse_machine_type_prices(self):
+        prices = pricing.price_table({"n1-highmem-2": (0.1184, 0.025)})
+        highmem, spot = pools.parse_node_pools([
+            "highmem,highmem-pool,13Gi,2,n1-highmem-2,2,40", "spot,spot-pool,13Gi,2,n1-highmem-2,0,10,preemptible"],
+            prices)
+        assert (highmem.price, spot.price) == (0.1184, 0.025)
+        for entries in [["highmem,highmem-pool,13Gi,2,n1-highmem-2,2,40"],
+                        ["standard,standard-pool,7.5Gi,2,n1-standard-2,2,40"]]:
+            with pytest.raises(ValueError):
+                pools.parse_node_pools(entries, None if "highmem" in entries[0] else prices)
+
+    def test_parse_invalid_node_pools(self):
+        for entries in [["highmem,highmem-pool,13Gi,2,0.148,2"],
+                        ["highmem,highmem-pool,13Gi,2,0.148,2,40,spot"],
+                        ["highmem,highmem-pool,13Gi,2,0.148,40,2"],
+                        ["a,a-pool,13Gi,2,0.1,0,1", "a,b-pool,13Gi,2,0.1,0,1"]]:
+            with pytest.raises(ValueError):
+                pools.parse_node_pools(entries)
+
+    def test_group_nodes_by_pool(self):
+        node_pools = pools.parse_node_pools(["main,0df1a536,13Gi,2,0.1,0,20", "custom,pool-custom,13Gi,2,0.1,0,5"])
+        nodes = [NodeRecord(name) for name in [
+            "gke-prod-highmem-pool-0df1a536-17c7", "gke-prod-highmem-pool-custom-wwk5", "gke-prod-default-abcd"]]
+        assert pools.get_node_pool(node_pools, nodes[1].name).name == "custom"
+        assert pools.get_node_pool(node_pools, nodes[2].name) is None
+        grouped = pools.group_nodes_by_pool(node_pools, nodes)
+        assert grouped == {"main": [nodes[0]], "custom": [nodes[1]]}
+
+
+class TestAllocate:
+
+    def test_cheapest_mix(self):
+        node_pools = [pools.node_pool("highmem", "highmem", 13 * GI, 2000, 0.148, 0, 10),
+                      pools.node_pool("standard", "standard", 7.5 * GI, 2000, 0.095, 0, 10)]
+        # 24Gi: two highmem nodes cost less than four standard nodes
+        result = pools.allocate(node_pools, 24 * GI, 0)
+        assert result.feasible
+        assert result.counts == {"highmem": 2, "standard": 0}
+        assert result.price == pytest.approx(0.296)
+        # 20Gi: one of each beats both
+        assert pools.allocate(node_pools, 20 * GI, 0).counts == {"highmem": 1, "standard": 1}
+        # CPU bound: standard nodes give the same CPU for less
+        assert pools.allocate(node_pools, 1 * GI, 8000).counts == {"highmem": 0, "standard": 4}
+
+    def test_bounds_and_preemptible_share(self):
+        node_pools = [pools.node_pool("highmem", "highmem", 13 * GI, 2000, 0.148, 2, 10),
+                      pools.node_pool("spot", "spot", 13 * GI, 2000, 0.03, 0, 10, preemptible=True)]
+        assert pools.allocate(node_pools, 0, 0).counts == {"highmem": 2, "spot": 0}
+        assert pools.allocate(node_pools, 100 * GI, 0, 1.0).counts == {"highmem": 2, "spot": 6}
+        # at most half the memory on preemptible nodes
+        assert pools.allocate(node_pools, 100 * GI, 0, 0.5).counts == {"highmem": 4, "spot": 4}
+        assert pools.allocate(node_pools, 100 * GI, 0, 0.0).counts == {"highmem": 8, "spot": 0}
+
+    def test_infeasible(self):
+        node_pools = [pools.node_pool("highmem", "highmem", 13 * GI, 2000, 0.148, 0, 3)]
+        result = pools.allocate(node_pools, 100 * GI, 0)
+        assert not result.feasible
+        assert result.counts == {"highmem": 3}
+        assert pools.allocate([], 1, 0).feasible is False
+
+    def test_same_price_as_exhaustive_search(self):
+        node_pools = [pools.node_pool("highmem", "highmem", 13 * GI, 2000, 0.148, 1, 6),
+                      pools.node_pool("standard", "standard", 7.5 * GI, 2000, 0.095, 0, 6),
+                      pools.node_pool("large", "large", 52 * GI, 8000, 0.59, 0, 2),
+                      pools.node_pool("spot", "spot", 13 * GI, 2000, 0.03, 0, 5, preemptible=True)]
+        rng = random.Random(0)
+        for _ in range(50):
+            memory = rng.uniform(0, 250) * GI
+            cpu = rng.uniform(0, 40000)
+            share = rng.choice([0, 0.3, 1])
+            result = pools.allocate(node_pools, memory, cpu, share, gap=0)
+            expected = get_cheapest_price(node_pools, memory, cpu, share)
+            if expected is None:
+                assert not result.feasible
+            else:
+                assert result.feasible and result.price == pytest.approx(expected)
+                # within the default gap of the cheapest
+                assert expected - 1e-9 <= pools.allocate(node_pools, memory, cpu, share).price <= \
+                    expected / (1 - pools.ALLOCATION_GAP) + 1e-9
@@ -0,0 +1,119 @@
+from autoscaler import prepull, populate, settings
+from .core_v1_api_test import CoreV1ApiTest
+from .test_kubernetes_control import get_test_k8s
+from .testing_utils import FakeClock, make_node
+
+NAMESPACE = "kube-system"
+
+
+class TestPrepull:
+
+    _k8s = get_test_k8s()
+
+    def test_get_missing_pulls(self):
+        nodes = [make_node('node-1', images=['a:1', 'b:1']), make_node('node-2', images=['a:1']), make_node('node-3', images=[])]
+        assert prepull.get_missing_pulls(nodes, {'a:1', 'b:1'}) == [
+            ('node-2', 'b:1'), ('node-3', 'a:1'), ('node-3', 'b:1')]
+
+    def test_image_presence_index(self):
+        index = prepull.image_presence_index([make_node('node-1', images=['a:1']), make_node('node-2', images=[])])
+        assert index.has_image('node-1', 'a:1')
+        assert not index.has_image('node-2', 'a:1')
+        assert not index.has_image('no-such-node', 'a:1')
+        assert index.get_missing_pulls({'a:1'}, ['node-2', 'node-3']) == [('node-2', 'a:1'), ('node-3', 'a:1')]
+        index.add('node-2', 'a:1')
+        assert index.get_missing_pulls({'a:1'}) == []
+
+    def test_get_missing_pulls_from_fixture(self):
+        pulls = prepull.get_missing_pulls(self._k8s.get_nodes(), self._k8s.get_image_urls())
+        # the sample image is on no node, prob140 is on all but a few
+        assert len(pulls) < 17 * len(self._k8s.get_image_urls())
+        assert ('gke-prod-highmem-pool-0df1a536-2zbs', 'gcr.io/data-8/jupyterhub-k8s-user-prob140:36b2c48') in pulls
+        assert ('gke-prod-highmem-pool-0df1a536-0zc0', 'gcr.io/data-8/jupyterhub-k8s-user-prob140:36b2c48') not in pulls
+
+    def test_make_prepull_pod(self):
+        pod = prepull.make_prepull_pod('node-1', 'a:1', 'autoscaler')
+        assert pod.spec.node_name == 'node-1'
+        assert pod.spec.containers[0].image == 'a:1'
+        assert pod.metadata.labels == {prepull.PREPULL_LABEL: 'autoscaler'}
+        assert pod.metadata.name == prepull.get_prepull_pod_name('node-1', 'a:1')
+        assert pod.metadata.name != prepull.get_prepull_pod_name('node-1', 'b:1')
+
+    def test_progress(self):
+        v1 = CoreV1ApiTest()
+        prepuller = prepull.image_prepuller(v1, NAMESPACE)
+        progress = prepuller.start([('node-1', 'a:1'), ('node-2', 'a:1'), ('node-3', 'a:1')])
+        assert (progress.total, progress.pending) == (3, 3)
+
+        names = [prepull.get_prepull_pod_name(node, 'a:1') for node in ['node-1', 'node-2', 'node-3']]
+        v1.set_pod_phase(NAMESPACE, names[0], 'Succeeded')
+        v1.set_pod_phase(NAMESPACE, names[1], 'Pending', 'ImagePullBackOff')
+        v1.set_pod_phase(NAMESPACE, names[2], 'Pending')
+        progress = prepuller.poll()
+        assert (progress.succeeded, progress.failed, progress.pending) == (1, 1, 1)
+        assert not progress.is_done()
+        assert v1.deleted_pods == names[:2]
+
+        # a second start with the same pulls creates nothing new
+        assert prepuller.start([('node-3', 'a:1')]).total == 3
+
+        clock = FakeClock()
+
+        def sleep(seconds):
+            clock.now += seconds
+
+        progress = prepuller.wait(20, 5, clock, sleep)
+        assert clock.now == 20
+        assert (progress.succeeded, progress.failed, progress.pending) == (1, 2, 0)
+        assert v1.namespaced_pods == {}
+
+    def test_pulled_whatever_the_exit_code(self):
+        v1 = CoreV1ApiTest()
+        prepuller = prepull.image_prepuller(v1, NAMESPACE)
+        prepuller.start([('node-1', 'distroless:1'), ('node-2', 'a:1')])
+        # no `true` in the image, the pull still happened
+        v1.set_pod_phase(NAMESPACE, prepull.get_prepull_pod_name('node-1', 'distroless:1'), 'Failed', exit_code=127)
+        # failed before any container started
+        v1.set_pod_phase(NAMESPACE, prepull.get_prepull_pod_name('node-2', 'a:1'), 'Failed')
+        progress = prepuller.poll()
+        assert (progress.succeeded, progress.failed, progress.pending) == (1, 1, 0)
+
+    def test_per_node_limit(self):
+        v1 = CoreV1ApiTest()
+        prepuller = prepull.image_prepuller(v1, NAMESPACE, per_node=2)
+        prepuller.start([('node-1', image) for image in ['a:1', 'b:1', 'c:1']] + [('node-2', 'a:1')])
+        assert sorted(pod.spec.node_name for pod in v1.namespaced_pods.values()) == ['node-1', 'node-1', 'node-2']
+
+        first = prepull.get_prepull_pod_name('node-1', 'a:1')
+        v1.set_pod_phase(NAMESPACE, first, 'Succeeded')
+        progress = prepuller.poll()
+        assert (progress.succeeded, progress.pending) == (1, 3)
+        # the queued pull took the room left on node-1
+        assert (NAMESPACE, prepull.get_prepull_pod_name('node-1', 'c:1')) in v1.namespaced_pods
+        assert len(v1.namespaced_pods) == 3
+
+    def test_populate_over_ssh(self):
+        options = settings.settings()
+        options.prepull_mode = "ssh"
+        options.prepull_per_node = 1
+        pulled = []
+        pull_image_on_node = populate.pull_image_on_node
+        populate.pull_image_on_node = lambda node_name, image_url, zone: pulled.append((node_name, image_url))
+        try:
+            progress = populate.populate(self._k8s, options)
+        finally:
+            populate.pull_image_on_node = pull_image_on_node
+        expected = prepull.get_missing_pulls(self._k8s.get_nodes(), self._k8s.get_image_urls())
+        assert sorted(pulled) == sorted(expected)
+        assert (progress.total, progress.succeeded) == (len(expected), len(expected))
+
+    def test_populate(self):
+        options = settings.settings()
+        v1 = self._k8s.get_core_api()
+        options.prepull_timeout = 0
+        progress = populate.populate(self._k8s, options)
+        expected = len(prepull.get_missing_pulls(self._k8s.get_nodes(), self._k8s.get_image_urls()))
+        assert progress.total == expected
+        # nothing finished in time, every pod is cleaned up
+        assert progress.failed == expected
+        assert v1.namespaced_pods == {}
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from autoscaler import pricing
+from autoscaler.records import NodeRecord
+
+
+def write_table(tmp_path, table):
+    path = str(tmp_path / "prices.json")
+    with open(path, "w") as table_file:
+        json.dump(table, table_file)
+    return path
+
+
+class TestPriceTable:
+
+    def test_load(self, tmp_path):
+        prices = pricing.load_price_table(write_table(tmp_path, {
+            "n1-highmem-2": {"hourly": 0.1184, "preemptible": 0.025}, "n1-standard-2": 0.095}))
+        assert len(prices) == 2
+        assert prices.get_price("n1-highmem-2") == 0.1184
+        assert prices.get_price("n1-highmem-2", preemptible=True) == 0.025
+        assert prices.get_price("n1-standard-2", preemptible=True) is None
+        assert prices.get_price("n1-standard-4") is None
+
+    def test_load_invalid(self, tmp_path):
+        for table in [[0.1], {"n1-standard-2": "cheap"}, {"n1-standard-2": {"preemptible": 0.02}},
+                      {"n1-standard-2": -1}]:
+            with pytest.raises(ValueError):
+                pricing.load_price_table(write_table(tmp_path, table))
+
+    def test_node_price(self):
+        prices = pricing.price_table({"n1-highmem-2": (0.1184, 0.025)})
+        assert prices.get_node_price(NodeRecord("a", {"beta.kubernetes.io/instance-type": "n1-highmem-2"})) == 0.1184
+        assert prices.get_node_price(NodeRecord("b", {
+            "node.kubernetes.io/instance-type": "n1-highmem-2", "cloud.google.com/gke-preemptible": "true"})) == 0.025
+        assert prices.get_node_price(NodeRecord("c", {"beta.kubernetes.io/instance-type": "e2-small"})) is None
+        assert prices.get_node_price(NodeRecord("d")) is None
+
+
+class TestBilling:
+
+    def test_billed_seconds(self):
+        billing = pricing.billing_model(600, 60)
+        assert billing.get_billed_seconds(0) == 600
+        assert billing.get_billed_seconds(180) == 600
+        assert billing.get_billed_seconds(600) == 600
+        assert billing.get_billed_seconds(601) == 660
+        assert billing.get_billed_seconds(3600) == 3600
+        assert pricing.billing_model(60, 0).get_billed_seconds(90.5) == 90.5
+
+    def test_billing_minimum(self):
+        billing = pricing.billing_model(600, 60)
+        # three minutes into its billing minimum
+        node = NodeRecord("a", creation_time=1000)
+        assert billing.is_within_minimum(node, 1180)
+        assert billing.get_prepaid_seconds(node, 1180) == 420
+        assert not billing.is_within_minimum(node, 1630)
+        assert billing.get_prepaid_seconds(node, 1630) == 30
+        assert not billing.is_within_minimum(NodeRecord("b"), 1180)
+        assert billing.get_prepaid_seconds(NodeRecord("b"), 1180) == 0
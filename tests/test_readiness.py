@@ -0,0 +1,151 @@
+import json
+from types import SimpleNamespace
+
+from autoscaler import readiness
+from autoscaler.cluster_update import OPERATION_DONE
+from .testing_utils import FakeClock, make_node_object
+
+
+class CloudTest:
+
+    """Reports a resize operation as running until `done` is set"""
+
+    def __init__(self):
+        self.done = False
+        self.polls = 0
+        self.failures = 0
+
+    def get_operation_status(self, operation):
+        self.polls += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("compute API unreachable")
+        return OPERATION_DONE if self.done else "RUNNING"
+
+
+class NodeApiTest:
+
+    """Serves the nodes as a single page of raw JSON"""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.lists = 0
+        self.failures = 0
+        self.requests = []
+        self.api_client = self
+
+    def call_api(self, resource_path, method, query_params=None, **kwargs):
+        assert method == "GET" and resource_path == "/api/v1/nodes"
+        self.lists += 1
+        self.requests.append(dict(query_params or ()))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("API server unreachable")
+        return SimpleNamespace(data=json.dumps({"metadata": {}, "items": self.nodes}).encode())
+
+
+def get_tracker(nodes, expected_new=2, **kwargs):
+    clock = FakeClock()
+    cloud = CloudTest()
+    v1 = NodeApiTest(nodes)
+    ready = []
+    tracker = readiness.readiness_tracker(
+        cloud, v1, {'name': 'operation-resize'}, ['node-0'], expected_new, ready.append,
+        initial_delay=5, max_delay=20, timeout=100, workers=0, clock=clock, **kwargs)
+    return tracker, clock, cloud, v1, ready
+
+
+class TestReadinessTracker:
+
+    def test_populates_each_node_once_ready(self):
+        tracker, clock, cloud, v1, ready = get_tracker([make_node_object('node-0', ready=True)])
+        assert not tracker.poll()
+        assert tracker.next_timeout() == 5
+
+        v1.nodes.append(make_node_object('node-1', ready=True))
+        v1.nodes.append(make_node_object('node-2', ready=False))
+        clock.now = 5
+        assert not tracker.poll()
+        assert ready == ['node-1']
+
+        cloud.done = True
+        v1.nodes[2] = make_node_object('node-2', ready=True)
+        clock.now = 10
+        assert tracker.poll()
+        assert ready == ['node-1', 'node-2']
+        assert tracker.get_ready_node_names() == ['node-1', 'node-2']
+
+    def test_backoff(self):
+        tracker, clock, cloud, v1, ready = get_tracker([])
+        delays = []
+        while not tracker.poll():
+            delays.append(tracker.next_timeout())
+            clock.now += tracker.next_timeout()
+        assert delays == [5, 10, 20, 20, 20, 20, 20]
+        # gave up at the timeout
+        assert clock.now == 115
+        assert ready == []
+        # no polling between two due times
+        assert v1.lists == 8
+
+    def test_backoff_resets_on_progress(self):
+        tracker, clock, cloud, v1, ready = get_tracker([], expected_new=3)
+        tracker.poll()
+        clock.now = 5
+        tracker.poll()
+        assert tracker.next_timeout() == 10
+        v1.nodes.append(make_node_object('node-1', ready=True))
+        clock.now = 15
+        tracker.poll()
+        assert tracker.next_timeout() == 5
+
+    def test_survives_api_errors(self):
+        tracker, clock, cloud, v1, ready = get_tracker([make_node_object('node-1', ready=True)], expected_new=1)
+        cloud.failures = 1
+        assert not tracker.poll()
+        assert tracker.next_timeout() == 5
+        v1.failures = 1
+        clock.now = 5
+        assert not tracker.poll()
+        assert tracker.next_timeout() == 10
+        cloud.done = True
+        clock.now = 15
+        assert tracker.poll()
+        assert ready == ['node-1']
+        assert tracker.get_outstanding_count() == 0
+
+    def test_without_operation(self):
+        tracker, clock, cloud, v1, ready = get_tracker([make_node_object('node-1', ready=True)], expected_new=1)
+        tracker = readiness.readiness_tracker(
+            cloud, v1, None, [], 1, ready.append, workers=0, clock=clock, page_size=100)
+        assert tracker.poll()
+        assert cloud.polls == 0
+        assert ready == ['node-1']
+        assert v1.requests[-1] == {'limit': 100}
+
+    def test_background(self):
+        tracker, clock, cloud, v1, ready = get_tracker([make_node_object('node-1', ready=True)], expected_new=1)
+        cloud.done = True
+        tracker.start()
+        tracker.wait()
+        assert ready == ['node-1']
+
+    def test_operations_of_several_pools(self):
+        statuses = {'operation-a': 'RUNNING', 'operation-b': 'RUNNING'}
+
+        class PoolCloudTest:
+
+            def get_operation_status(self, operation):
+                return statuses[operation['name']]
+
+        clock = FakeClock()
+        tracker = readiness.readiness_tracker(
+            PoolCloudTest(), NodeApiTest([]), [{'name': 'operation-a'}, None, {'name': 'operation-b'}],
+            [], 0, lambda name: None, initial_delay=5, max_delay=20, timeout=100, workers=0, clock=clock)
+        assert not tracker.poll()
+        statuses['operation-a'] = OPERATION_DONE
+        clock.now = 5
+        assert not tracker.poll()
+        statuses['operation-b'] = OPERATION_DONE
+        clock.now = 10
+        assert tracker.poll()
@@ -0,0 +1,118 @@
+import json
+from datetime import datetime, timezone
+
+from kubernetes import client
+
+from autoscaler import records
+from .core_v1_api_test import CoreV1ApiTest
+
+
+def load_items(file_name):
+    with open(file_name) as test_file:
+        return json.load(test_file)["items"]
+
+
+def describe_pod(pod):
+    return (pod.namespace, pod.name, pod.node_name, pod.phase,
+            pod.memory_request, pod.cpu_request, pod.image_url)
+
+
+def describe_node(node):
+    return (node.name, node.unschedulable, node.memory_capacity, node.cpu_capacity)
+
+
+class TestRecords:
+
+    def test_pod_from_json(self):
+        record = records.pod_record_from_json({
+            "metadata": {"namespace": "datahub", "name": "jupyter-a", "labels": {"student": ""}},
+            "spec": {"nodeName": "node-1", "containers": [{
+                "env": [{"name": "HOME", "value": "/home"},
+                        {"name": "SINGLEUSER_IMAGE", "value": "data8/notebook:1"}],
+                "resources": {"requests": {"memory": "1Gi", "cpu": "250m"}}}]},
+            "status": {"phase": "Running", "startTime": "2017-07-14T02:40:00Z"}})
+        assert describe_pod(record) == (
+            "datahub", "jupyter-a", "node-1", "Running", 2 ** 30, 250, "data8/notebook:1")
+        assert record.labels == {"student": ""}
+        assert record.start_time == 1500000000
+
+    def test_pod_from_json_without_requests(self):
+        record = records.pod_record_from_json({
+            "metadata": {"name": "pending"}, "spec": {"containers": [{}]}, "status": {"phase": "Pending"}})
+        assert describe_pod(record) == (None, "pending", None, "Pending", 0, 0, None)
+        assert record.start_time is None
+
+    def test_pods_from_json_and_model_agree(self):
+        items = load_items("tests/test-data/pods-all-namespaces.json")
+        for item in items:
+            item["spec"]["nodeName"] = item["spec"].pop("node_name", None)
+        # the test objects hold the requests of the kube-system pods as
+        # tuples, which the model getters cannot index by name
+        from_json = [describe_pod(records.pod_record_from_json(item))
+                     for item in items if item["metadata"]["namespace"] != "kube-system"]
+        from_model = [describe_pod(records.pod_record_from_model(pod))
+                      for pod in CoreV1ApiTest().list_pod_for_all_namespaces().items
+                      if pod.metadata.namespace != "kube-system"]
+        assert len(from_json) == 28
+        assert from_json == from_model
+
+    def test_nodes_from_json_and_model_agree(self):
+        items = load_items("tests/test-data/nodes.json")
+        from_json = [records.node_record_from_json(item) for item in items]
+        from_model = [records.node_record_from_model(node) for node in CoreV1ApiTest().list_node().items]
+        assert [describe_node(node) for node in from_json] == [describe_node(node) for node in from_model]
+        assert from_json[0].memory_capacity == 13317664 * 1024 and from_json[0].cpu_capacity == 2000
+
+    def test_pod_unschedulable(self):
+        item = {"metadata": {"namespace": "datahub", "name": "jupyter-a"}, "spec": {}, "status": {
+            "phase": "Pending", "conditions": [
+                {"type": "PodScheduled", "status": "False", "reason": "Unschedulable"}]}}
+        assert records.pod_record_from_json(item).unschedulable
+        item["status"]["conditions"][0]["status"] = "True"
+        assert not records.pod_record_from_json(item).unschedulable
+        pod = client.V1Pod(
+            metadata=client.V1ObjectMeta(namespace="datahub", name="jupyter-a"),
+            spec=client.V1PodSpec(containers=[client.V1Container(
+                name="notebook", resources=client.V1ResourceRequirements(requests={"memory": "1Gi"}))]),
+            status=client.V1PodStatus(phase="Pending", conditions=[
+                client.V1PodCondition(type="PodScheduled", status="False", reason="Unschedulable")]))
+        assert records.pod_record_from_model(pod).unschedulable
+        pod.status.conditions = None
+        assert not records.pod_record_from_model(pod).unschedulable
+
+    def test_node_creation_time(self):
+        items = load_items("tests/test-data/nodes.json")
+        # 2017-06-22T19:59:56Z
+        assert records.node_record_from_json(items[0]).creation_time == 1498161596
+        node = client.V1Node(
+            metadata=client.V1ObjectMeta(
+                name="node-1", creation_timestamp=datetime(2017, 6, 22, 19, 59, 56, tzinfo=timezone.utc)),
+            spec=client.V1NodeSpec(), status=client.V1NodeStatus(capacity={"memory": "1Gi", "cpu": "2"}))
+        assert records.node_record_from_model(node).creation_time == 1498161596
+        assert records.node_record_from_json(items[-1]).creation_time is None
+
+    def test_node_ready(self):
+        items = load_items("tests/test-data/nodes.json")
+        assert records.node_record_from_json(items[0]).ready
+        # no Ready condition yet
+        del items[-1]["status"]["conditions"]
+        assert not records.node_record_from_json(items[-1]).ready
+        items[0]["status"]["conditions"] = [{"type": "Ready", "status": "False", "reason": "KubeletNotReady"}]
+        assert not records.node_record_from_json(items[0]).ready
+        node = client.V1Node(
+            metadata=client.V1ObjectMeta(name="node-1"), spec=client.V1NodeSpec(),
+            status=client.V1NodeStatus(capacity={"memory": "1Gi", "cpu": "2"}, conditions=[
+                client.V1NodeCondition(type="Ready", status="Unknown")]))
+        assert not records.node_record_from_model(node).ready
+        node.status.conditions[0].status = "True"
+        assert records.node_record_from_model(node).ready
+
+    def test_slots(self):
+        pod = records.PodRecord("default", "a")
+        try:
+            pod.extra = 1
+        except AttributeError:
+            pass
+        else:
+            raise AssertionError("PodRecord accepted an unknown attribute")
+        assert not hasattr(records.NodeRecord("node-1"), "__dict__")
@@ -11,8 +11,33 @@ class TestSettings:
         assert my_settings.optimal_utilization == 0.75
         assert my_settings.min_nodes == 15
         assert my_settings.max_nodes == 75
+        assert my_settings.goal_policy == "utilization"
+        assert my_settings.placement_strategy == "first_fit"
+        assert my_settings.cordon_priority == "drain_cost"
+        assert my_settings.cull_timeout == 3600
+        assert my_settings.expected_session_seconds == 3600
+        assert my_settings.tiebreak_seed == 0
+        assert my_settings.state_file == ""
+        assert my_settings.cordon_dwell == 1800
+        assert my_settings.scale_down_window == 900
+        assert my_settings.node_pools == []
+        assert my_settings.max_preemptible_share == 0.5
+        assert my_settings.price_table == ""
+        assert my_settings.billing_minimum == 600
+        assert my_settings.billing_increment == 60
+        assert my_settings.readiness_initial_delay == 5
+        assert my_settings.readiness_max_delay == 60
+        assert my_settings.readiness_timeout == 900
+        assert my_settings.prepull_workers == 16
+        assert my_settings.prepull_mode == "pods"
+        assert my_settings.prepull_namespace == "kube-system"
+        assert my_settings.prepull_timeout == 600
+        assert my_settings.prepull_poll_interval == 5
+        assert my_settings.prepull_per_node == 2
         assert my_settings.zone == "us-central1-a"
         assert my_settings.project == "92948014362"
+        assert my_settings.instance_index_ttl == 60
+        assert my_settings.delete_batch_size == 500
         assert my_settings.env_delimiter == ":"
         assert my_settings.preemptible_labels == ['']
         assert my_settings.omit_labels == ['']
@@ -23,4 +48,21 @@ class TestSettings:
         assert my_settings.context == ""
         assert my_settings.context_cloud == ""
         assert my_settings.slack_token == ""
+        assert my_settings.slack_window == 2
+        assert my_settings.slack_queue_size == 100
+        assert my_settings.trace_file == ""
+        assert my_settings.forecast_horizon == 0
+        assert my_settings.forecast_file == ""
+        assert my_settings.forecast_interval == 300
+        assert my_settings.forecast_weeks == 4
+        assert my_settings.forecast_trend_window == 1800
+        assert my_settings.metrics_port == 0
+        assert my_settings.metrics_textfile == ""
+        assert my_settings.list_page_size == 500
+        assert my_settings.patch_workers == 10
+        assert my_settings.cluster_workers == 4
+        assert my_settings.cluster_retry_interval == 60
+        assert my_settings.daemon_debounce == 10
+        assert my_settings.daemon_max_wait == 60
+        assert my_settings.daemon_resync_interval == 300
         assert my_settings.default_context == "prod"
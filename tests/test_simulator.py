@@ -0,0 +1,115 @@
+import random
+
+from autoscaler import settings
+from autoscaler.simulator import demand, engine, fakes
+
+GIB = 2 ** 30
+MONDAY = 1503273600
+
+
+def make_cluster(events, node_count=2):
+    cluster = fakes.sim_cluster(4 * GIB, 2000, 120, 60, lambda *event: events.append(event))
+    cluster.add_nodes(node_count, ready=True)
+    return cluster
+
+
+class TestDemand:
+
+    def test_hour_of_week(self):
+        assert demand.hour_of_week(MONDAY) == 0
+        assert demand.hour_of_week(MONDAY + 3600 * 25) == 25
+        assert demand.hour_of_week(MONDAY - 3600) == 167
+
+    def test_next_arrival_skips_quiet_hours(self):
+        rates = [0] * 168
+        rates[10] = 60
+        profile = demand.demand_profile(rates)
+        arrival = profile.next_arrival(MONDAY, random.Random(0))
+        assert MONDAY + 10 * 3600 <= arrival < MONDAY + 11 * 3600
+        assert demand.demand_profile([0] * 168).next_arrival(MONDAY, None) is None
+
+    def test_lab_arrivals(self):
+        profile = demand.demand_profile([0] * 168, lab_hours=[9], lab_size=5, lab_spread=600)
+        rng = random.Random(0)
+        assert profile.lab_arrivals(MONDAY, rng) == []
+        arrivals = profile.lab_arrivals(MONDAY + 9 * 3600, rng)
+        assert len(arrivals) == 5
+        assert all(MONDAY + 9 * 3600 <= arrival <= MONDAY + 9 * 3600 + 600 for arrival in arrivals)
+
+
+class TestSimCluster:
+
+    def test_place_pending_spreads_pods(self):
+        events = []
+        cluster = make_cluster(events)
+        for i in range(3):
+            cluster.arrive(fakes.sim_pod("pod-%i" % i, GIB, 0, 100, {"student": ""}))
+        placed = cluster.place_pending()
+        assert [pod.node for pod in placed] == ["sim-node-1", "sim-node-2", "sim-node-1"]
+        assert [event[1] for event in events] == ["departure"] * 3
+
+    def test_pods_wait_for_boot_and_image(self):
+        events = []
+        cluster = make_cluster(events, node_count=0)
+        cluster.add_nodes(1)
+        cluster.arrive(fakes.sim_pod("pod", GIB, 0, 100, {"student": ""}))
+        assert cluster.place_pending() == []
+        assert cluster.get_booting_count() == 1
+        cluster.now = 120
+        pod, = cluster.place_pending()
+        # booted at 120, image pulled at 180
+        assert pod.start == 180
+        assert events[-1] == (280, "departure", pod)
+
+    def test_unschedulable_and_full_nodes_are_skipped(self):
+        cluster = make_cluster([])
+        cluster.set_unschedulable("sim-node-1", True)
+        cluster.arrive(fakes.sim_pod("big", 3 * GIB, 0, 100, {}))
+        cluster.arrive(fakes.sim_pod("bigger", 3 * GIB, 0, 100, {}))
+        placed = cluster.place_pending()
+        assert [pod.node for pod in placed] == ["sim-node-2"]
+        assert [pod.name for pod in cluster.pending] == ["bigger"]
+
+
+class TestSimulation:
+
+    def run_day(self, seed=0):
+        options = settings.settings()
+        config = engine.simulation_config(weeks=1 / 7, seed=seed)
+        return engine.simulation(options, config, demand.default_profile(peak_rate=60, lab_size=20)).run()
+
+    def test_deterministic(self):
+        first = self.run_day()
+        second = self.run_day()
+        assert list(first.waits) == list(second.waits)
+        assert first.node_hours == second.node_hours
+        assert list(first.columns["nodes"]) == list(second.columns["nodes"])
+
+    def test_follows_demand(self):
+        options = settings.settings()
+        result = self.run_day()
+        assert result.scale_passes == 24 * 12 + 1
+        assert len(result.columns["time"]) == 24 * 4 + 1
+        assert len(result.waits) > 0
+        nodes = result.columns["nodes"]
+        assert min(nodes) >= options.min_nodes
+        assert max(nodes) <= options.max_nodes
+        # the cluster grows for the lab sections of Monday afternoon
+        assert max(nodes) > nodes[0]
+        assert 0 <= result.get_wait_percentile(50) <= result.get_wait_percentile(95) <= result.get_wait_percentile(100)
+
+    def test_options_are_not_changed(self):
+        options = settings.settings()
+        options.test_cloud = True
+        engine.simulation(options, engine.simulation_config(weeks=0))
+        assert options.test_cloud
+
+    def test_write_csv(self, tmp_path):
+        result = engine.simulation_result()
+        result.add_sample(time=0, nodes=3, booting=1, cordoned=0, running=5,
+                          pending=2, requested_memory=GIB, utilization=0.5, goal=4)
+        path = str(tmp_path / "term.csv")
+        result.write_csv(path)
+        with open(path) as csv_file:
+            assert csv_file.read().splitlines() == [
+                ",".join(engine.TIME_SERIES_COLUMNS), "0.0,3.0,1.0,0.0,5.0,2.0,1073741824.0,0.5,4.0"]
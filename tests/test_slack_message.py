@@ -0,0 +1,130 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs
+
+from autoscaler.slack_message import slack_handler
+
+
+class SlackServerTest(HTTPServer):
+
+    """Local stand-in for the Slack Web API recording every post"""
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), SlackRequestHandlerTest)
+        self.posts = []
+        self.connections = set()
+        # set to make the next posts wait before answering
+        self.release = threading.Event()
+        self.release.set()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def get_url(self):
+        return "http://127.0.0.1:%i/api/chat.postMessage" % self.server_address[1]
+
+    def stop(self):
+        self.release.set()
+        self.shutdown()
+        self.server_close()
+
+
+class SlackRequestHandlerTest(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.server.release.wait()
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+        self.server.connections.add(self.client_address)
+        self.server.posts.append({
+            'path': self.path,
+            'authorization': self.headers['Authorization'],
+            'form': {key: values[0] for key, values in parse_qs(body).items()}
+        })
+        response = json.dumps({'ok': True}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def get_test_logger(handler):
+    logger = logging.getLogger("slack-test")
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+class TestSlackHandler:
+
+    def setup_method(self):
+        self._server = SlackServerTest()
+
+    def teardown_method(self):
+        self._server.stop()
+
+    def test_coalesces_within_window(self):
+        handler = slack_handler("xoxb-token", window=60, url=self._server.get_url())
+        logger = get_test_logger(handler)
+        logger.info("%i nodes newly blocked", 2)
+        logger.info("Shut down %d empty nodes", 1)
+        handler.close()
+
+        assert len(self._server.posts) == 1
+        post = self._server.posts[0]
+        assert post['authorization'] == "Bearer xoxb-token"
+        assert "token" not in post['path'] and "token" not in post['form']
+        assert post['form']['text'] == "Cluster autoscaler: 2 nodes newly blocked\nShut down 1 empty nodes"
+        assert post['form']['channel'] == "C510S0Z2L"
+
+    def test_emit_does_not_wait(self):
+        self._server.release.clear()
+        handler = slack_handler("xoxb-token", window=0, url=self._server.get_url())
+        logger = get_test_logger(handler)
+        logger.info("first")
+        # the sender thread is stuck on the server, logging goes on
+        for i in range(10):
+            logger.info("message %i", i)
+        self._server.release.set()
+        handler.close()
+        texts = "\n".join(post['form']['text'] for post in self._server.posts)
+        assert "message 9" in texts
+
+    def test_drop_oldest(self):
+        self._server.release.clear()
+        handler = slack_handler("xoxb-token", window=0, capacity=3, url=self._server.get_url())
+        logger = get_test_logger(handler)
+        logger.info("in flight")
+        handler.flush(0.2)
+        for i in range(5):
+            logger.info("message %i", i)
+        self._server.release.set()
+        handler.close()
+        assert self._server.posts[-1]['form']['text'] == \
+            "Cluster autoscaler: (2 earlier messages dropped)\nmessage 2\nmessage 3\nmessage 4"
+
+    def test_flush(self):
+        handler = slack_handler("xoxb-token", window=60, url=self._server.get_url())
+        logger = get_test_logger(handler)
+        logger.info("first")
+        handler.flush()
+        logger.info("second")
+        handler.flush()
+        assert [post['form']['text'] for post in self._server.posts] == [
+            "Cluster autoscaler: first", "Cluster autoscaler: second"]
+        # both posts reuse the pooled connection
+        assert len(self._server.connections) == 1
+        handler.close()
+
+    def test_without_token(self):
+        handler = slack_handler("", url=self._server.get_url())
+        get_test_logger(handler).info("not sent")
+        handler.close()
+        assert self._server.posts == []
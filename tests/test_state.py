@@ -0,0 +1,46 @@
+import os
+
+from autoscaler import state
+
+
+class TestScalingState:
+
+    def test_flags(self):
+        scaling_state = state.scaling_state()
+        scaling_state.record_flags(["a", "b"], True, 100)
+        scaling_state.record_flags(["b"], False, 150)
+        assert scaling_state.get_flag_age("a", True, 160) == 60
+        assert scaling_state.get_flag_age("a", False, 160) is None
+        assert scaling_state.get_flag_age("b", False, 160) == 10
+        assert scaling_state.get_flag_age("c", False, 160) is None
+        scaling_state.forget_nodes(["b", "c"])
+        assert list(scaling_state.nodes) == ["b"]
+
+    def test_stable_goal(self):
+        scaling_state = state.scaling_state()
+        assert scaling_state.get_stable_goal(0, 900) == (None, {})
+        scaling_state.record_goal(0, 20, {"main": 18, "spot": 2}, 900)
+        scaling_state.record_goal(300, 16, {"main": 12, "spot": 4}, 900)
+        assert scaling_state.get_stable_goal(300, 900) == (20, {"main": 18, "spot": 4})
+        scaling_state.record_goal(1000, 15, {"main": 12, "spot": 3}, 900)
+        assert len(scaling_state.goals) == 2
+        assert scaling_state.get_stable_goal(1000, 900) == (16, {"main": 12, "spot": 4})
+
+    def test_save_and_load(self, tmp_path):
+        path = str(tmp_path / "state.json")
+        assert state.load_state(path).nodes == {}
+        scaling_state = state.scaling_state()
+        scaling_state.record_flags(["a"], True, 100)
+        scaling_state.record_goal(100, 20, {}, 900)
+        scaling_state.save(path)
+        loaded = state.load_state(path)
+        assert loaded.nodes == scaling_state.nodes
+        assert loaded.goals == scaling_state.goals
+        assert os.listdir(str(tmp_path)) == ["state.json"]
+
+    def test_load_invalid(self, tmp_path):
+        path = str(tmp_path / "state.json")
+        with open(path, "w") as state_file:
+            state_file.write('{"nodes": ')
+        loaded = state.load_state(path)
+        assert (loaded.nodes, loaded.goals) == ({}, [])
@@ -0,0 +1,90 @@
+import json
+
+from autoscaler import autoscaler, settings, trace
+from .test_autoscaler import AutoscalerTest
+from .test_kubernetes_control import get_test_k8s
+
+
+def make_line(time, node_count, pod_memories, pod_node=None):
+    nodes = [{"name": "node-%i" % i, "unschedulable": False, "memory": 4 * 2 ** 30, "cpu": 2000}
+             for i in range(node_count)]
+    pods = [{"namespace": "datahub", "name": "jupyter-%i" % i, "labels": {"student": ""},
+             "node": pod_node, "phase": "Pending", "memory": memory, "cpu": 100, "start_time": None}
+            for i, memory in enumerate(pod_memories)]
+    return {"time": time, "cluster": "prod", "settings": {}, "nodes": nodes, "pods": pods, "decision": {}}
+
+
+class TestTrace:
+
+    _k8s = get_test_k8s()
+
+    def test_record_and_read(self, tmp_path):
+        path = str(tmp_path / "trace.jsonl.gz")
+        clock = iter([0, 60]).__next__
+        recorder = trace.trace_recorder(path, clock)
+        options = settings.settings()
+        recorder.record(self._k8s, options, {"goal": 15})
+        recorder.record(self._k8s, options, {"goal": 16})
+
+        lines = list(trace.read_trace(path))
+        assert [line["time"] for line in lines] == [0, 60]
+        assert [line["decision"]["goal"] for line in lines] == [15, 16]
+        assert len(lines[0]["nodes"]) == 17
+        assert all(node["ready"] for node in lines[0]["nodes"])
+        assert len(lines[0]["pods"]) == len(self._k8s.get_pods())
+        assert lines[0]["settings"]["max_nodes"] == options.max_nodes
+
+    def test_read_by_content(self, tmp_path):
+        # recorded traces are compressed whatever the file name
+        path = str(tmp_path / "trace.jsonl")
+        recorder = trace.trace_recorder(path, lambda: 0)
+        recorder.record(self._k8s, settings.settings(), {"goal": 15})
+        assert trace.is_gzip_file(path)
+        assert [line["decision"]["goal"] for line in trace.read_trace(path)] == [15]
+
+        # and hand-written traces are read as they are
+        plain = str(tmp_path / "plain.jsonl.gz")
+        with open(plain, "w") as trace_file:
+            trace_file.write(json.dumps(make_line(0, 1, [])) + "\n")
+        assert not trace.is_gzip_file(plain)
+        assert [line["cluster"] for line in trace.read_trace(plain)] == ["prod"]
+
+    def test_trace_k8s_matches_recorded_cluster(self):
+        options = settings.settings()
+        line = {"time": 0, "cluster": "prod", "decision": {},
+                "nodes": [trace.node_record(node) for node in self._k8s.get_nodes()],
+                "pods": [trace.pod_record(pod) for pod in self._k8s.get_pods()]}
+        k8s = trace.trace_k8s(options, line)
+        assert k8s.get_total_cluster_memory_usage() == self._k8s.get_total_cluster_memory_usage()
+        assert k8s.get_total_cluster_memory_capacity() == self._k8s.get_total_cluster_memory_capacity()
+        assert k8s.get_critical_node_names() == self._k8s.get_critical_node_names()
+        assert k8s.get_num_unschedulable() == self._k8s.get_num_unschedulable()
+
+    def test_replay(self):
+        options = settings.settings()
+        lines = [
+            make_line(0, 2, [3 * 2 ** 30] * 3),
+            make_line(1800, 2, [3 * 2 ** 30] * 3),
+            make_line(3600, 2, [3 * 2 ** 30]),
+        ]
+        goals = iter([1, 3, 2])
+        report = trace.replay(iter(lines), lambda k8s, options: next(goals), options)
+        assert report.passes == 3
+        # 1 node for half an hour, then 3 nodes for half an hour
+        assert report.node_hours == 2
+        # 2 of 3 pods fit on no node for the first 30 minutes
+        assert report.pending_pod_minutes == 60
+        assert report.churn == 3
+
+    def test_scale_records_trace(self, tmp_path):
+        options = settings.settings()
+        options.trace_file = str(tmp_path / "trace.jsonl.gz")
+        scaler = AutoscalerTest(options)
+        scaler._trace = trace.trace_recorder(options.trace_file)
+        autoscaler.populate = lambda *args: None
+        autoscaler.confirm = lambda x: True
+        scaler.scale()
+        lines = list(trace.read_trace(options.trace_file))
+        assert len(lines) == 1
+        assert lines[0]["decision"]["goal"] == scaler._goal
+        assert "blocked" in lines[0]["decision"]
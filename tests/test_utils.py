@@ -5,37 +5,54 @@ from .testing_utils import check_expected, objdict
 
 class TestUtil(object):
 
-    @pytest.mark.parametrize("test_input,expected", [
-        ('0 B', 0),
-        ('1 K', 1024),
-        ('1 M', 1048576),
-        ('1 Gi', 1073741824),
-        ('1 tera', 1099511627776),
-        ('0.5kilo', 512),
-        ('0.1  byte', 0),
-        ('1 k', 1024),
-        ('12 foo', ValueError)
-    ])
-    def test_human2bytes(self, test_input, expected):
-        check_expected(utils.human2bytes, [test_input], int, expected)
-
     @pytest.mark.parametrize("test_input,expected", [
         ('0', 0),
         ('12345', 12345),
-        ('0 B', 0),
-        ('1 K', 1024),
-        ('1 M', 1048576),
-        ('1 Gi', 1073741824),
-        ('1 tera', 1099511627776),
-        ('0.5kilo', 512),
-        ('0.1  byte', 0),
-        ('1 k', 1024),
+        ('1Ki', 1024),
+        ('1k', 1000),
+        ('1M', 1000000),
+        ('1Mi', 1048576),
+        ('1G', 1000000000),
+        ('1Gi', 1073741824),
+        ('1Ti', 1099511627776),
+        ('0.5Ki', 512),
+        ('1e3', 1000),
+        ('1E3', 1000),
+        ('1E', 1000000000000000000),
+        ('100m', 1),
+        ('345.324235543', 346),
+        ('1 K', ValueError),
+        ('1K', ValueError),
+        ('1KiB', ValueError),
         ('12 foo', ValueError),
-        ('345.324235543', ValueError)
+        ('', ValueError)
     ])
     def test_convert_size(self, test_input, expected):
         check_expected(utils.convert_size, [test_input], int, expected)
 
+    @pytest.mark.parametrize("test_input,expected", [
+        ('0', 0),
+        ('2', 2000),
+        ('100m', 100),
+        ('0.5', 500),
+        ('1.2345', 1235),
+        ('1k', 1000000),
+        ('1e-3', 1),
+        ('250 m', ValueError),
+        ('one', ValueError)
+    ])
+    def test_parse_cpu(self, test_input, expected):
+        check_expected(utils.parse_cpu, [test_input], int, expected)
+
+    def test_parse_quantity(self):
+        assert utils.parse_quantity('1.5Gi') == 1610612736
+        assert utils.parse_quantity('100m') * 10 == 1
+        # repeated sizes are answered from the cache
+        utils.parse_quantity.cache_clear()
+        utils.parse_quantity('512Mi')
+        utils.parse_quantity('512Mi')
+        assert utils.parse_quantity.cache_info().hits == 1
+
     @pytest.mark.parametrize("list1,list2,expected", [
         ([1, 2, 3], [4, 5, 6], False),
         ([1, 2, 3, 8, 9, 23, 345, 234, 898, 2343], [4, 5, 6], False),
@@ -84,19 +101,19 @@ class TestUtil(object):
     @pytest.mark.parametrize("node,expected", [
         (objdict(status=objdict(capacity=dict(memory='0'))), 0),
         (objdict(status=objdict(capacity=dict(memory='12345'))), 12345),
-        (objdict(status=objdict(capacity=dict(memory='0 B'))), 0),
-        (objdict(status=objdict(capacity=dict(memory='1 K'))), 1024),
-        (objdict(status=objdict(capacity=dict(memory='1 M'))), 1048576),
-        (objdict(status=objdict(capacity=dict(memory='1 Gi'))), 1073741824),
-        (objdict(status=objdict(capacity=dict(memory='1 tera'))), 1099511627776),
-        (objdict(status=objdict(capacity=dict(memory='0.5kilo'))), 512),
-        (objdict(status=objdict(capacity=dict(memory='0.1  byte'))), 0),
-        (objdict(status=objdict(capacity=dict(memory='1 k'))), 1024),
+        (objdict(status=objdict(capacity=dict(memory='0Ki'))), 0),
+        (objdict(status=objdict(capacity=dict(memory='1Ki'))), 1024),
+        (objdict(status=objdict(capacity=dict(memory='1Mi'))), 1048576),
+        (objdict(status=objdict(capacity=dict(memory='1Gi'))), 1073741824),
+        (objdict(status=objdict(capacity=dict(memory='1Ti'))), 1099511627776),
+        (objdict(status=objdict(capacity=dict(memory='0.5Ki'))), 512),
+        (objdict(status=objdict(capacity=dict(memory='100m'))), 1),
+        (objdict(status=objdict(capacity=dict(memory='1k'))), 1000),
         (objdict(status=objdict(capacity=dict(memory='12 foo'))), ValueError),
-        (objdict(status=objdict(capacity=dict(memory='345.324235543'))), ValueError),
-        (objdict(status=objdict(capacity=dict(memory2='1 k'))), KeyError),
-        (objdict(status=objdict(capacity2=dict(memory='1 k'))), AttributeError),
-        (objdict(status2=objdict(capacity=dict(memory='1 k'))), AttributeError),
+        (objdict(status=objdict(capacity=dict(memory='345.324235543'))), 346),
+        (objdict(status=objdict(capacity=dict(memory2='1k'))), KeyError),
+        (objdict(status=objdict(capacity2=dict(memory='1k'))), AttributeError),
+        (objdict(status2=objdict(capacity=dict(memory='1k'))), AttributeError),
     ])
     def test_get_node_memory_capacity(self, node, expected):
         check_expected(utils.get_node_memory_capacity, [node], int, expected)
@@ -104,26 +121,44 @@ class TestUtil(object):
     @pytest.mark.parametrize("pod,expected", [
         (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='0')))])), 0),
         (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='12345')))])), 12345),
-        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='0 B')))])), 0),
-        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='1 K')))])), 1024),
-        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='1 M')))])), 1048576),
-        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='1 Gi')))])), 1073741824),
-        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='1 tera')))])), 1099511627776),
-        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='0.5kilo')))])), 512),
-        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='0.1  byte')))])), 0),
-        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='1 k')))])), 1024),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='0Ki')))])), 0),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='1Ki')))])), 1024),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='1Mi')))])), 1048576),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='1Gi')))])), 1073741824),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='1Ti')))])), 1099511627776),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='0.5Ki')))])), 512),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='100m')))])), 1),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='1k')))])), 1000),
         (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='12 foo')))])), ValueError),
-        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='345.324235543')))])), ValueError),
-        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory2='1 k')))])), 0),
-        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests2=dict(memory='1 k')))])), AttributeError),
-        (objdict(spec=objdict(containers=[objdict(resources2=objdict(requests=dict(memory='1 k')))])), AttributeError),
-        (objdict(spec=objdict(containers2=[objdict(resources=objdict(requests=dict(memory='1 k')))])), AttributeError),
-        (objdict(spec2=objdict(containers=[objdict(resources=objdict(requests=dict(memory='1 k')))])), AttributeError)
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='345.324235543')))])), 346),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory2='1k')))])), 0),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests2=dict(memory='1k')))])), AttributeError),
+        (objdict(spec=objdict(containers=[objdict(resources2=objdict(requests=dict(memory='1k')))])), AttributeError),
+        (objdict(spec=objdict(containers2=[objdict(resources=objdict(requests=dict(memory='1k')))])), AttributeError),
+        (objdict(spec2=objdict(containers=[objdict(resources=objdict(requests=dict(memory='1k')))])), AttributeError)
     ])
     def test_get_pod_memory_request(self, pod, expected):
         # pod.spec.containers[0].resources.requests['memory']
         check_expected(utils.get_pod_memory_request, [pod], int, expected)
 
+    @pytest.mark.parametrize("pod,expected", [
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(cpu='100m')))])), 100),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(cpu='2')))])), 2000),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(memory='1Gi')))])), 0),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=None))])), 0),
+        (objdict(spec=objdict(containers=[objdict(resources=objdict(requests=dict(cpu='2 cores')))])), ValueError)
+    ])
+    def test_get_pod_cpu_request(self, pod, expected):
+        check_expected(utils.get_pod_cpu_request, [pod], int, expected)
+
+    @pytest.mark.parametrize("node,expected", [
+        (objdict(status=objdict(capacity=dict(cpu='2'))), 2000),
+        (objdict(status=objdict(capacity=dict(cpu='3500m'))), 3500),
+        (objdict(status=objdict(capacity=dict(memory='1Gi'))), KeyError)
+    ])
+    def test_get_node_cpu_capacity(self, node, expected):
+        check_expected(utils.get_node_cpu_capacity, [node], int, expected)
+
     @pytest.mark.parametrize("pod,expected", [
         (objdict(spec=objdict(node_name='pod1')), 'pod1'),
         (objdict(spec=objdict(node_name='hello world')), 'hello world'),
@@ -1,4 +1,10 @@
-from autoscaler import workload, settings
+from types import SimpleNamespace
+
+import pytest
+
+from autoscaler import pools, pricing, workload, settings
+from autoscaler.cluster_snapshot import ClusterSnapshot
+from autoscaler.records import NodeRecord
 from .test_kubernetes_control import get_test_k8s
 from .testing_utils import check_expected
 
@@ -15,6 +21,15 @@ class TestWorkload(object):
             0.16534503348334964
         )
 
+    def test_mean_node_memory(self):
+        snapshot = ClusterSnapshot([], [
+            NodeRecord("a", memory_capacity=8), NodeRecord("b", memory_capacity=16),
+            NodeRecord("c", unschedulable=True, memory_capacity=64)], [])
+        k8s = SimpleNamespace(get_snapshot=lambda: snapshot)
+        assert workload._get_mean_node_memory(k8s) == 12
+        snapshot = ClusterSnapshot([], [NodeRecord("c", unschedulable=True, memory_capacity=64)], [])
+        assert workload._get_mean_node_memory(k8s) == 64
+
     def test_schedule_goal(self):
         custom_settings = settings.settings()
 
@@ -60,3 +75,34 @@ class TestWorkload(object):
             int,
             15
         )
+
+    def test_schedule_pool_goals(self):
+        custom_settings = settings.settings()
+        node_pools = pools.parse_node_pools([
+            "main,0df1a536,13317664Ki,2,0.148,2,20", "custom,pool-custom,7Gi,2,0.05,0,5"])
+
+        # 31.5Gi requested at a utilization of 0.165: the two main nodes
+        # the pool keeps and the cheaper custom nodes for the rest
+        result = workload.schedule_pool_goals(self._k8s, custom_settings, node_pools)
+        assert result.counts == {"main": 2, "custom": 3}
+        assert result.price == pytest.approx(0.446)
+
+        # within bounds, the schedulable nodes of each pool stay
+        custom_settings.min_utilization = 0.1
+        assert workload.schedule_pool_goals(self._k8s, custom_settings, node_pools).counts == {
+            "main": 14, "custom": 1}
+
+        # unless they cannot take the forecast demand
+        assert workload.schedule_pool_goals(self._k8s, custom_settings, node_pools, 200 * 2 ** 30).counts == {
+            "main": 19, "custom": 4}
+
+    def test_get_projected_hourly_spend(self):
+        prices = pricing.price_table({"n1-highmem-2": (0.1184, 0.025)})
+        # 15 of the 17 nodes are n1-highmem-2, the custom nodes have no
+        # machine type label
+        assert workload.get_projected_hourly_spend(self._k8s, prices, 10) == pytest.approx(1.184)
+        assert workload.get_projected_hourly_spend(self._k8s, pricing.price_table(), 10) is None
+
+        node_pools = pools.parse_node_pools(["custom,pool-custom,13317664Ki,2,0.05,0,5"])
+        assert workload.get_projected_hourly_spend(self._k8s, prices, 18, node_pools, {"custom": 3}) == \
+            pytest.approx(0.15 + 15 * 0.1184)
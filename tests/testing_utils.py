@@ -1,6 +1,8 @@
 import pytest
 import json
 from collections import namedtuple
+from autoscaler.records import NodeRecord, PodRecord
+from autoscaler.utils import parse_cpu, parse_memory
 
 
 # from https://goodcode.io/articles/python-dict-object/
@@ -12,6 +14,50 @@ class objdict(dict):
             raise AttributeError("No such attribute: " + name)
 
 
+class FakeClock:
+
+    """A clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def make_pod(node_name, memory='1Gi', cpu='100m', labels=None, start_time=None):
+    """Return the PodRecord of a student pod, pending if node_name is None"""
+    return PodRecord(labels={'student': ''} if labels is None else labels, node_name=node_name,
+                     memory_request=parse_memory(memory), cpu_request=parse_cpu(cpu), start_time=start_time)
+
+
+def make_node(name, memory='4Gi', cpu='2', unschedulable=False, images=()):
+    return NodeRecord(name, unschedulable=unschedulable, memory_capacity=parse_memory(memory),
+                      cpu_capacity=parse_cpu(cpu), images=frozenset(images))
+
+
+def make_pod_object(name, node_name, phase="Running", resource_version="1"):
+    """Return a student pod as the Kubernetes API would"""
+    return objdict(
+        metadata=objdict(name=name, namespace="datahub", labels={"student": ""},
+                         resource_version=resource_version),
+        spec=objdict(node_name=node_name, containers=[
+            objdict(env=None, resources=objdict(requests={"memory": "1Gi"}))]),
+        status=objdict(phase=phase))
+
+
+def make_node_object(name, unschedulable=False, resource_version="1", ready=None):
+    """Return a node as the Kubernetes API would, reporting no
+    Ready condition if ready is None"""
+    conditions = None if ready is None else [
+        objdict(type='OutOfDisk', status='False'),
+        objdict(type='Ready', status='True' if ready else 'False')]
+    return objdict(
+        metadata=objdict(name=name, resource_version=resource_version),
+        spec=objdict(unschedulable=unschedulable),
+        status=objdict(capacity={"memory": "13317664Ki", "cpu": "2"}, conditions=conditions))
+
+
 def check_expected(f, test_inputs, expected_class, expected):
     if isinstance(expected, expected_class):
         assert f(*test_inputs) == expected